@@ -1,8 +1,10 @@
-import json
 import os
+import asyncio
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass
 from openai import OpenAI
+from span_resolver import resolve_feedback_positions
+from json_repair import UnrecoverableResponse, recover_feedback_json
 
 # Configure OpenAI client
 openai_api_key = os.getenv("OPENAI_API_KEY")
@@ -165,7 +167,17 @@ def get_nsw_selective_feedback(content: str, text_type: str, assistance_level: s
         
         content_response = response.choices[0].message.content
         
-        feedback_data = json.loads(content_response)
+        # Keep every complete section of a cut-off response instead of discarding it
+        repaired = recover_feedback_json(
+            content_response, ("overallScore", "criteriaScores", "feedbackCategories", "vocabularyEnhancements")
+        )
+        feedback_data = repaired.data
+        if not repaired.complete:
+            feedback_data["partialSections"] = repaired.missing_sections + (
+                ["feedbackCategories"] if repaired.missing_categories else []
+            )
+            feedback_data.setdefault("feedbackCategories", [])
+            feedback_data.setdefault("vocabularyEnhancements", [])
         feedback_data["timings"] = {"modelLatencyMs": 0} # Placeholder, ideally from API response metadata
         feedback_data["modelVersion"] = "gpt-4" # Placeholder, ideally from API response metadata
         feedback_data["id"] = "generated-id" # Placeholder, ideally a unique ID
@@ -174,7 +186,7 @@ def get_nsw_selective_feedback(content: str, text_type: str, assistance_level: s
         
         return feedback_data
         
-    except json.JSONDecodeError as e:
+    except UnrecoverableResponse as e:
         print(f"JSON parsing error: {e}")
         return create_fallback_feedback(content, word_count)
     except Exception as e:
@@ -182,71 +194,9 @@ def get_nsw_selective_feedback(content: str, text_type: str, assistance_level: s
         return create_fallback_feedback(content, word_count)
 
 def validate_feedback_positions(feedback_data: Dict[str, Any], original_text: str) -> Dict[str, Any]:
-    text_length = len(original_text)
-    
-    if "feedbackCategories" in feedback_data:
-        for category in feedback_data["feedbackCategories"]:
-            if "strengths" in category:
-                category["strengths"] = fix_positions_in_items(category["strengths"], original_text, text_length)
-            
-            if "areasForImprovement" in category:
-                category["areasForImprovement"] = fix_positions_in_items(category["areasForImprovement"], original_text, text_length)
-    
-    if "grammarCorrections" in feedback_data:
-        feedback_data["grammarCorrections"] = fix_positions_in_corrections(feedback_data["grammarCorrections"], original_text, text_length)
-    
-    if "vocabularyEnhancements" in feedback_data:
-        feedback_data["vocabularyEnhancements"] = fix_positions_in_corrections(feedback_data["vocabularyEnhancements"], original_text, text_length)
-    
-    return feedback_data
-
-def fix_positions_in_items(items: List[Dict], original_text: str, text_length: int) -> List[Dict]:
-    fixed_items = []
-    
-    for item in items:
-        if "exampleFromText" in item:
-            example_text = item["exampleFromText"]
-            
-            start_pos = original_text.find(example_text)
-            
-            if start_pos != -1:
-                item["position"] = {
-                    "start": start_pos,
-                    "end": start_pos + len(example_text)
-                }
-            else:
-                item["position"] = {
-                    "start": 0,
-                    "end": min(len(example_text), text_length)
-                }
-            
-            fixed_items.append(item)
-    
-    return fixed_items
-
-def fix_positions_in_corrections(corrections: List[Dict], original_text: str, text_length: int) -> List[Dict]:
-    fixed_corrections = []
-    
-    for correction in corrections:
-        if "original" in correction:
-            original_word = correction["original"]
-            
-            start_pos = original_text.find(original_word)
-            
-            if start_pos != -1:
-                correction["position"] = {
-                    "start": start_pos,
-                    "end": start_pos + len(original_word)
-                }
-            else:
-                correction["position"] = {
-                    "start": 0,
-                    "end": min(len(original_word), text_length)
-                }
-            
-            fixed_corrections.append(correction)
-    
-    return fixed_corrections
+    # Re-anchor every quoted item to where its text actually occurs in the essay,
+    # using the model's offsets only to pick between repeated occurrences
+    return resolve_feedback_positions(feedback_data, original_text)
 
 def create_fallback_feedback(content: str, word_count: int) -> Dict[str, Any]:
     return {
@@ -317,5 +267,5 @@ def create_fallback_feedback(content: str, word_count: int) -> Dict[str, Any]:
     }
 
 async def evaluate_essay(content: str, text_type: str = "narrative", assistance_level: str = "moderate") -> Dict[str, Any]:
-    return get_nsw_selective_feedback(content, text_type, assistance_level)
+    return await asyncio.to_thread(get_nsw_selective_feedback, content, text_type, assistance_level)
 
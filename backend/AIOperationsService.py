@@ -1,78 +1,248 @@
 import os
-import json
-from typing import Dict, List, Any, Optional
-import language_tool_python
-from dataclasses import dataclass
-from openai import OpenAI
-
-# Configure OpenAI client
-openai_api_key = os.getenv("OPENAI_API_KEY")
-openai_api_base = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1" )
-
-print(f"DEBUG: OPENAI_API_KEY loaded: {openai_api_key is not None}")
-print(f"DEBUG: OPENAI_API_BASE loaded: {openai_api_base}")
-
-client = OpenAI(
-    api_key=openai_api_key,
-    base_url=openai_api_base
+import time
+import threading
+from contextlib import nullcontext
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Iterator, List, Any, Optional, Tuple
+from language_tool_pool import get_language_tool_pool, shutdown_language_tool_pool
+from feedback_cache import get_feedback_cache, make_cache_key
+from incremental_grammar import IncrementalGrammarChecker
+from span_resolver import add_utf16_offsets, resolve_feedback_positions
+from essay_index import essay_index
+from incremental_json import IncrementalJSONParser
+from model_client import ModelClient, create_model_client, is_rate_limited
+from model_router import ModelTier, RouteDecision, create_model_router
+from local_scorer import CRITERIA_WEIGHTS, PreScorePolicy, analyze_text, provisional_feedback
+from vocabulary_analyzer import get_vocabulary_analyzer
+from prompt_builder import PromptBuilder, PromptPlan, estimate_tokens, merge_window_feedback, token_savings
+from json_repair import UnrecoverableResponse, merge_continuation, recover_feedback_json
+from revision_index import RevisionMatch, get_revision_index
+from single_flight import get_single_flight
+from request_scheduler import Admission, get_request_scheduler
+from evaluation_store import get_evaluation_store, new_evaluation_id
+from spelling import get_spell_checker
+from local_stages import (
+    check_spelling, postprocess_feedback, prewarm_process_pool, record_stage_durations, run_local_stage,
+    shutdown_process_pool, vocabulary_enhancements
 )
+from feedback_model import (  # noqa: F401 - re-exported result model
+    CriteriaFeedback, DetailedFeedback, FeedbackItem, GrammarCorrection, TextPosition,
+    VocabularyEnhancement, parse_feedback
+)
+from instrumentation import (
+    StageTimings, current_timings, metrics, profile_if_slow, record_request_metrics,
+    request_context, submit_with_context, timed_stage, track_request
+)
+
+# The OpenAI client, the stage executor and the LanguageTool engines are all
+# created on first use (or by prewarm()), keeping module import cheap on the
+# serverless cold-start path.
+_client = None
+_model_client: Optional[ModelClient] = None
+_init_lock = threading.Lock()
+
+def get_client():
+    global _client
+    if _client is None:
+        with _init_lock:
+            if _client is None:
+                # Deferred: importing the SDK dominates the cost of a cold start
+                from openai import OpenAI
+
+                openai_api_key = os.getenv("OPENAI_API_KEY")
+                openai_api_base = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1" )
+
+                _client = OpenAI(
+                    api_key=openai_api_key,
+                    base_url=openai_api_base,
+                    max_retries=0 # Retries, backoff and rate budgets are handled by model_client
+                )
+    return _client
+
+def get_model_client() -> ModelClient:
+    global _model_client
+    if _model_client is None:
+        client = get_client()
+        with _init_lock:
+            if _model_client is None:
+                _model_client = create_model_client(client)
+    return _model_client
+
+FEEDBACK_MODEL = "gpt-4"
+# Model, completion budget and feedback depth by assistance level, essay
+# length and model client load; FEEDBACK_MODEL is the strongest tier
+MODEL_ROUTER = create_model_router(FEEDBACK_MODEL)
+# Vocabulary suggestions from the local lexicon: "merge" adds them to the
+# model's, "only" also drops the vocabulary section from the prompt, "off"
+# leaves vocabulary to the model alone
+LOCAL_VOCABULARY = os.getenv("LOCAL_VOCABULARY", "merge").lower()
+# Bump whenever the prompt or response post-processing changes so cached feedback is not reused
+PROMPT_TEMPLATE_VERSION = "nsw-selective-v4" + ("-local-vocab" if LOCAL_VOCABULARY == "only" else "")
+
+# Stage execution: the grammar check does not depend on the model output, so by
+# default it runs on a worker thread while the model call is in flight.
+CONCURRENT_STAGES = os.getenv("FEEDBACK_CONCURRENT_STAGES", "true").lower() != "false"
+MODEL_CALL_TIMEOUT = float(os.getenv("MODEL_CALL_TIMEOUT", "60"))
+GRAMMAR_CHECK_TIMEOUT = float(os.getenv("GRAMMAR_CHECK_TIMEOUT", "10"))
+# Re-check only the paragraphs that changed since an earlier check of the same essay
+INCREMENTAL_GRAMMAR = os.getenv("INCREMENTAL_GRAMMAR", "false").lower() == "true"
+# Misspellings come from the in-process spelling index when a dictionary is
+# configured, leaving LanguageTool the grammar categories only
+SPELLING_PREPASS = os.getenv("SPELLING_PREPASS", "true").lower() != "false"
+# Assistance levels checked for spelling only, with no LanguageTool round trip
+# (e.g. "realtime"). Only honoured while a spelling dictionary is loaded;
+# without one these levels get the full LanguageTool check
+SPELLING_ONLY_LEVELS = frozenset(
+    level.strip().lower() for level in os.getenv("SPELLING_ONLY_LEVELS", "").split(",") if level.strip()
+)
+# Compact prompts with completion budgets sized to the requested sections;
+# essays over PROMPT_WINDOW_TOKENS are evaluated in paragraph windows
+PROMPT_BUILDER = PromptBuilder(
+    max_output_tokens=int(os.getenv("MODEL_MAX_OUTPUT_TOKENS", "2000")),
+    window_tokens=int(os.getenv("PROMPT_WINDOW_TOKENS", "1500"))
+)
+# Cut-off or malformed model output keeps its complete sections; the missing
+# ones are fetched with a follow-up call unless this is disabled
+JSON_CONTINUATION = os.getenv("FEEDBACK_JSON_CONTINUATION", "true").lower() != "false"
+# Reuse rubric feedback for a student's near-identical redraft (per-request
+# override: revision_aware); grammar and quoted spans are still redone
+REVISION_AWARE = os.getenv("REVISION_AWARE", "false").lower() == "true"
+# Identical evaluations already in flight (a double-clicked submit, realtime
+# and submit firing together) wait for that one instead of starting another
+COALESCE_REQUESTS = os.getenv("FEEDBACK_COALESCE_REQUESTS", "true").lower() != "false"
+# Decides when the local heuristic score is answer enough and the model call is skipped
+PRESCORE_POLICY = PreScorePolicy.from_env()
 
-@dataclass
-class TextPosition:
-    start: int
-    end: int
-
-@dataclass
-class FeedbackItem:
-    exampleFromText: str
-    position: TextPosition
-    comment: Optional[str] = None
-    suggestionForImprovement: Optional[str] = None
-
-@dataclass
-class GrammarCorrection:
-    original: str
-    suggestion: str
-    explanation: str
-    position: TextPosition
-
-@dataclass
-class VocabularyEnhancement:
-    original: str
-    suggestion: str
-    explanation: str
-    position: TextPosition
-
-@dataclass
-class CriteriaFeedback:
-    category: str
-    score: int
-    strengths: List[FeedbackItem]
-    areasForImprovement: List[FeedbackItem]
-
-@dataclass
-class DetailedFeedback:
-    overallScore: int
-    criteriaScores: Dict[str, int]
-    feedbackCategories: List[CriteriaFeedback]
-    grammarCorrections: List[GrammarCorrection]
-    vocabularyEnhancements: List[VocabularyEnhancement]
+_stage_executor: Optional[ThreadPoolExecutor] = None
+
+def get_stage_executor() -> ThreadPoolExecutor:
+    global _stage_executor
+    if _stage_executor is None:
+        with _init_lock:
+            if _stage_executor is None:
+                _stage_executor = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("FEEDBACK_STAGE_WORKERS", "8")),
+                    thread_name_prefix="feedback-stage"
+                )
+    return _stage_executor
+
+def prewarm(grammar: bool = True) -> Dict[str, float]:
+    """
+    Moves one-time initialization off the first request: builds the model
+    client and stage executor and starts the LanguageTool engines. Safe to call
+    repeatedly. Returns how long each component took, in milliseconds.
+    """
+    durations = {}
+    started = time.perf_counter()
+    get_model_client()
+    durations["modelClientMs"] = round((time.perf_counter() - started) * 1000, 2)
+
+    started = time.perf_counter()
+    get_stage_executor()
+    get_feedback_cache()
+    if LOCAL_VOCABULARY != "off":
+        get_vocabulary_analyzer()
+    durations["executorMs"] = round((time.perf_counter() - started) * 1000, 2)
+
+    if SPELLING_PREPASS:
+        started = time.perf_counter()
+        get_spell_checker()
+        durations["spellingIndexMs"] = round((time.perf_counter() - started) * 1000, 2)
+
+    started = time.perf_counter()
+    prewarm_process_pool()
+    durations["localStageWorkersMs"] = round((time.perf_counter() - started) * 1000, 2)
+
+    if grammar:
+        started = time.perf_counter()
+        get_language_tool_pool().start()
+        durations["grammarEnginesMs"] = round((time.perf_counter() - started) * 1000, 2)
+    return durations
+
+def shutdown(wait: bool = True) -> None:
+    """
+    Releases the stage executor, the local stage processes and the LanguageTool engines. For long-running
+    services; per-invocation handlers leave this to process exit.
+    """
+    global _stage_executor
+    with _init_lock:
+        executor, _stage_executor = _stage_executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+    shutdown_process_pool(wait=wait)
+    shutdown_language_tool_pool()
 
 # --- LanguageTool Integration Start ---
 
-def get_grammar_feedback(text: str) -> List[Dict[str, Any]]:
+def get_grammar_feedback(text: str, incremental: Optional[bool] = None,
+                         spelling_only: bool = False) -> List[Dict[str, Any]]:
+    """
+    Grammar feedback for the whole text. In incremental mode unchanged
+    paragraphs are served from the per-paragraph cache; the output matches a
+    full check for paragraph-local rules. With the spelling pre-pass, misspellings are found
+    in-process and LanguageTool only checks grammar; `spelling_only` skips
+    LanguageTool altogether, unless there is no spelling index to use instead.
+    """
+    if incremental is None:
+        incremental = INCREMENTAL_GRAMMAR
+    spell_checker = get_spell_checker() if SPELLING_PREPASS else None
+    spelling: List[Dict[str, Any]] = []
+    if spell_checker is not None:
+        with timed_stage("spellingCheck"):
+            spelling = run_local_stage(check_spelling, text)
+    if spelling_only and spell_checker is not None:
+        return spelling
+
+    with timed_stage("grammarCheck"):
+        if incremental:
+            grammar = get_incremental_grammar_checker().check(text)
+        else:
+            grammar = check_grammar(text, include_spelling=spell_checker is None)
+    if spell_checker is None:
+        return grammar
+    return sorted(spelling + grammar, key=lambda item: item["position"]["start"])
+
+def spelling_index_loaded() -> bool:
+    return SPELLING_PREPASS and get_spell_checker() is not None
+
+_incremental_checker: Optional[IncrementalGrammarChecker] = None
+
+def get_incremental_grammar_checker() -> IncrementalGrammarChecker:
+    global _incremental_checker
+    if _incremental_checker is None:
+        include_spelling = not SPELLING_PREPASS or get_spell_checker() is None
+        _incremental_checker = IncrementalGrammarChecker(
+            lambda chunk: check_grammar(chunk, include_spelling=include_spelling)
+        )
+    return _incremental_checker
+
+def check_grammar(text: str, include_spelling: bool = True) -> List[Dict[str, Any]]:
     """
     Performs a robust grammar check using the LanguageTool library.
+    Engines are leased from the process-wide pool so the JVM start-up cost
+    is paid once per process rather than once per request. Without
+    `include_spelling` the TYPOS category is disabled and misspellings dropped.
     """
-    # Initialize LanguageTool for English
-    tool = language_tool_python.LanguageTool('en-US')
-    matches = tool.check(text)
+    lease_started = time.perf_counter()
+    with get_language_tool_pool().lease() as tool:
+        timings = current_timings()
+        if timings is not None:
+            timings.record("grammarLeaseWait", (time.perf_counter() - lease_started) * 1000)
+        disabled = getattr(tool, "disabled_categories", None)
+        if disabled is not None:
+            if include_spelling:
+                disabled.discard("TYPOS")
+            else:
+                disabled.add("TYPOS")
+        matches = tool.check(text)
 
     feedback_list = []
     for match in matches:
         # Filter out minor style issues to focus on core grammar and spelling
         if match.ruleId in ['WHITESPACE_RULE', 'COMMA_PARENTHESIS_WHITESPACE', 'EN_QUOTES']:
             continue
+        if not include_spelling and match.ruleIssueType == 'misspelling':
+            continue
         
         # Extract the suggested replacement, if available
         suggestion = match.replacements[0] if match.replacements else None
@@ -102,170 +272,622 @@ def get_grammar_feedback(text: str) -> List[Dict[str, Any]]:
     
     return feedback_list
 
+GrammarJob = Tuple[Future, float]
+
+def start_grammar_check(text: str, spelling_only: bool = False) -> Optional[GrammarJob]:
+    """
+    Starts the grammar check in the background when concurrent stages are enabled.
+    Returns None in sequential mode; collect_grammar_feedback then runs it inline.
+    A spelling-only check takes microseconds, so it runs here and the job is
+    already complete.
+    """
+    if spelling_only and spelling_index_loaded():
+        future: Future = Future()
+        try:
+            future.set_result(get_grammar_feedback(text, spelling_only=True))
+        except Exception as e:
+            future.set_exception(e)
+        return future, time.monotonic() + GRAMMAR_CHECK_TIMEOUT
+    if not CONCURRENT_STAGES:
+        return None
+    future = submit_with_context(get_stage_executor(), get_grammar_feedback, text)
+    return future, time.monotonic() + GRAMMAR_CHECK_TIMEOUT
+
+def collect_grammar_feedback(text: str, job: Optional[GrammarJob]) -> Tuple[List[Dict[str, Any]], str]:
+    """
+    Returns (corrections, status) where status is "complete", "timeout" or "error".
+    A slow or failing grammar check yields an empty list instead of blocking
+    or discarding the rubric scores.
+    """
+    try:
+        if job is None:
+            corrections = get_grammar_feedback(text)
+        else:
+            future, deadline = job
+            corrections = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        add_utf16_offsets({"grammarCorrections": corrections}, essay_index(text))
+        return corrections, "complete"
+    except FutureTimeoutError:
+        print(f"Grammar check exceeded {GRAMMAR_CHECK_TIMEOUT}s; returning partial feedback")
+        return [], "timeout"
+    except Exception as e:
+        print(f"Grammar check failed: {e}")
+        return [], "error"
+
 # --- LanguageTool Integration End ---
 
-def get_nsw_selective_feedback(content: str, text_type: str, assistance_level: str) -> Dict[str, Any]:
-    if not content or len(content.strip()) < 20:
-        return {
-            "overallScore": 0,
-            "criteriaScores": {
-                "ideasAndContent": 0,
-                "textStructureAndOrganization": 0,
-                "languageFeaturesAndVocabulary": 0,
-                "spellingPunctuationAndGrammar": 0
-            },
-            "feedbackCategories": [],
-            "grammarCorrections": [],
-            "vocabularyEnhancements": []
+def get_nsw_selective_feedback(content: str, text_type: str, assistance_level: str,
+                                student_id: Optional[str] = None, revision_aware: Optional[bool] = None,
+                                priority: Optional[str] = None, tenant: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Cached front door for NSW feedback. Identical resubmissions for the same
+    text type, assistance level, model and prompt version are served from the
+    feedback cache; only successful model evaluations are stored, and
+    concurrent identical requests share one in-flight evaluation. In
+    revision-aware mode (needs `student_id`), a close redraft of one of the
+    student's recently evaluated essays reuses that evaluation's rubric
+    feedback instead of calling the model again.
+
+    Model evaluations wait for a slot from the request scheduler: `priority`
+    is "realtime", "submit" or "batch" (by default realtime for the realtime
+    assistance level, submit otherwise) and `tenant` is who the slots are
+    shared fairly between (by default the student).
+    """
+    return evaluate_with_status(content, text_type, assistance_level, student_id, revision_aware, priority, tenant)[0]
+
+def evaluate_with_status(content: str, text_type: str, assistance_level: str,
+                         student_id: Optional[str] = None, revision_aware: Optional[bool] = None,
+                         priority: Optional[str] = None, tenant: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+    """
+    Same as get_nsw_selective_feedback but also reports whether the feedback is
+    a complete model evaluation (True) or a fallback, partial or degraded-tier
+    response (False).
+    """
+    if revision_aware is None:
+        revision_aware = REVISION_AWARE
+    revision_aware = revision_aware and bool(student_id)
+
+    cache = get_feedback_cache()
+    key = feedback_cache_key(content, text_type, assistance_level)
+    cached = cache.get(key) if cache is not None else None
+    if cached is not None:
+        metrics.inc("feedback_requests_total", outcome="cache_hit")
+        return record_shared_evaluation(cached, content, text_type, student_id), True
+
+    admission = admission_for(assistance_level, priority, student_id, tenant)
+    if not COALESCE_REQUESTS:
+        return evaluate_uncached(key, content, text_type, assistance_level, student_id, revision_aware, admission)
+    # Revision-aware results depend on the student's history, so they only coalesce per student
+    flight_key = f"{key}:{student_id}" if revision_aware else key
+    (feedback, cacheable), shared = get_single_flight().do(
+        flight_key, evaluate_uncached, key, content, text_type, assistance_level, student_id, revision_aware, admission
+    )
+    if shared:
+        # The leader recorded the evaluation for its own student
+        feedback = record_shared_evaluation(feedback, content, text_type, student_id)
+    return feedback, cacheable
+
+def admission_for(assistance_level: str, priority: Optional[str] = None, student_id: Optional[str] = None,
+                  tenant: Optional[str] = None) -> Admission:
+    """
+    Scheduling class of an evaluation. A student's newer realtime check
+    supersedes their older one if that is still queued; other classes are
+    never dropped.
+    """
+    priority = priority or ("realtime" if (assistance_level or "").lower() == "realtime" else "submit")
+    return Admission(priority, tenant or student_id or "anonymous", student_id if priority == "realtime" else None)
+
+def admitted(admission: Optional[Admission]):
+    """Holds a scheduler slot for the model-bound part of an evaluation."""
+    scheduler = get_request_scheduler()
+    if scheduler is None or admission is None:
+        return nullcontext()
+    return scheduler.slot(admission)
+
+def feedback_cache_key(content: str, text_type: str, assistance_level: str) -> str:
+    # Keyed by the tier the request would get without load, so degraded
+    # evaluations (never cached) cannot be served for a full one
+    tier = MODEL_ROUTER.route(assistance_level, essay_index(content or "").word_count).requested
+    return make_cache_key(content or "", text_type, assistance_level, tier.cache_label, PROMPT_TEMPLATE_VERSION)
+
+def route_evaluation(assistance_level: str, word_count: int) -> RouteDecision:
+    route = MODEL_ROUTER.route(assistance_level, word_count, get_model_client().load())
+    metrics.inc("model_routing_total", tier=route.tier.name, reason=route.reason)
+    return route
+
+def evaluate_uncached(key: str, content: str, text_type: str, assistance_level: str,
+                      student_id: Optional[str], revision_aware: bool,
+                      admission: Optional[Admission] = None) -> Tuple[Dict[str, Any], bool]:
+    cache = get_feedback_cache()
+    if revision_aware and content and len(content.strip()) >= 20:
+        match = get_revision_index().find(student_id, content, text_type, assistance_level)
+        if match is not None:
+            feedback = revise_feedback(match, content)
+            record_evaluation(feedback, content, text_type, student_id)
+            return feedback, False
+
+    feedback, cacheable = generate_nsw_selective_feedback(content, text_type, assistance_level, admission)
+    record_evaluation(feedback, content, text_type, student_id)
+    if cacheable:
+        if cache is not None:
+            cache.set(key, feedback)
+        if revision_aware:
+            get_revision_index().add(student_id, content, text_type, assistance_level, feedback)
+    return feedback, cacheable
+
+def record_evaluation(feedback: Dict[str, Any], content: str, text_type: str, student_id: Optional[str]) -> None:
+    """
+    Appends a new evaluation to the evaluation store, when one is configured.
+    Only finalized (model-scored) feedback has an evaluation id; fallback,
+    provisional and empty responses are not evaluations and are skipped.
+    Results served to other students use record_shared_evaluation.
+    """
+    store = get_evaluation_store()
+    if store is None or not feedback.get("id"):
+        return
+    try:
+        store.record(feedback, student_id, text_type, essay_index(content).word_count)
+    except Exception as e:
+        print(f"Failed to record evaluation {feedback.get('id')}: {e}")
+
+def record_shared_evaluation(feedback: Dict[str, Any], content: str, text_type: str,
+                             student_id: Optional[str]) -> Dict[str, Any]:
+    """
+    Records an evaluation produced for another request (a cache hit, a
+    coalesced request or a duplicate essay in a batch) in `student_id`'s
+    history too. Returns the feedback under the student's evaluation id.
+    """
+    store = get_evaluation_store()
+    if store is None or not student_id or not feedback.get("id"):
+        return feedback
+    try:
+        evaluation_id = store.record_copy(feedback, student_id, text_type, essay_index(content).word_count)
+    except Exception as e:
+        print(f"Failed to record evaluation {feedback.get('id')} for {student_id}: {e}")
+        return feedback
+    return feedback if evaluation_id == feedback["id"] else dict(feedback, id=evaluation_id)
+
+def revise_feedback(match: RevisionMatch, content: str) -> Dict[str, Any]:
+    """
+    Rubric feedback of an earlier draft carried over to its revision: the
+    grammar check runs again on the new text and every quote is re-resolved
+    against it; quotes the student has since rewritten are dropped. Not
+    cached, since the model never saw this exact text.
+    """
+    feedback_data = match.feedback
+    for section in ("grammarCorrections", "partialSections", "timings", "tokenBudget", "usage"):
+        feedback_data.pop(section, None)
+    metadata = {"model": feedback_data.get("modelVersion") or FEEDBACK_MODEL, "usage": None}
+
+    with track_request() as timings:
+        grammar_job = start_grammar_check(content)
+        feedback, _ = finalize_feedback(feedback_data, content, grammar_job, metadata, revision=True)
+    feedback["revisionOf"] = {"similarity": match.similarity, "evaluatedAt": match.evaluated_at}
+    record_request_metrics(timings, "revision")
+    return feedback
+
+def create_empty_feedback() -> Dict[str, Any]:
+    return {
+        "overallScore": 0,
+        "criteriaScores": {
+            "ideasAndContent": 0,
+            "textStructureAndOrganization": 0,
+            "languageFeaturesAndVocabulary": 0,
+            "spellingPunctuationAndGrammar": 0
+        },
+        "feedbackCategories": [],
+        "grammarCorrections": [],
+        "vocabularyEnhancements": []
+    }
+
+def local_vocabulary_enhancements(content: str) -> List[Dict[str, Any]]:
+    if LOCAL_VOCABULARY == "off":
+        return []
+    with timed_stage("vocabulary"):
+        return run_local_stage(vocabulary_enhancements, content)
+
+def report_token_savings(plans: List[PromptPlan], content: str) -> Dict[str, int]:
+    savings = token_savings(plans, estimate_tokens(content))
+    metrics.inc("prompt_tokens_saved_total", savings["inputTokensSaved"], kind="input")
+    metrics.inc("prompt_tokens_saved_total", savings["outputTokensSaved"], kind="output")
+    return savings
+
+def response_metadata(model: Optional[str], usage: Any) -> Dict[str, Any]:
+    """Actual model id and token usage as reported by the API."""
+    metadata = {"model": model or FEEDBACK_MODEL, "usage": None}
+    if usage is not None:
+        metadata["usage"] = {
+            "promptTokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "completionTokens": getattr(usage, "completion_tokens", 0) or 0,
+            "totalTokens": getattr(usage, "total_tokens", 0) or 0
         }
+    return metadata
+
+def merge_response_metadata(metadatas: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Sums token usage over the calls of a windowed evaluation."""
+    merged = {"model": metadatas[0]["model"], "usage": None}
+    for metadata in metadatas:
+        if metadata["usage"] is None:
+            continue
+        if merged["usage"] is None:
+            merged["usage"] = dict(metadata["usage"])
+        else:
+            for field, value in metadata["usage"].items():
+                merged["usage"][field] += value
+    return merged
+
+def finalize_feedback(feedback_data: Dict[str, Any], content: str, grammar_job: Optional[GrammarJob], metadata: Dict[str, Any],
+                      revision: bool = False) -> Tuple[Dict[str, Any], bool]:
+    """
+    Post-processing shared by the blocking and streaming paths: metadata,
+    position validation and the merge of LanguageTool corrections and
+    lexicon vocabulary suggestions. For a `revision` (feedback written for an
+    earlier draft), quotes no longer in the text are dropped.
+    """
+    feedback_data["modelVersion"] = metadata["model"]
+    if metadata["usage"] is not None:
+        feedback_data["usage"] = metadata["usage"]
+    feedback_data["id"] = new_evaluation_id()
     
-    word_count = len(content.split())
-    
-    prompt = f"""
-    You are an AI writing tutor specializing in the NSW Selective School writing test for 10-12 year olds. 
-    
-    Analyze this {text_type} writing ({word_count} words) and provide detailed feedback aligned with NSW Selective criteria.
-    
-    Text: "{content}"
-    
-    Provide feedback with:
-    1. Overall score out of 100
-    2. Individual scores out of 5 for each NSW criteria:
-       - Ideas and Content
-       - Text Structure and Organization  
-       - Language Features and Vocabulary
-       - Spelling, Punctuation, and Grammar
-    
-    For each criteria, identify:
-    - 2-3 specific strengths with examples from text and character positions (start, end, 0-indexed)
-    - 2-3 specific areas for improvement with examples and positions
+    # 1. Integrate robust grammar checking (already running if stages are concurrent)
+    grammar_feedback, grammar_status = collect_grammar_feedback(content, grammar_job)
+    partial_sections = feedback_data.pop("partialSections", [])
+    if grammar_status != "complete":
+        partial_sections.append("grammarCorrections")
+    if partial_sections:
+        feedback_data["partialSections"] = partial_sections
+
+    # 2. Validate LLM-generated positions, then merge in the LanguageTool
+    # corrections (the LLM is instructed to return an empty list for them)
+    # and the lexicon vocabulary, on a local stage worker when enabled
+    feedback_data, issues, durations = run_local_stage(
+        postprocess_feedback, feedback_data, content, grammar_feedback, LOCAL_VOCABULARY, revision
+    )
+    record_stage_durations(durations)
+    if issues:
+        print(f"Dropped {len(issues)} invalid feedback items: {issues[:3]}")
+        metrics.inc("feedback_validation_issues_total", len(issues))
+
+    timings = current_timings()
+    feedback_data["timings"] = timings.as_dict() if timings is not None else {"modelLatencyMs": 0}
     
-    Also provide:
-        - (Grammar/Spelling corrections are handled separately by a more robust system)
-    - 3-5 vocabulary enhancement opportunities with original word, suggested replacement, explanation, and position
+    return feedback_data, not partial_sections
+
+def generate_nsw_selective_feedback(content: str, text_type: str, assistance_level: str,
+                                    admission: Optional[Admission] = None) -> Tuple[Dict[str, Any], bool]:
+    """
+    Runs the full evaluation. Returns (feedback, cacheable); fallback and partial
+    responses are not cacheable. With an `admission`, the model-bound stages
+    wait for a scheduler slot; empty and provisional responses never queue.
+    """
+    if not content or len(content.strip()) < 20:
+        return create_empty_feedback(), False
+
+    analysis = run_local_stage(analyze_text, content, text_type)
+    if not PRESCORE_POLICY.should_escalate(analysis, assistance_level):
+        metrics.inc("feedback_requests_total", outcome="provisional")
+        return local_provisional_feedback(content, analysis, assistance_level), False
     
-    Do NOT include "grammarCorrections" in your JSON response. This will be handled by a separate, more robust system.
+    with admitted(admission):
+        # Routed once admitted, so the tier reflects the load at the time of the call
+        route = route_evaluation(assistance_level, essay_index(content).word_count)
+        spelling_only = (assistance_level or "").lower() in SPELLING_ONLY_LEVELS
+        with track_request() as timings, profile_if_slow("nsw-feedback"):
+            feedback, cacheable, metadata = run_feedback_stages(content, text_type, route, spelling_only)
+    outcome = request_outcome(feedback, cacheable, metadata)
+    record_request_metrics(timings, outcome, **(metadata or {}))
+    return feedback, cacheable
+
+def request_outcome(feedback: Dict[str, Any], cacheable: bool, metadata: Optional[Dict[str, Any]]) -> str:
+    if metadata is None:
+        return "fallback"
+    if feedback.get("partialSections"):
+        return "partial"
+    return "degraded" if not cacheable else "ok"
+
+def local_provisional_feedback(content: str, analysis: Any, assistance_level: str) -> Dict[str, Any]:
+    """The local score with the same grammar and spelling pass a model response gets."""
+    spelling_only = (assistance_level or "").lower() in SPELLING_ONLY_LEVELS
+    grammar_job = start_grammar_check(content, spelling_only)
+    feedback = provisional_feedback(analysis)
+    feedback["vocabularyEnhancements"] = local_vocabulary_enhancements(content)
+    feedback["grammarCorrections"], grammar_status = collect_grammar_feedback(content, grammar_job)
+    if grammar_status != "complete":
+        feedback["partialSections"] = ["grammarCorrections"]
+    return feedback
+
+def run_feedback_stages(content: str, text_type: str, route: RouteDecision,
+                        spelling_only: bool = False) -> Tuple[Dict[str, Any], bool, Optional[Dict[str, Any]]]:
+    word_count = essay_index(content).word_count
+    tier = route.tier
     
-    Return ONLY valid JSON in this exact format:
-    {{
-        "overallScore": 85,
-        "criteriaScores": {{
-            "ideasAndContent": 4,
-            "textStructureAndOrganization": 4,
-            "languageFeaturesAndVocabulary": 3,
-            "spellingPunctuationAndGrammar": 4
-        }},
-        "feedbackCategories": [
-            {{
-                "category": "Ideas and Content",
-                "score": 4,
-                "strengths": [
-                    {{
-                        "exampleFromText": "exact text from student writing",
-                        "position": {{"start": 0, "end": 22}},
-                        "comment": "specific positive feedback"
-                    }}
-                ],
-                "areasForImprovement": [
-                    {{
-                        "exampleFromText": "exact text from student writing",
-                        "position": {{"start": 45, "end": 68}},
-                        "suggestionForImprovement": "specific improvement suggestion"
-                    }}
-                ]
-            }}
-        ],
-        "grammarCorrections": [
-            # This array will be populated by the LanguageTool integration, not the LLM
-        ],
-        "vocabularyEnhancements": [
-            {{
-                "original": "simple word",
-                "suggestion": "sophisticated word",
-                "explanation": "why this word is better",
-                "position": {{"start": 62, "end": 68}}
-            }}
-        ]
-    }}
+    grammar_job = start_grammar_check(content, spelling_only)
+    try:
+        with timed_stage("promptBuild"):
+            plans = PROMPT_BUILDER.plan(content, text_type, word_count, LOCAL_VOCABULARY != "only",
+                                        depth=tier.depth, max_output_tokens=tier.max_output_tokens)
+
+        with timed_stage("modelLatency"):
+            if len(plans) == 1:
+                results = [request_model_feedback(plans[0], tier)]
+            else:
+                # Windows are independent, so they are requested together
+                executor = get_stage_executor()
+                futures = [submit_with_context(executor, request_model_feedback, plan, tier) for plan in plans]
+                results = [future.result() for future in futures]
+        responses = [response for response, _ in results]
+        served = min((served for _, served in results), key=MODEL_ROUTER.tiers.index)
+        if served != tier:
+            route = RouteDecision(served, route.requested, "rate_limited")
+
+        parsed, partial_sections, follow_ups = [], [], []
+        for plan, response in zip(plans, responses):
+            data, missing, extra = parse_model_feedback(response.choices[0].message.content, plan, served)
+            parsed.append(data)
+            partial_sections.extend(s for s in missing if s not in partial_sections)
+            follow_ups.extend(extra)
+        if len(plans) == 1:
+            feedback_data = parsed[0]
+        else:
+            feedback_data = merge_window_feedback(list(zip(plans, parsed)))
+        if partial_sections:
+            feedback_data["partialSections"] = partial_sections
+        feedback_data["tokenBudget"] = report_token_savings(plans, content)
+        feedback_data["routing"] = route.as_dict()
+        metadata = merge_response_metadata([
+            response_metadata(getattr(response, "model", None), getattr(response, "usage", None))
+            for response in responses + follow_ups
+        ])
+        feedback, cacheable = finalize_feedback(feedback_data, content, grammar_job, metadata)
+        # Degraded feedback is served but not cached, so the next request gets the full tier
+        return feedback, cacheable and not route.degraded, metadata
+        
+    except UnrecoverableResponse as e:
+        print(f"JSON parsing error: {e}")
+    except Exception as e:
+        print(f"Error generating NSW feedback: {e}")
+
+    return fallback_with_grammar(content, word_count, grammar_job), False, None
+
+def required_sections() -> List[str]:
+    sections = ["overallScore", "criteriaScores", "feedbackCategories"]
+    if LOCAL_VOCABULARY != "only":
+        sections.append("vocabularyEnhancements")
+    return sections
+
+def parse_model_feedback(text: str, plan: PromptPlan, tier: ModelTier) -> Tuple[Dict[str, Any], List[str], List[Any]]:
+    """
+    Parses one model response, salvaging complete sections from cut-off or
+    malformed output and requesting only the missing ones in a follow-up call.
+    Returns (feedback data, sections still missing, follow-up responses).
+    Raises UnrecoverableResponse when no scores can be recovered.
+    """
+    with timed_stage("jsonParse"):
+        result = recover_feedback_json(text, required_sections())
+    follow_ups = []
+    if result.complete:
+        if result.repaired:
+            metrics.inc("feedback_json_repairs_total", outcome="repaired")
+        return result.data, [], follow_ups
+
+    if JSON_CONTINUATION:
+        try:
+            with timed_stage("continuation"):
+                follow_up = PROMPT_BUILDER.continuation(
+                    plan, result.data, result.missing_sections, result.missing_categories
+                )
+                response, _ = request_model_feedback(follow_up, tier)
+                follow_ups.append(response)
+                continued = recover_feedback_json(response.choices[0].message.content, [], require_scores=False)
+            result = merge_continuation(result, continued.data)
+        except Exception as e:
+            print(f"Continuation request failed: {e}")
+    metrics.inc("feedback_json_repairs_total", outcome="continued" if result.complete else "partial")
+
+    data = result.data
+    # Sections still missing keep their empty defaults
+    for section, default in create_empty_feedback().items():
+        data.setdefault(section, default)
+    scores = data.get("criteriaScores")
+    if "overallScore" in result.missing_sections and isinstance(scores, dict):
+        data["overallScore"] = round(sum(
+            (scores.get(key) or 0) / 5 * weight for key, weight in CRITERIA_WEIGHTS.items()
+        ))
+    missing = list(result.missing_sections)
+    if result.missing_categories:
+        missing.append("feedbackCategories")
+    return data, missing, follow_ups
+
+def request_model_feedback(plan: PromptPlan, tier: ModelTier, **options: Any) -> Tuple[Any, ModelTier]:
+    """
+    Returns (response, tier that served it). When the provider still rate
+    limits the tier's model after retries, the call moves down to the next
+    cheaper model instead of failing. `options` (stream=True, ...) are passed
+    on to the completions call.
     """
-    
     try:
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {
-                    "role": "system", 
-                    "content": "You are an expert NSW Selective School writing assessor. Return only valid JSON."
-                },
-                {
-                    "role": "user", 
-                    "content": prompt
-                }
-            ],
-            max_tokens=2000,
+        response = get_model_client().create_chat_completion(
+            model=tier.model,
+            messages=plan.messages,
+            max_tokens=min(plan.max_tokens, tier.max_output_tokens),
             temperature=0.3,
-            response_format={"type": "json_object"}
+            response_format={"type": "json_object"},
+            timeout=MODEL_CALL_TIMEOUT,
+            **options
         )
-        
-        content_response = response.choices[0].message.content
-        
-        feedback_data = json.loads(content_response)
-        feedback_data["timings"] = {"modelLatencyMs": 0} # Placeholder, ideally from API response metadata
-        feedback_data["modelVersion"] = "gpt-4" # Placeholder, ideally from API response metadata
-        feedback_data["id"] = "generated-id" # Placeholder, ideally a unique ID
-        
-        # 1. Validate LLM-generated positions
-        feedback_data = validate_feedback_positions(feedback_data, content)
-        
-        # 2. Integrate robust grammar checking
-        grammar_feedback = get_grammar_feedback(content)
-        
-        # The LLM is instructed to return an empty list for grammarCorrections.
-        # We replace it with the robust LanguageTool results.
-        feedback_data["grammarCorrections"] = grammar_feedback
-        
-        return feedback_data
-        
-    except json.JSONDecodeError as e:
+        return response, tier
+    except Exception as e:
+        cheaper = MODEL_ROUTER.cheaper(tier)
+        if cheaper is None or not is_rate_limited(e):
+            raise
+        print(f"Model {tier.model} is rate limited; retrying on {cheaper.model}")
+        metrics.inc("model_routing_total", tier=cheaper.name, reason="rate_limited")
+        return request_model_feedback(plan, cheaper, **options)
+
+def fallback_with_grammar(content: str, word_count: int, grammar_job: Optional[GrammarJob]) -> Dict[str, Any]:
+    # Reuse the grammar check that was already started rather than running it again
+    grammar_feedback = collect_grammar_feedback(content, grammar_job)[0] if grammar_job is not None else None
+    return create_fallback_feedback(content, word_count, grammar_feedback)
+
+# --- Streaming Feedback Start ---
+
+STREAMED_ARRAYS = ("feedbackCategories", "vocabularyEnhancements")
+
+def stream_nsw_selective_feedback(content: str, text_type: str, assistance_level: str,
+                                  student_id: Optional[str] = None, priority: Optional[str] = None,
+                                  tenant: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yields feedback events as soon as each section is available, using the
+    streaming completions API and an incremental JSON parser:
+
+        {"event": "section", "section": "overallScore" | "criteriaScores", "data": ...}
+        {"event": "feedbackCategory", "index": n, "data": {...}}
+        {"event": "vocabularyEnhancement", "index": n, "data": {...}}
+        {"event": "grammarCorrections", "data": [...]}
+        {"event": "complete", "data": <same body as get_nsw_selective_feedback>}
+
+    The "complete" event is always last and is authoritative. The model call
+    waits for a scheduler slot as in get_nsw_selective_feedback.
+    """
+    cache = get_feedback_cache()
+    key = feedback_cache_key(content, text_type, assistance_level)
+    cached = cache.get(key) if cache is not None else None
+    if cached is not None:
+        cached = record_shared_evaluation(cached, content, text_type, student_id)
+    elif content and len(content.strip()) >= 20:
+        analysis = run_local_stage(analyze_text, content, text_type)
+        if not PRESCORE_POLICY.should_escalate(analysis, assistance_level):
+            cached = local_provisional_feedback(content, analysis, assistance_level)
+    if cached is not None or not content or len(content.strip()) < 20:
+        feedback = cached if cached is not None else create_empty_feedback()
+        yield from section_events(feedback)
+        yield {"event": "complete", "data": feedback}
+        return
+
+    with admitted(admission_for(assistance_level, priority, student_id, tenant)):
+        yield from stream_model_feedback(content, text_type, assistance_level, cache, key, student_id)
+
+def stream_model_feedback(content: str, text_type: str, assistance_level: str, cache: Any,
+                          key: str, student_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    word_count = essay_index(content).word_count
+    route = route_evaluation(assistance_level, word_count)
+    tier = route.tier
+    # A generator cannot keep track_request() open across yields, so the
+    # request's timings travel in a dedicated context instead
+    timings = StageTimings()
+    ctx = request_context(timings)
+    spelling_only = (assistance_level or "").lower() in SPELLING_ONLY_LEVELS
+    grammar_job = ctx.run(start_grammar_check, content, spelling_only)
+    grammar_sent = False
+    first_section = True
+    parser = IncrementalJSONParser(split_arrays=STREAMED_ARRAYS)
+    model, usage, metadata = None, None, None
+    try:
+        with timings.stage("promptBuild"):
+            # Windows would delay every section until all of them finish, so a
+            # streamed evaluation is always a single call
+            plans = PROMPT_BUILDER.plan(content, text_type, word_count, LOCAL_VOCABULARY != "only", allow_windows=False,
+                                        depth=tier.depth, max_output_tokens=tier.max_output_tokens)
+        model_started = time.perf_counter()
+        # A rate limit surfaces when the stream is opened, so the same downgrade applies
+        stream, served = request_model_feedback(plans[0], tier, stream=True, stream_options={"include_usage": True})
+        if served != tier:
+            route = RouteDecision(served, route.requested, "rate_limited")
+        for chunk in stream:
+            model = getattr(chunk, "model", None) or model
+            usage = getattr(chunk, "usage", None) or usage
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            for parsed in parser.feed(delta or ""):
+                event = streamed_section_event(parsed, content)
+                if event is not None:
+                    if first_section:
+                        timings.record("firstSection", timings.elapsed_ms())
+                        first_section = False
+                    yield event
+            if not grammar_sent and grammar_job is not None and grammar_job[0].done():
+                yield {"event": "grammarCorrections", "data": collect_grammar_feedback(content, grammar_job)[0]}
+                grammar_sent = True
+        timings.record("modelLatency", (time.perf_counter() - model_started) * 1000)
+
+        feedback_data, partial_sections, follow_ups = ctx.run(parse_model_feedback, parser.text, plans[0], route.tier)
+        if partial_sections:
+            feedback_data["partialSections"] = partial_sections
+        feedback_data["tokenBudget"] = report_token_savings(plans, content)
+        feedback_data["routing"] = route.as_dict()
+        metadata = merge_response_metadata([response_metadata(model, usage)] + [
+            response_metadata(getattr(response, "model", None), getattr(response, "usage", None))
+            for response in follow_ups
+        ])
+        feedback, cacheable = ctx.run(finalize_feedback, feedback_data, content, grammar_job, metadata)
+        cacheable = cacheable and not route.degraded
+    except UnrecoverableResponse as e:
         print(f"JSON parsing error: {e}")
-        return create_fallback_feedback(content, word_count)
+        feedback, cacheable = fallback_with_grammar(content, word_count, grammar_job), False
     except Exception as e:
-        print(f"Error generating NSW feedback: {e}")
-        return create_fallback_feedback(content, word_count)
+        print(f"Error streaming NSW feedback: {e}")
+        feedback, cacheable = fallback_with_grammar(content, word_count, grammar_job), False
+
+    outcome = request_outcome(feedback, cacheable, metadata)
+    record_request_metrics(timings, outcome, **(metadata or {}))
+
+    if not grammar_sent:
+        yield {"event": "grammarCorrections", "data": feedback["grammarCorrections"]}
+    record_evaluation(feedback, content, text_type, student_id)
+    if cacheable and cache is not None:
+        cache.set(key, feedback)
+    yield {"event": "complete", "data": feedback}
+
+def streamed_section_event(parsed: Tuple[Any, ...], content: str) -> Optional[Dict[str, Any]]:
+    if parsed[0] == "member" and parsed[1] in ("overallScore", "criteriaScores"):
+        return {"event": "section", "section": parsed[1], "data": parsed[2]}
+    if parsed[0] == "element":
+        _, section, index, item = parsed
+        if not isinstance(item, dict):
+            return None
+        # Anchor the quotes in this element now; the complete event re-resolves everything together
+        add_utf16_offsets(resolve_feedback_positions({section: [item]}, content), essay_index(content))
+        if section == "feedbackCategories":
+            return {"event": "feedbackCategory", "index": index, "data": item}
+        return {"event": "vocabularyEnhancement", "index": index, "data": item}
+    return None
+
+def section_events(feedback: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Replays an already finished feedback body as streaming events."""
+    for section in ("overallScore", "criteriaScores"):
+        if section in feedback:
+            yield {"event": "section", "section": section, "data": feedback[section]}
+    for index, category in enumerate(feedback.get("feedbackCategories", [])):
+        yield {"event": "feedbackCategory", "index": index, "data": category}
+    for index, item in enumerate(feedback.get("vocabularyEnhancements", [])):
+        yield {"event": "vocabularyEnhancement", "index": index, "data": item}
+    yield {"event": "grammarCorrections", "data": feedback.get("grammarCorrections", [])}
+
+# --- Streaming Feedback End ---
+
+async def evaluate_essay(content: str, text_type: str = "narrative", assistance_level: str = "moderate") -> Dict[str, Any]:
+    """
+    Non-blocking entry point for asyncio callers. The blocking model call runs on
+    the default executor so the event loop stays free; the grammar check runs
+    alongside it on the stage executor.
+    """
+    import asyncio  # Only async callers pay for importing asyncio
+    return await asyncio.to_thread(get_nsw_selective_feedback, content, text_type, assistance_level)
 
 def validate_feedback_positions(feedback_data: Dict[str, Any], original_text: str) -> Dict[str, Any]:
-    text_length = len(original_text)
-    
-    if "feedbackCategories" in feedback_data:
-        for category in feedback_data["feedbackCategories"]:
-            if "strengths" in category:
-                category["strengths"] = fix_positions_in_items(category["strengths"], original_text, text_length)
-            
-            if "areasForImprovement" in category:
-                category["areasForImprovement"] = fix_positions_in_items(category["areasForImprovement"], original_text, text_length)
-    
-    if "grammarCorrections" in feedback_data:
-        feedback_data["grammarCorrections"] = fix_positions_in_items(feedback_data["grammarCorrections"], original_text, text_length)
+    # Re-anchor every quoted item to where its text actually occurs in the essay,
+    # using the model's offsets only to pick between repeated occurrences
+    return resolve_feedback_positions(feedback_data, original_text)
 
-    if "vocabularyEnhancements" in feedback_data:
-        feedback_data["vocabularyEnhancements"] = fix_positions_in_items(feedback_data["vocabularyEnhancements"], original_text, text_length)
-        
-    return feedback_data
-
-def fix_positions_in_items(items: List[Dict[str, Any]], original_text: str, text_length: int) -> List[Dict[str, Any]]:
-    # Simple position validation to prevent out-of-bounds errors
-    for item in items:
-        if "position" in item:
-            start = item["position"]["start"]
-            end = item["position"]["end"]
-            
-            if start < 0 or end > text_length or start > end:
-                # Invalidate position if it's clearly wrong
-                item["position"] = {"start": 0, "end": 0}
-    return items
-
-def create_fallback_feedback(content: str, word_count: int) -> Dict[str, Any]:
+def create_fallback_feedback(content: str, word_count: int, grammar_corrections: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
     # Fallback logic for when the LLM fails to return valid JSON
+    if grammar_corrections is None:
+        # Still run grammar check, but never let it turn a degraded response into an error
+        try:
+            grammar_corrections = get_grammar_feedback(content)
+        except Exception as e:
+            print(f"Grammar check failed in fallback: {e}")
+            grammar_corrections = []
+
     return {
         "overallScore": 0,
         "criteriaScores": {
@@ -288,6 +910,6 @@ def create_fallback_feedback(content: str, word_count: int) -> Dict[str, Any]:
                 ]
             }
         ],
-        "grammarCorrections": get_grammar_feedback(content), # Still run grammar check
-        "vocabularyEnhancements": []
+        "grammarCorrections": grammar_corrections,
+        "vocabularyEnhancements": local_vocabulary_enhancements(content)
     }
\ No newline at end of file
@@ -1,35 +1,37 @@
 import json
 import os
-from AIOperationsService import get_nsw_selective_feedback
+import threading
+from AIOperationsService import prewarm
+from feedback_http import handle_post
+
+# With provisioned concurrency the init phase is off the request path, so
+# warming there hides the client and LanguageTool start-up entirely.
+if os.getenv("FEEDBACK_PREWARM_ON_INIT", "false").lower() == "true":
+    threading.Thread(target=prewarm, name="feedback-prewarm", daemon=True).start()
 
 def handler(event, context):
-    if event["httpMethod"] == "POST":
+    # Scheduled warm-up pings ({"source": "prewarm"}) initialize without evaluating anything
+    if event.get("source") == "prewarm":
         try:
-            body = json.loads(event["body"])
-            content = body.get("content")
-            text_type = body.get("textType")
-            assistance_level = body.get("assistanceLevel")
-
-            if not content:
-                return {
-                    "statusCode": 400,
-                    "body": json.dumps({"error": "Content is required"})
-                }
-
-            feedback = get_nsw_selective_feedback(content, text_type, assistance_level)
-            
             return {
                 "statusCode": 200,
-                "headers": { "Content-Type": "application/json" },
-                "body": json.dumps(feedback)
+                "body": json.dumps({"prewarmed": prewarm(grammar=event.get("grammar", True))})
             }
         except Exception as e:
             return {
                 "statusCode": 500,
                 "body": json.dumps({"error": str(e)})
             }
+
+    if event["httpMethod"] == "POST":
+        # The request contract lives in feedback_http so service.py serves the same one.
+        # Invocation responses are buffered, so only service.py streams NDJSON
+        status, headers, body = handle_post(event["body"], allow_stream=False)
+        response = {"statusCode": status, "body": body}
+        if headers:
+            response["headers"] = headers
+        return response
     return {
         "statusCode": 405,
         "body": "Method Not Allowed"
     }
-
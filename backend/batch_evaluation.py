@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+from AIOperationsService import (
+    FEEDBACK_MODEL,
+    PROMPT_TEMPLATE_VERSION,
+    evaluate_with_status,
+    record_shared_evaluation,
+)
+from feedback_cache import make_cache_key
+
+MIN_CONTENT_LENGTH = 20
+# Upper bound on a batch's concurrency, whatever the request asks for
+MAX_CONCURRENCY_LIMIT = int(os.getenv("BATCH_MAX_CONCURRENCY_LIMIT", "16"))
+
+
+class BatchProgress:
+    """
+    Append-only JSONL journal of finished evaluations, keyed by content key.
+    Re-running a batch with the same journal skips everything already in it.
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.completed: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self.completed[entry["key"]] = entry["feedback"]
+                    except (json.JSONDecodeError, KeyError, TypeError):
+                        # A crash mid-write leaves at most one torn trailing line
+                        continue
+
+    def record(self, key: str, feedback: Dict[str, Any]) -> None:
+        if not self.path:
+            return
+        line = json.dumps({"key": key, "feedback": feedback}) + "\n"
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+
+def _validate(essay: Any) -> Optional[str]:
+    if not isinstance(essay, dict):
+        return "Essay must be an object"
+    content = essay.get("content")
+    if not content or not isinstance(content, str):
+        return "Content is required"
+    if len(content.strip()) < MIN_CONTENT_LENGTH:
+        return "Content is too short to evaluate"
+    return None
+
+
+def evaluate_batch(
+    essays: List[Dict[str, Any]],
+    max_concurrency: Optional[int] = None,
+    progress_path: Optional[str] = None,
+    tenant: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Evaluates a list of essays ({"id", "content", "textType", "assistanceLevel",
+    optionally "studentId" for the evaluation store}) with at most
+    `max_concurrency` model calls in flight, capped at
+    BATCH_MAX_CONCURRENCY_LIMIT. Identical submissions are evaluated once and
+    recorded in each of their students' histories. A
+    failing essay is reported in "errors" and never fails the batch. With
+    `progress_path`, finished evaluations are journaled so a re-run after a
+    crash resumes where it stopped. Evaluations run in the scheduler's batch
+    class, sharing its slots fairly with other `tenant`s' batches and never
+    ahead of interactive requests.
+    """
+    started = time.perf_counter()
+    if max_concurrency is None:
+        max_concurrency = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+    max_concurrency = max(1, min(int(max_concurrency), MAX_CONCURRENCY_LIMIT))
+    progress = BatchProgress(progress_path)
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(essays)
+    errors: List[Dict[str, Any]] = []
+    groups: Dict[str, List[int]] = {}
+    for index, essay in enumerate(essays):
+        essay_id = essay.get("id", str(index)) if isinstance(essay, dict) else str(index)
+        error = _validate(essay)
+        if error:
+            errors.append({"id": essay_id, "index": index, "error": error})
+            continue
+        key = make_cache_key(
+            essay["content"], essay.get("textType"), essay.get("assistanceLevel"),
+            FEEDBACK_MODEL, PROMPT_TEMPLATE_VERSION,
+        )
+        groups.setdefault(key, []).append(index)
+
+    def store(key: str, feedback: Dict[str, Any], status: str) -> None:
+        for index in groups[key]:
+            essay = essays[index]
+            # Each student's copy of a shared evaluation is recorded in their history
+            # (idempotent, so a resumed batch records nothing twice)
+            student_feedback = record_shared_evaluation(
+                feedback, essay["content"], essay.get("textType"), essay.get("studentId")
+            )
+            results[index] = {"id": essay.get("id", str(index)), "status": status, "feedback": student_feedback}
+
+    pending = []
+    for key in groups:
+        if key in progress.completed:
+            store(key, progress.completed[key], "ok")
+        else:
+            pending.append(key)
+
+    def run(key: str):
+        essay = essays[groups[key][0]]
+        return evaluate_with_status(essay["content"], essay.get("textType"), essay.get("assistanceLevel"),
+                                    student_id=essay.get("studentId"), priority="batch", tenant=tenant or "batch")
+
+    failed = 0
+    if pending:
+        with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="batch-eval") as executor:
+            futures = {executor.submit(run, key): key for key in pending}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    feedback, complete = future.result()
+                except Exception as e:
+                    failed += 1
+                    for index in groups[key]:
+                        essay = essays[index]
+                        errors.append({"id": essay.get("id", str(index)), "index": index, "error": str(e)})
+                    continue
+                # Degraded (fallback) and provisional results are returned but not
+                # journaled, so a re-run retries them
+                if complete:
+                    progress.record(key, feedback)
+                    status = "ok"
+                else:
+                    status = "provisional" if feedback.get("provisional") else "degraded"
+                store(key, feedback, status)
+
+    errors.sort(key=lambda e: e["index"])
+    return {
+        "results": [r for r in results if r is not None],
+        "errors": errors,
+        "summary": {
+            "total": len(essays),
+            "unique": len(groups),
+            "evaluated": len(pending) - failed,
+            "resumed": len(groups) - len(pending),
+            "deduplicated": sum(len(indexes) - 1 for indexes in groups.values()),
+            "failed": len(errors),
+            "elapsedMs": round((time.perf_counter() - started) * 1000, 1),
+        },
+    }
@@ -0,0 +1,128 @@
+"""
+Cold-start benchmark for the ai-feedback handler.
+
+Each run starts a fresh interpreter that imports ai-feedback.py and serves one
+POST against a local fake OpenAI server and the stub LanguageTool engine, so
+the numbers are reproducible offline. Reports import time and
+import-to-first-response time, and fails when the median regresses past the
+stored baseline by more than --tolerance.
+
+    python benchmarks/cold_start.py --runs 15
+    python benchmarks/cold_start.py --update-baseline
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fake_openai import FakeOpenAIServer  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "cold_start_baseline.json")
+
+CHILD = r"""
+import sys, json, time, importlib.util
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location("ai_feedback", sys.argv[1])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+imported = time.perf_counter()
+event = {"httpMethod": "POST", "body": json.dumps({
+    "content": (
+        "Once upon a time there was a girl called Mia who found teh key to a secret garden. "
+        "The gate creaked open and a cold wind rushed past her as she stepped inside. "
+        "Roses climbed over the crumbling walls and a fountain whispered in the middle of the lawn. "
+        "Mia knew she should go home becuase it was getting dark, but she could not stop exploring. "
+        "Behind the fountain she found a tiny door with her own name carved above it."
+    ),
+    "textType": "narrative", "assistanceLevel": "moderate"})}
+response = module.handler(event, None)
+finished = time.perf_counter()
+print(json.dumps({"importMs": (imported - started) * 1000,
+                  "firstResponseMs": (finished - started) * 1000,
+                  "statusCode": response["statusCode"],
+                  "provisional": bool(json.loads(response["body"]).get("provisional"))}))
+"""
+
+
+def run_once(base_url: str) -> Dict[str, float]:
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY="benchmark",
+        OPENAI_API_BASE=base_url,
+        FEEDBACK_CACHE_BACKEND="off",
+        # The cold path under test is the model call, never the local pre-score
+        PRESCORE_ENABLED="false",
+        LANGUAGETOOL_FACTORY="stub_language_tool:create_stub_language_tool",
+        PYTHONPATH=os.pathsep.join([BACKEND_DIR, BENCH_DIR]),
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD, os.path.join(BACKEND_DIR, "ai-feedback.py")],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    measurement = json.loads(result.stdout.strip().splitlines()[-1])
+    if measurement["statusCode"] != 200:
+        raise RuntimeError(f"Handler returned {measurement['statusCode']}: {result.stdout}")
+    if measurement["provisional"]:
+        raise RuntimeError("Handler answered with a local pre-score; the model path was not measured")
+    return measurement
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "median": round(statistics.median(ordered), 2),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+        "min": round(ordered[0], 2),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed fractional regression of the median")
+    args = parser.parse_args()
+
+    with FakeOpenAIServer() as server:
+        runs = [run_once(server.base_url) for _ in range(args.runs)]
+
+    report = {
+        "runs": args.runs,
+        "python": sys.version.split()[0],
+        "importMs": summarize([r["importMs"] for r in runs]),
+        "firstResponseMs": summarize([r["firstResponseMs"] for r in runs]),
+    }
+    print(json.dumps(report, indent=2))
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found; run with --update-baseline to record one")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressed = False
+    for metric in ("importMs", "firstResponseMs"):
+        limit = baseline[metric]["median"] * (1 + args.tolerance)
+        current = report[metric]["median"]
+        status = "OK" if current <= limit else "REGRESSION"
+        regressed |= current > limit
+        print(f"{metric}: median {current:.1f}ms vs baseline {baseline[metric]['median']:.1f}ms ({status})")
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
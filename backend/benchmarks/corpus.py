@@ -0,0 +1,108 @@
+"""
+Synthetic essay corpus for benchmarks: reproducible narrative and persuasive
+essays of varied length, with a sprinkling of the misspellings the stub
+LanguageTool engine flags, and small edits that mimic a student revising.
+"""
+import random
+from typing import Dict, List
+
+# Target word counts: a short draft, a typical test answer, a long answer and
+# one long enough to be split into prompt windows
+LENGTHS = {"short": 60, "medium": 250, "long": 600, "very_long": 1600}
+
+_OPENINGS = {
+    "narrative": [
+        "Once upon a time there was a girl named {name} who lived near the {place}.",
+        "Early one morning {name} woke to a strange noise coming from the {place}.",
+        "It was the last day of summer when {name} found a map hidden in the {place}.",
+    ],
+    "persuasive": [
+        "Every student should have the chance to visit the {place}.",
+        "I strongly believe that our school needs a new {place}.",
+        "Many people think the {place} is a waste of money, but I disagree.",
+    ],
+}
+_SENTENCES = {
+    "narrative": [
+        "{name} walked slowly towards the {place}, heart pounding with every step.",
+        "Suddenly the wind howled and the old door creaked open.",
+        "The shadows stretched across the floor like long fingers.",
+        "{name} took a deep breath and decided to keep going becuase turning back felt worse.",
+        "A tiny silver key glittered in the dust beside an ancient wooden chest.",
+        "Without warning, a voice whispered from somewhere behind the shelves.",
+        "{name} felt a shiver run down their spine but refused to give up.",
+        "The room smelled of rain, old paper and teh faint sweetness of roses.",
+        "At that moment everything {name} had been told about the {place} made sense.",
+        "Outside, the storm finally began to fade into a quiet grey drizzle.",
+    ],
+    "persuasive": [
+        "Firstly, the {place} gives students a safe space to learn new skills.",
+        "Research shows that children who spend time outdoors are healthier and happier.",
+        "Secondly, it would bring the whole community together on weekends.",
+        "Some people argue that it costs too much, but the benefits are definately worth it.",
+        "Imagine how much more confident students would feel with the right support.",
+        "Furthermore, local businesses would recieve more visitors and customers.",
+        "Teachers have said that a {place} would make lessons more engaging.",
+        "It is also important to think about the students who have nowhere else to go.",
+        "Without it, many young people will miss out on alot of opportunities.",
+        "Therefore, investing in a {place} is a decision our town will never regret.",
+    ],
+}
+_CLOSINGS = {
+    "narrative": "In the end {name} learned that courage is simply being afraid and going anyway.",
+    "persuasive": "In conclusion, the {place} is a smart investment in our future and we should build it now.",
+}
+_NAMES = ["Mia", "Leo", "Ava", "Noah", "Zara", "Oliver", "Isla", "Kai"]
+_PLACES = ["lighthouse", "library", "old mill", "forest", "museum", "garden", "harbour", "sports centre"]
+_EDITS = [("becuase", "because"), ("teh", "the"), ("definately", "definitely"), ("recieve", "receive"),
+          ("alot", "a lot"), ("walked", "crept"), ("Suddenly", "All of a sudden"), ("happier", "more cheerful")]
+
+
+def make_essay(rng: random.Random, text_type: str, target_words: int) -> str:
+    fill = {"name": rng.choice(_NAMES), "place": rng.choice(_PLACES)}
+    sentences = [rng.choice(_OPENINGS[text_type]).format(**fill)]
+    words = len(sentences[0].split())
+    closing = _CLOSINGS[text_type].format(**fill)
+    while words < target_words - len(closing.split()):
+        sentence = rng.choice(_SENTENCES[text_type]).format(**fill)
+        sentences.append(sentence)
+        words += len(sentence.split())
+    sentences.append(closing)
+
+    # Four to six sentences per paragraph
+    paragraphs, current = [], []
+    for sentence in sentences:
+        current.append(sentence)
+        if len(current) >= rng.randint(4, 6):
+            paragraphs.append(" ".join(current))
+            current = []
+    if current:
+        paragraphs.append(" ".join(current))
+    return "\n\n".join(paragraphs)
+
+
+def synthetic_corpus(count: int, seed: int = 7, lengths: Dict[str, int] = LENGTHS) -> List[Dict[str, str]]:
+    """`count` essays cycling through the length classes and both text types."""
+    rng = random.Random(seed)
+    classes = list(lengths.items())
+    essays = []
+    for i in range(count):
+        length_class, target = classes[i % len(classes)]
+        text_type = "narrative" if i % 2 == 0 else "persuasive"
+        essays.append({
+            "id": f"essay-{i}",
+            "lengthClass": length_class,
+            "textType": text_type,
+            "assistanceLevel": "moderate",
+            "content": make_essay(rng, text_type, target),
+        })
+    return essays
+
+
+def revise(content: str, rng: random.Random) -> str:
+    """A small student edit: fixes a typo or swaps a word when one is available, else appends a sentence."""
+    candidates = [(old, new) for old, new in _EDITS if old in content]
+    if candidates:
+        old, new = rng.choice(candidates)
+        return content.replace(old, new, 1)
+    return content + " " + rng.choice(_SENTENCES["narrative"]).format(name="They", place="garden")
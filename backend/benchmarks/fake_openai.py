@@ -0,0 +1,186 @@
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+# A canned evaluation in the shape get_nsw_selective_feedback asks the model for
+CANNED_FEEDBACK: Dict[str, Any] = {
+    "overallScore": 72,
+    "criteriaScores": {
+        "ideasAndContent": 4,
+        "textStructureAndOrganization": 3,
+        "languageFeaturesAndVocabulary": 3,
+        "spellingPunctuationAndGrammar": 4,
+    },
+    "feedbackCategories": [
+        {
+            "category": category,
+            "score": score,
+            "strengths": [
+                {"exampleFromText": "the", "position": {"start": 0, "end": 3}, "comment": "Clear opening."}
+            ],
+            "areasForImprovement": [
+                {"exampleFromText": "was", "position": {"start": 10, "end": 13},
+                 "suggestionForImprovement": "Use a more vivid verb."}
+            ],
+        }
+        for category, score in (
+            ("Ideas and Content", 4),
+            ("Text Structure and Organization", 3),
+            ("Language Features and Vocabulary", 3),
+            ("Spelling, Punctuation, and Grammar", 4),
+        )
+    ],
+    "grammarCorrections": [],
+    "vocabularyEnhancements": [
+        {"original": "good", "suggestion": "remarkable", "explanation": "More precise.", "position": {"start": 0, "end": 4}}
+    ],
+}
+
+
+class FakeOpenAIServer:
+    """
+    Minimal OpenAI-compatible /chat/completions endpoint for offline runs.
+    Supports blocking and streamed (SSE) responses with a fixed latency plus
+    up to `jitter_ms` of random extra latency. A share `error_rate` of
+    requests fails with a retryable 500 or 429, and a share `truncate_rate`
+    returns JSON cut off part-way, as a response that hit max_tokens would.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0,
+                 jitter_ms: float = 0.0, error_rate: float = 0.0, truncate_rate: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.truncate_rate = truncate_rate
+        self.requests = 0
+        self.errors = 0
+        self.truncated = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._server.server_address[:2]
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.address
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def completion_body(self, request: Dict[str, Any]) -> str:
+        return json.dumps(CANNED_FEEDBACK)
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                with fake._lock:
+                    fake.requests += 1
+                    delay = fake.latency_ms + fake._random.uniform(0, fake.jitter_ms)
+                    fail = fake._random.random() < fake.error_rate
+                    truncate = not fail and fake._random.random() < fake.truncate_rate
+                    cut = fake._random.uniform(0.3, 0.9)
+                    fake.errors += fail
+                    fake.truncated += truncate
+                if delay:
+                    time.sleep(delay / 1000)
+                if fail:
+                    fake.fail(self)
+                else:
+                    fake.respond(self, request, cut if truncate else None)
+
+        return Handler
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"requests": self.requests, "errors": self.errors, "truncated": self.truncated}
+
+    def fail(self, handler: BaseHTTPRequestHandler) -> None:
+        status = self._random.choice((429, 500))
+        body = json.dumps({"error": {"message": "Injected failure", "type": "server_error"}}).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(body)))
+        if status == 429:
+            handler.send_header("Retry-After", "0.05")
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def respond(self, handler: BaseHTTPRequestHandler, request: Dict[str, Any], cut: Optional[float] = None) -> None:
+        content = self.completion_body(request)
+        if cut is not None:
+            content = content[:int(len(content) * cut)]
+        model = request.get("model", "fake-model")
+        usage = {"prompt_tokens": 900, "completion_tokens": len(content) // 4,
+                 "total_tokens": 900 + len(content) // 4}
+
+        if request.get("stream"):
+            handler.send_response(200)
+            handler.send_header("Content-Type", "text/event-stream")
+            handler.send_header("Connection", "close")
+            handler.end_headers()
+            for i in range(0, len(content), 40):
+                chunk = {"id": "fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                         "choices": [{"index": 0, "delta": {"content": content[i:i + 40]}, "finish_reason": None}]}
+                handler.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            final = {"id": "fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                     "choices": [], "usage": usage}
+            handler.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+            handler.close_connection = True
+            return
+
+        body = json.dumps({
+            "id": "fake", "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        }).encode()
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve a fake OpenAI-compatible API")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--truncate-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server = FakeOpenAIServer(port=args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                              error_rate=args.error_rate, truncate_rate=args.truncate_rate)
+    print(f"Fake OpenAI API at {server.base_url}")
+    server._server.serve_forever()
@@ -0,0 +1,230 @@
+"""
+Offline load test for the feedback backend.
+
+Starts the fake OpenAI server (configurable latency, error rate and
+truncated-JSON injection) and runs each scenario in a fresh interpreter with
+the stub LanguageTool engine, so peak RSS is per scenario and nothing touches
+the network. Scenarios:
+
+    single    sequential evaluations of the synthetic corpus
+    burst     bursts of --concurrency simultaneous requests
+    batch     whole-class marking through the batch endpoint
+    editing   students resubmitting small revisions (cache + revision-aware mode)
+
+single and burst run against both the ai-feedback.py handler and
+get_nsw_selective_feedback; batch goes through the handler, editing through
+get_nsw_selective_feedback. Reports p50/p95/p99 latency, throughput, model
+calls and peak RSS, and fails when p95 or throughput regress past the stored
+baseline by more than --tolerance.
+
+    python benchmarks/load_test.py --latency-ms 300 --error-rate 0.05 --truncate-rate 0.05
+    python benchmarks/load_test.py --update-baseline
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+from typing import Any, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fake_openai import FakeOpenAIServer  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "load_baseline.json")
+SCENARIOS = ("single", "burst", "batch", "editing")
+TARGETS = {"single": ("handler", "function"), "burst": ("handler", "function"),
+           "batch": ("handler",), "editing": ("function",)}
+
+
+# --- Child process: runs one scenario against one target ---
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_scenario(scenario: str, target: str, args: Dict[str, Any]) -> Dict[str, Any]:
+    import time
+    import random
+    import resource
+    import importlib.util
+    from concurrent.futures import ThreadPoolExecutor
+    from corpus import revise, synthetic_corpus
+
+    sys.path.insert(0, BACKEND_DIR)
+    spec = importlib.util.spec_from_file_location("ai_feedback", os.path.join(BACKEND_DIR, "ai-feedback.py"))
+    ai_feedback = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(ai_feedback)
+    from AIOperationsService import get_nsw_selective_feedback
+
+    essays = synthetic_corpus(args["essays"], seed=args["seed"])
+    degraded = 0
+
+    def evaluate(essay: Dict[str, Any], **options) -> float:
+        nonlocal degraded
+        started = time.perf_counter()
+        if target == "handler":
+            body = dict(content=essay["content"], textType=essay["textType"],
+                        assistanceLevel=essay["assistanceLevel"], **options)
+            response = ai_feedback.handler({"httpMethod": "POST", "body": json.dumps(body)}, None)
+            feedback = json.loads(response["body"]) if response["statusCode"] == 200 else None
+        else:
+            feedback = get_nsw_selective_feedback(essay["content"], essay["textType"], essay["assistanceLevel"], **options)
+        elapsed = (time.perf_counter() - started) * 1000
+        categories = (feedback or {}).get("feedbackCategories") or [{}]
+        if (feedback is None or feedback.get("partialSections") or feedback.get("provisional")
+                or categories[0].get("category") == "Error"):
+            degraded += 1
+        return elapsed
+
+    latencies: List[float] = []
+    started = time.perf_counter()
+    if scenario == "single":
+        latencies = [evaluate(essay) for essay in essays]
+    elif scenario == "burst":
+        with ThreadPoolExecutor(max_workers=args["concurrency"]) as executor:
+            for offset in range(0, len(essays), args["concurrency"]):
+                latencies.extend(executor.map(evaluate, essays[offset:offset + args["concurrency"]]))
+    elif scenario == "batch":
+        class_size = args["concurrency"] * 4
+        for offset in range(0, len(essays), class_size):
+            group = essays[offset:offset + class_size]
+            batch_started = time.perf_counter()
+            response = ai_feedback.handler({"httpMethod": "POST", "body": json.dumps({"essays": group})}, None)
+            latencies.append((time.perf_counter() - batch_started) * 1000)
+            if response["statusCode"] != 200:
+                degraded += len(group)
+                continue
+            batch = json.loads(response["body"])
+            # Failed essays, plus fallback, partial and provisional results
+            degraded += len(batch.get("errors", [])) + sum(
+                1 for result in batch.get("results", []) if result.get("status") != "ok"
+            )
+    elif scenario == "editing":
+        rng = random.Random(args["seed"])
+        students = essays[:max(1, len(essays) // args["revisions"])]
+        for student_index, essay in enumerate(students):
+            draft = dict(essay)
+            for _ in range(args["revisions"]):
+                latencies.append(evaluate(draft, student_id=f"student-{student_index}", revision_aware=True))
+                draft = dict(draft, content=revise(draft["content"], rng))
+    elapsed = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    return {
+        "scenario": scenario,
+        "target": target,
+        "requests": len(latencies),
+        "degraded": degraded,
+        "p50Ms": round(_percentile(ordered, 0.50), 2),
+        "p95Ms": round(_percentile(ordered, 0.95), 2),
+        "p99Ms": round(_percentile(ordered, 0.99), 2),
+        "throughputPerSec": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        # ru_maxrss is in kilobytes on Linux
+        "peakRssMb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+# --- Parent process ---
+
+def spawn(scenario: str, target: str, base_url: str, args: argparse.Namespace) -> Dict[str, Any]:
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY="benchmark",
+        OPENAI_API_BASE=base_url,
+        LANGUAGETOOL_FACTORY="stub_language_tool:create_stub_language_tool",
+        STUB_LANGUAGETOOL_LATENCY_MS=str(args.grammar_latency_ms),
+        FEEDBACK_CACHE_BACKEND="memory" if scenario == "editing" else "off",
+        MODEL_MAX_RETRIES=os.environ.get("MODEL_MAX_RETRIES", "3"),
+        PYTHONPATH=os.pathsep.join([BACKEND_DIR, BENCH_DIR]),
+    )
+    child_args = {"essays": args.essays, "seed": args.seed, "concurrency": args.concurrency,
+                  "revisions": args.revisions}
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", scenario, target, json.dumps(child_args)],
+        env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{scenario}/{target} failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> bool:
+    previous = {(r["scenario"], r["target"]): r for r in baseline.get("results", [])}
+    regressed = False
+    for result in report["results"]:
+        before = previous.get((result["scenario"], result["target"]))
+        if before is None:
+            continue
+        slower = result["p95Ms"] > before["p95Ms"] * (1 + tolerance)
+        fewer = result["throughputPerSec"] < before["throughputPerSec"] * (1 - tolerance)
+        status = "REGRESSION" if slower or fewer else "OK"
+        regressed |= slower or fewer
+        print(f"{result['scenario']}/{result['target']}: p95 {result['p95Ms']:.1f}ms vs {before['p95Ms']:.1f}ms, "
+              f"{result['throughputPerSec']:.1f}/s vs {before['throughputPerSec']:.1f}/s ({status})")
+    return regressed
+
+
+def main() -> int:
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        print(json.dumps(run_scenario(sys.argv[2], sys.argv[3], json.loads(sys.argv[4]))))
+        return 0
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--essays", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--revisions", type=int, default=4, help="drafts per student in the editing scenario")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--truncate-rate", type=float, default=0.0)
+    parser.add_argument("--grammar-latency-ms", type=float, default=20.0)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed fractional regression")
+    args = parser.parse_args()
+
+    results = []
+    with FakeOpenAIServer(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                          truncate_rate=args.truncate_rate, seed=args.seed) as server:
+        for scenario in args.scenarios.split(","):
+            for target in TARGETS[scenario]:
+                before = server.stats()
+                result = spawn(scenario, target, server.base_url, args)
+                after = server.stats()
+                result["modelCalls"] = after["requests"] - before["requests"]
+                result["injectedErrors"] = after["errors"] - before["errors"]
+                result["injectedTruncations"] = after["truncated"] - before["truncated"]
+                results.append(result)
+
+    report = {
+        "python": sys.version.split()[0],
+        "config": {key: value for key, value in vars(args).items()
+                   if key not in ("baseline", "update_baseline", "tolerance", "scenarios")},
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("No baseline found; run with --update-baseline to record one")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("config") != report["config"]:
+        print("Baseline was recorded with a different configuration; comparison is indicative only")
+    return 1 if compare(report, baseline, args.tolerance) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Microbenchmark for the feedback result model.
+
+Compares holding parsed responses as nested dicts (what json.loads returns)
+with the slotted result model from feedback_model.py: retained memory and
+allocation per response, build time and serialization time.
+
+    python benchmarks/result_model.py --responses 2000
+"""
+import os
+import sys
+import copy
+import json
+import time
+import argparse
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fake_openai import CANNED_FEEDBACK  # noqa: E402
+from feedback_model import parse_feedback  # noqa: E402
+
+
+def sample_response() -> Dict[str, Any]:
+    """A typical full response: canned model output plus grammar items and metadata."""
+    feedback = copy.deepcopy(CANNED_FEEDBACK)
+    for category in feedback["feedbackCategories"]:
+        category["strengths"] *= 3
+        category["areasForImprovement"] *= 3
+    feedback["grammarCorrections"] = [
+        {"original": "teh", "suggestion": "the", "explanation": "Possible spelling mistake found.",
+         "position": {"start": 40 + i * 10, "end": 43 + i * 10}, "type": "spelling-error", "severity": "error"}
+        for i in range(6)
+    ]
+    feedback["vocabularyEnhancements"] *= 5
+    feedback.update(modelVersion="gpt-4", id="generated-id", timings={"modelLatencyMs": 1234.5, "totalMs": 1302.1})
+    return feedback
+
+
+def measure(label: str, build: Callable[[str], Any], payloads: List[str]) -> Dict[str, float]:
+    tracemalloc.start()
+    started = time.perf_counter()
+    retained = [build(payload) for payload in payloads]
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(retained)
+    return {
+        "label": label,
+        "retainedBytesPerResponse": round(current / count),
+        "peakBytesPerResponse": round(peak / count),
+        "buildUsPerResponse": round(elapsed / count * 1e6, 1),
+        "_retained": retained,
+    }
+
+
+def time_serialization(objects: List[Any], to_body: Callable[[Any], str]) -> float:
+    started = time.perf_counter()
+    for obj in objects:
+        to_body(obj)
+    return round((time.perf_counter() - started) / len(objects) * 1e6, 1)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--responses", type=int, default=2000)
+    args = parser.parse_args()
+
+    # Distinct JSON documents, so neither side benefits from shared strings
+    base = sample_response()
+    payloads = []
+    for i in range(args.responses):
+        base["id"] = f"response-{i}"
+        payloads.append(json.dumps(base))
+
+    as_dicts = measure("dict", json.loads, payloads)
+    as_model = measure("model", lambda payload: parse_feedback(json.loads(payload))[0], payloads)
+
+    compact = {"separators": (",", ":"), "check_circular": False}
+    as_dicts["serializeUsPerResponse"] = time_serialization(as_dicts["_retained"], lambda d: json.dumps(d))
+    as_model["serializeUsPerResponse"] = time_serialization(
+        as_model["_retained"], lambda m: json.dumps(m.to_dict(), **compact)
+    )
+    as_model["frontendUsPerResponse"] = time_serialization(
+        as_model["_retained"], lambda m: json.dumps(m.to_frontend(), **compact)
+    )
+
+    report = []
+    for result in (as_dicts, as_model):
+        result.pop("_retained")
+        report.append(result)
+    saved = 1 - as_model["retainedBytesPerResponse"] / as_dicts["retainedBytesPerResponse"]
+    print(json.dumps({"responses": args.responses, "results": report,
+                      "retainedReduction": round(saved, 3)}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+import os
+import re
+import time
+from typing import List
+
+# A handful of common misspellings, enough to exercise the grammar path
+_MISSPELLINGS = {"teh": "the", "becuase": "because", "recieve": "receive", "definately": "definitely", "alot": "a lot"}
+_WORD = re.compile(r"[A-Za-z]+")
+
+
+class _Match:
+    def __init__(self, offset: int, length: int, replacement: str):
+        self.offset = offset
+        self.errorLength = length
+        self.replacements = [replacement]
+        self.message = "Possible spelling mistake found."
+        self.ruleId = "MORFOLOGIK_RULE_EN_US"
+        self.ruleIssueType = "misspelling"
+
+
+class StubLanguageTool:
+    """Stands in for language_tool_python.LanguageTool without starting a JVM."""
+
+    def __init__(self, check_latency_ms: float = 0.0):
+        self.check_latency_ms = check_latency_ms
+
+    def check(self, text: str) -> List[_Match]:
+        if self.check_latency_ms:
+            time.sleep(self.check_latency_ms / 1000)
+        return [
+            _Match(m.start(), len(m.group()), _MISSPELLINGS[m.group().lower()])
+            for m in _WORD.finditer(text)
+            if m.group().lower() in _MISSPELLINGS
+        ]
+
+    def close(self) -> None:
+        pass
+
+
+def create_stub_language_tool() -> StubLanguageTool:
+    """
+    Factory for LANGUAGETOOL_FACTORY=stub_language_tool:create_stub_language_tool.
+    STUB_LANGUAGETOOL_LATENCY_MS adds a per-check delay to mimic a real engine.
+    """
+    return StubLanguageTool(float(os.getenv("STUB_LANGUAGETOOL_LATENCY_MS", "0")))
@@ -0,0 +1,108 @@
+import re
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import List, Tuple
+
+# Words as the vocabulary and spelling passes see them; "’" counts as an apostrophe
+TOKEN = re.compile(r"[A-Za-z]+(?:['’][A-Za-z]+)*")
+# A blank line ends a paragraph (LF or CRLF line endings); grammar chunks and
+# prompt windows split on the same boundary
+PARAGRAPH_BREAK = re.compile(r"\r?\n[ \t]*\r?\n\s*")
+SENTENCE_END = re.compile(r"[.!?]+(?=\s|$)")
+# Characters outside the Basic Multilingual Plane take two UTF-16 code units
+_ASTRAL = re.compile("[\U00010000-\U0010FFFF]")
+
+Span = Tuple[int, int]
+
+
+def _sentence_spans(text: str, start: int, end: int) -> List[Span]:
+    """Sentences of text[start:end], each ending after its punctuation and without leading whitespace."""
+    spans = []
+    for match in SENTENCE_END.finditer(text, start, end):
+        _add_trimmed(spans, text, start, match.end())
+        start = match.end()
+    _add_trimmed(spans, text, start, end)
+    return spans
+
+
+def _add_trimmed(spans: List[Span], text: str, start: int, end: int) -> None:
+    piece = text[start:end]
+    stripped = piece.lstrip()
+    if stripped.strip():
+        spans.append((start + len(piece) - len(stripped), end))
+
+
+class EssayIndex:
+    """
+    Everything the pipeline needs to know about an essay's layout, computed
+    once: word tokens, whitespace word count, sentence and paragraph spans,
+    and the code point to UTF-16 offset mapping for the frontend.
+
+    Offsets are Python code point indices throughout; utf16() converts one
+    for JavaScript consumers. Most essays have no astral characters (emoji),
+    so the mapping is usually the identity and costs nothing.
+    """
+
+    __slots__ = ("text", "tokens", "words", "word_count", "paragraphs", "sentences", "_astral")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens: List[Span] = [match.span() for match in TOKEN.finditer(text)]
+        self.words: List[str] = [text[start:end].lower().replace("’", "'") for start, end in self.tokens]
+        self.word_count = len(text.split())
+
+        self.paragraphs: List[Span] = []
+        start = 0
+        for brk in PARAGRAPH_BREAK.finditer(text):
+            if brk.start() > start:
+                self.paragraphs.append((start, brk.start()))
+            start = brk.end()
+        if start < len(text):
+            self.paragraphs.append((start, len(text)))
+
+        # A paragraph break ends a sentence even without punctuation (titles, lists)
+        self.sentences: List[Span] = []
+        for paragraph_start, paragraph_end in self.paragraphs:
+            self.sentences.extend(_sentence_spans(text, paragraph_start, paragraph_end))
+
+        # Code point offsets of the astral characters, in order
+        self._astral: List[int] = [] if text.isascii() else [m.start() for m in _ASTRAL.finditer(text)]
+
+    @property
+    def has_astral(self) -> bool:
+        return bool(self._astral)
+
+    def utf16(self, offset: int) -> int:
+        """The UTF-16 code unit offset of code point `offset`."""
+        if not self._astral:
+            return offset
+        return offset + bisect_left(self._astral, offset)
+
+    def paragraph_texts(self) -> List[Tuple[int, str]]:
+        return [(start, self.text[start:end]) for start, end in self.paragraphs]
+
+
+_indexes: "OrderedDict[str, EssayIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+_MAX_INDEXES = 64
+
+
+def essay_index(text: str) -> EssayIndex:
+    """
+    The EssayIndex for `text`, shared by every stage that looks at the same
+    essay (grammar, vocabulary, spelling, scoring, prompt windows, positions)
+    across threads. Recent essays are memoized; a str caches its own hash, so
+    repeat lookups for the same essay are dictionary hits.
+    """
+    with _indexes_lock:
+        index = _indexes.get(text)
+        if index is not None:
+            _indexes.move_to_end(text)
+            return index
+    index = EssayIndex(text)
+    with _indexes_lock:
+        _indexes[text] = index
+        while len(_indexes) > _MAX_INDEXES:
+            _indexes.popitem(last=False)
+    return index
@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import uuid
+import atexit
+import threading
+from typing import Any, Dict, List, Optional
+
+from local_scorer import CRITERIA_WEIGHTS
+
+# Tracked per student: the overall score and each rubric criterion
+CRITERIA = ("overallScore",) + tuple(CRITERIA_WEIGHTS)
+# Aggregates across every text type are kept under this text type
+ALL_TYPES = "*"
+
+
+def new_evaluation_id() -> str:
+    return str(uuid.uuid4())
+
+
+def _score(value: Any) -> Optional[float]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value)
+
+
+def _scores(feedback: Dict[str, Any]) -> Dict[str, float]:
+    criteria = feedback.get("criteriaScores")
+    criteria = criteria if isinstance(criteria, dict) else {}
+    scores = {name: _score(criteria.get(name)) for name in CRITERIA_WEIGHTS}
+    scores["overallScore"] = _score(feedback.get("overallScore"))
+    return {name: score for name, score in scores.items() if score is not None}
+
+
+class EvaluationStore:
+    """
+    Append-only SQLite log of finished evaluations, keyed by evaluation id,
+    with indexes by student, text type and time. Per student, text type and
+    criterion it also maintains running aggregates (count, mean, best, latest
+    and an exponentially weighted rolling score) in the same transaction as
+    each insert, so progress queries read a handful of rows instead of the
+    history.
+
+    Rows are never updated or deleted; rebuild_aggregates() recomputes the
+    derived table from the log (after changing `alpha`, for example).
+    """
+
+    def __init__(self, path: str, alpha: float = 0.3):
+        self.path = path
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        import sqlite3  # Only loaded when the store is configured
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL with NORMAL sync survives a process crash and costs no fsync per insert
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS evaluations ("
+            " id TEXT PRIMARY KEY, student_id TEXT, text_type TEXT NOT NULL, created_at REAL NOT NULL,"
+            " overall_score REAL, scores TEXT NOT NULL, word_count INTEGER, model TEXT, feedback TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS evaluations_student_time ON evaluations (student_id, created_at);"
+            "CREATE INDEX IF NOT EXISTS evaluations_student_type_time ON evaluations (student_id, text_type, created_at);"
+            "CREATE INDEX IF NOT EXISTS evaluations_type_time ON evaluations (text_type, created_at);"
+            "CREATE INDEX IF NOT EXISTS evaluations_time ON evaluations (created_at);"
+            "CREATE TABLE IF NOT EXISTS criterion_aggregates ("
+            " student_id TEXT NOT NULL, text_type TEXT NOT NULL, criterion TEXT NOT NULL,"
+            " count INTEGER NOT NULL, total REAL NOT NULL, best REAL NOT NULL, latest REAL NOT NULL,"
+            " rolling REAL NOT NULL, delta REAL NOT NULL, updated_at REAL NOT NULL,"
+            " PRIMARY KEY (student_id, text_type, criterion)) WITHOUT ROWID;"
+        )
+        self._conn.commit()
+
+    def record(self, feedback: Dict[str, Any], student_id: Optional[str], text_type: Optional[str],
+               word_count: Optional[int] = None, created_at: Optional[float] = None) -> bool:
+        """
+        Appends one evaluation (feedback["id"] is the key). Returns False when
+        that id is already stored; an evaluation is only ever counted once.
+        """
+        evaluation_id = feedback.get("id")
+        if not evaluation_id:
+            raise ValueError("Evaluation has no id")
+        text_type = (text_type or "narrative").lower()
+        created_at = time.time() if created_at is None else created_at
+        scores = _scores(feedback)
+        with self._lock:
+            with self._conn:
+                inserted = self._conn.execute(
+                    "INSERT OR IGNORE INTO evaluations (id, student_id, text_type, created_at, overall_score,"
+                    " scores, word_count, model, feedback) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (evaluation_id, student_id, text_type, created_at, scores.get("overallScore"),
+                     json.dumps(scores), word_count, feedback.get("modelVersion"),
+                     json.dumps(feedback, separators=(",", ":"))),
+                ).rowcount
+                if inserted and student_id:
+                    self._aggregate(student_id, text_type, scores, created_at)
+        return bool(inserted)
+
+    def record_copy(self, feedback: Dict[str, Any], student_id: str, text_type: Optional[str],
+                    word_count: Optional[int] = None) -> str:
+        """
+        Records for `student_id` an evaluation first produced for someone
+        else (a cache hit, a coalesced request, a duplicate essay in a batch):
+        the same feedback under an id derived from the original id and the
+        student, so a student who gets it again is still counted once.
+        Returns the student's evaluation id, which is the original id when
+        the evaluation is already theirs.
+        """
+        evaluation_id = feedback.get("id")
+        if not evaluation_id:
+            raise ValueError("Evaluation has no id")
+        with self._lock:
+            row = self._conn.execute("SELECT student_id FROM evaluations WHERE id = ?", (evaluation_id,)).fetchone()
+        if row is not None and row[0] == student_id:
+            return evaluation_id
+        copy_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"evaluation:{evaluation_id}/student:{student_id}"))
+        self.record(dict(feedback, id=copy_id), student_id, text_type, word_count)
+        return copy_id
+
+    def _aggregate(self, student_id: str, text_type: str, scores: Dict[str, float], created_at: float) -> None:
+        for group in (text_type, ALL_TYPES):
+            for criterion, score in scores.items():
+                row = self._conn.execute(
+                    "SELECT count, total, best, rolling FROM criterion_aggregates"
+                    " WHERE student_id = ? AND text_type = ? AND criterion = ?",
+                    (student_id, group, criterion),
+                ).fetchone()
+                if row is None:
+                    values = (1, score, score, score, score, 0.0)
+                else:
+                    count, total, best, rolling = row
+                    # delta: how this score compares with the student's form before it
+                    values = (count + 1, total + score, max(best, score), score,
+                              rolling + self.alpha * (score - rolling), score - rolling)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO criterion_aggregates (student_id, text_type, criterion, count, total,"
+                    " best, latest, rolling, delta, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (student_id, group, criterion) + values + (created_at,),
+                )
+
+    def get(self, evaluation_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT feedback FROM evaluations WHERE id = ?", (evaluation_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def history(self, student_id: str, text_type: Optional[str] = None, since: Optional[float] = None,
+                until: Optional[float] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """A student's evaluations, newest first, as score summaries (get() has the full feedback)."""
+        query = "SELECT id, text_type, created_at, scores, word_count FROM evaluations WHERE student_id = ?"
+        params: List[Any] = [student_id]
+        if text_type:
+            query += " AND text_type = ?"
+            params.append(text_type.lower())
+        if since is not None:
+            query += " AND created_at >= ?"
+            params.append(since)
+        if until is not None:
+            query += " AND created_at < ?"
+            params.append(until)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        history = []
+        for evaluation_id, row_type, created_at, scores, word_count in rows:
+            scores = json.loads(scores)
+            history.append({
+                "id": evaluation_id,
+                "textType": row_type,
+                "createdAt": created_at,
+                "overallScore": scores.pop("overallScore", None),
+                "criteriaScores": scores,
+                "wordCount": word_count,
+            })
+        return history
+
+    def progress(self, student_id: str, text_type: Optional[str] = None) -> Dict[str, Any]:
+        """Precomputed per-criterion aggregates for a student, for one text type or across all of them."""
+        group = text_type.lower() if text_type else ALL_TYPES
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT criterion, count, total, best, latest, rolling, delta, updated_at FROM criterion_aggregates"
+                " WHERE student_id = ? AND text_type = ?",
+                (student_id, group),
+            ).fetchall()
+        criteria = {}
+        for criterion, count, total, best, latest, rolling, delta, updated_at in rows:
+            criteria[criterion] = {
+                "count": count,
+                "mean": round(total / count, 2),
+                "best": best,
+                "latest": latest,
+                "rolling": round(rolling, 2),
+                "delta": round(delta, 2),
+                "updatedAt": updated_at,
+            }
+        overall = criteria.get("overallScore", {})
+        return {
+            "studentId": student_id,
+            "textType": text_type,
+            "evaluations": overall.get("count", 0),
+            "lastEvaluatedAt": overall.get("updatedAt"),
+            "criteria": criteria,
+        }
+
+    def rebuild_aggregates(self) -> int:
+        """Recomputes every aggregate from the evaluation log; returns the number of evaluations replayed."""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM criterion_aggregates")
+                rows = self._conn.execute(
+                    "SELECT student_id, text_type, scores, created_at FROM evaluations"
+                    " WHERE student_id IS NOT NULL ORDER BY created_at"
+                ).fetchall()
+                for student_id, text_type, scores, created_at in rows:
+                    self._aggregate(student_id, text_type, json.loads(scores), created_at)
+        return len(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_store: Optional[EvaluationStore] = None
+_store_lock = threading.Lock()
+
+
+def get_evaluation_store() -> Optional[EvaluationStore]:
+    """
+    Returns the process-wide store, or None unless EVALUATION_STORE_PATH is
+    set (serverless handlers usually have no writable, persistent disk).
+    """
+    global _store
+    path = os.getenv("EVALUATION_STORE_PATH")
+    if not path:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = EvaluationStore(path, alpha=float(os.getenv("EVALUATION_ROLLING_ALPHA", "0.3")))
+                atexit.register(_store.close)
+    return _store
@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import atexit
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+def normalize_content(content: str) -> str:
+    """
+    Normalization applied before hashing. Only trailing whitespace is dropped:
+    anything that shifts character offsets would make cached positions wrong
+    for the resubmitted text.
+    """
+    return content.rstrip()
+
+
+def make_cache_key(content: str, text_type: Optional[str], assistance_level: Optional[str],
+                   model: str, prompt_version: str) -> str:
+    payload = json.dumps(
+        [prompt_version, model, text_type or "", assistance_level or "", normalize_content(content)],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryCacheBackend:
+    """In-process LRU bounded by entry count and by total serialized size."""
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, expires_at: float) -> None:
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        _, value = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def size(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes}
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteCacheBackend:
+    """
+    File-backed LRU so warm entries survive restarts. Recency is tracked in a
+    last_access column; the least recently used rows are trimmed on write.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._lock = threading.Lock()
+        import sqlite3  # Only the persistent backend needs it
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS feedback_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS feedback_cache_last_access ON feedback_cache (last_access)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM feedback_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM feedback_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE feedback_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return row[0]
+
+    def set(self, key: str, value: str, expires_at: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO feedback_cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, expires_at, time.time()),
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM feedback_cache").fetchone()[0]
+            if count > self.max_entries:
+                excess = count - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM feedback_cache WHERE key IN ("
+                    " SELECT key FROM feedback_cache ORDER BY last_access LIMIT ?)",
+                    (excess,),
+                )
+                self.evictions += excess
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM feedback_cache")
+            self._conn.commit()
+
+    def size(self) -> Dict[str, int]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM feedback_cache"
+            ).fetchone()
+        return {"entries": row[0], "bytes": row[1]}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class FeedbackCache:
+    """Stores finished feedback responses as JSON, so every hit returns a fresh copy."""
+
+    def __init__(self, backend=None, ttl_seconds: float = 24 * 60 * 60):
+        self.backend = backend or MemoryCacheBackend()
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._sets = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            print(f"Feedback cache read failed: {e}")
+            value = None
+        with self._lock:
+            if value is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, feedback: Dict[str, Any]) -> None:
+        try:
+            self.backend.set(key, json.dumps(feedback), time.time() + self.ttl_seconds)
+        except Exception as e:
+            print(f"Feedback cache write failed: {e}")
+            return
+        with self._lock:
+            self._sets += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            stats = {
+                "backend": type(self.backend).__name__,
+                "hits": self._hits,
+                "misses": self._misses,
+                "sets": self._sets,
+                "hitRate": self._hits / lookups if lookups else 0.0,
+                "evictions": self.backend.evictions,
+            }
+        stats.update(self.backend.size())
+        return stats
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+
+_cache: Optional[FeedbackCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_feedback_cache() -> Optional[FeedbackCache]:
+    """
+    Returns the process-wide cache configured from the environment, or None
+    when FEEDBACK_CACHE_BACKEND=off.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                backend_name = os.getenv("FEEDBACK_CACHE_BACKEND", "memory").lower()
+                if backend_name == "off":
+                    return None
+                max_entries = int(os.getenv("FEEDBACK_CACHE_MAX_ENTRIES", "1024"))
+                if backend_name == "sqlite":
+                    backend = SQLiteCacheBackend(
+                        os.getenv("FEEDBACK_CACHE_PATH", "feedback_cache.sqlite3"),
+                        max_entries=max_entries,
+                    )
+                else:
+                    backend = MemoryCacheBackend(
+                        max_entries=max_entries,
+                        max_bytes=int(os.getenv("FEEDBACK_CACHE_MAX_MB", "64")) * 1024 * 1024,
+                    )
+                _cache = FeedbackCache(backend, ttl_seconds=float(os.getenv("FEEDBACK_CACHE_TTL", "86400")))
+                atexit.register(backend.close)
+    return _cache
@@ -0,0 +1,160 @@
+import hmac
+import json
+import os
+import re
+import time
+from typing import Dict, Iterator, Tuple, Union
+
+from AIOperationsService import get_nsw_selective_feedback, stream_nsw_selective_feedback
+from batch_evaluation import evaluate_batch
+from evaluation_store import get_evaluation_store
+from feedback_model import parse_feedback
+from instrumentation import metrics
+from request_scheduler import QueueTimeout, Superseded
+
+# (status code, headers or None, body). A streamed body is an iterator of NDJSON lines.
+Response = Tuple[int, Union[Dict[str, str], None], Union[str, Iterator[str]]]
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def batch_progress_path(batch_id):
+    # Journals live under BATCH_PROGRESS_DIR so a retried batch resumes instead of starting over
+    progress_dir = os.getenv("BATCH_PROGRESS_DIR")
+    if not progress_dir or not batch_id or not re.fullmatch(r"[A-Za-z0-9_-]{1,128}", str(batch_id)):
+        return None
+    return os.path.join(progress_dir, f"{batch_id}.jsonl")
+
+
+def ndjson_lines(first: Dict, events: Iterator[Dict]) -> Iterator[str]:
+    try:
+        yield json.dumps(first) + "\n"
+        for event in events:
+            yield json.dumps(event) + "\n"
+    finally:
+        # Releases the evaluation's scheduler slot if the client goes away mid-stream
+        events.close()
+
+
+def query_authorized(body: Dict) -> bool:
+    # Store queries are off unless EVALUATION_QUERY_TOKEN is set, and then need it in "queryToken"
+    expected = os.getenv("EVALUATION_QUERY_TOKEN")
+    supplied = body.get("queryToken")
+    return bool(expected) and isinstance(supplied, str) and hmac.compare_digest(supplied, expected)
+
+
+def handle_query(body: Dict) -> Response:
+    """
+    Reads from the evaluation store without touching the model:
+        {"query": "evaluation", "evaluationId"}                   one stored feedback body
+        {"query": "history", "studentId", "textType"?, "since"?, "until"?, "limit"?}
+        {"query": "progress", "studentId", "textType"?}          rolling per-criterion aggregates
+
+    Any student's history can be read, so queries are for trusted internal
+    callers (the teacher dashboard's backend, reporting jobs) holding
+    EVALUATION_QUERY_TOKEN, never for the browser.
+    """
+    if not query_authorized(body):
+        return 403, None, json.dumps({"error": "Evaluation queries need a valid queryToken"})
+    store = get_evaluation_store()
+    if store is None:
+        return 503, None, json.dumps({"error": "Evaluation store is not configured"})
+    query = body.get("query")
+    if query == "evaluation":
+        feedback = store.get(str(body.get("evaluationId") or ""))
+        if feedback is None:
+            return 404, None, json.dumps({"error": "Evaluation not found"})
+        return 200, JSON_HEADERS, json.dumps(feedback)
+
+    student_id = body.get("studentId")
+    if not student_id:
+        return 400, None, json.dumps({"error": "studentId is required"})
+    if query == "history":
+        try:
+            limit = max(1, min(int(body.get("limit") or 50), 500))
+        except (TypeError, ValueError):
+            return 400, None, json.dumps({"error": "limit must be an integer"})
+        evaluations = store.history(student_id, body.get("textType"), body.get("since"), body.get("until"), limit)
+        return 200, JSON_HEADERS, json.dumps({"studentId": student_id, "evaluations": evaluations})
+    if query == "progress":
+        return 200, JSON_HEADERS, json.dumps(store.progress(student_id, body.get("textType")))
+    return 400, None, json.dumps({"error": f"Unknown query: {query}"})
+
+
+def handle_post(raw_body: str, allow_stream: bool = True) -> Response:
+    """
+    The feedback request/response contract, shared by the per-invocation
+    handler (ai-feedback.py) and the long-running service (service.py).
+    Handlers that buffer the whole response pass `allow_stream=False`.
+    """
+    try:
+        body = json.loads(raw_body)
+
+        if "query" in body:
+            return handle_query(body)
+
+        if "essays" in body:
+            essays = body.get("essays")
+            if not isinstance(essays, list) or not essays:
+                return 400, None, json.dumps({"error": "Essays must be a non-empty list"})
+            max_concurrency = body.get("maxConcurrency")
+            if max_concurrency is not None:
+                try:
+                    max_concurrency = int(max_concurrency)
+                except (TypeError, ValueError):
+                    return 400, None, json.dumps({"error": "maxConcurrency must be an integer"})
+            batch = evaluate_batch(
+                essays,
+                max_concurrency=max_concurrency,
+                progress_path=batch_progress_path(body.get("batchId")),
+                tenant=body.get("tenantId") or body.get("batchId")
+            )
+            return 200, JSON_HEADERS, json.dumps(batch)
+
+        content = body.get("content")
+        text_type = body.get("textType")
+        assistance_level = body.get("assistanceLevel")
+
+        if not content:
+            return 400, None, json.dumps({"error": "Content is required"})
+
+        if body.get("stream"):
+            if not allow_stream:
+                # Buffering the whole response would defeat streaming
+                return 400, JSON_HEADERS, json.dumps(
+                    {"error": "Streaming is only supported by the feedback service; omit \"stream\""}
+                )
+            # NDJSON: one event per line, criteria scores first and the full body last
+            events = stream_nsw_selective_feedback(content, text_type, assistance_level,
+                                                   student_id=body.get("studentId"),
+                                                   tenant=body.get("tenantId"))
+            # The first event comes after admission, so Superseded and QueueTimeout
+            # are raised here and answered below instead of after a 200 is sent
+            first = next(events)
+            return 200, {"Content-Type": "application/x-ndjson"}, ndjson_lines(first, events)
+
+        feedback = get_nsw_selective_feedback(
+            content, text_type, assistance_level,
+            student_id=body.get("studentId"),
+            revision_aware=body.get("revisionAware"),
+            tenant=body.get("tenantId")
+        )
+        if body.get("format") == "frontend":
+            # The DetailedFeedback shape of src/types/feedback.ts, with weighted criteria blocks
+            feedback = parse_feedback(feedback)[0].to_frontend()
+
+        # Serialization happens after the body's timings are fixed, so it is
+        # reported through metrics and the Server-Timing header instead
+        serialize_started = time.perf_counter()
+        response_body = json.dumps(feedback, separators=(",", ":"), check_circular=False)
+        serialization_ms = (time.perf_counter() - serialize_started) * 1000
+        metrics.observe("feedback_stage_duration_ms", serialization_ms, stage="serialization")
+
+        return 200, dict(JSON_HEADERS, **{"Server-Timing": f"serialization;dur={serialization_ms:.2f}"}), response_body
+    except Superseded:
+        # The student's newer draft is already queued; this check's answer would be stale
+        return 409, JSON_HEADERS, json.dumps({"error": "Superseded by a newer draft", "superseded": True})
+    except QueueTimeout as e:
+        return 503, dict(JSON_HEADERS, **{"Retry-After": "5"}), json.dumps({"error": str(e)})
+    except Exception as e:
+        return 500, None, json.dumps({"error": str(e)})
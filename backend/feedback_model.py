@@ -0,0 +1,442 @@
+import math
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from json_repair import CATEGORY_NAMES
+from local_scorer import CRITERIA_WEIGHTS
+
+# criteriaScores keys and the matching keys of the frontend DetailedFeedback.criteria
+FRONTEND_CRITERIA = {
+    "ideasAndContent": "ideasContent",
+    "textStructureAndOrganization": "structureOrganization",
+    "languageFeaturesAndVocabulary": "languageVocab",
+    "spellingPunctuationAndGrammar": "spellingPunctuationGrammar",
+}
+
+# Top-level keys modelled explicitly; everything else passes through untouched
+_MODELLED_KEYS = frozenset((
+    "overallScore", "criteriaScores", "feedbackCategories", "grammarCorrections",
+    "vocabularyEnhancements", "modelVersion", "id",
+))
+
+
+# Upper bounds of the rubric scales; 0 means not assessed
+MAX_CRITERION_SCORE = 5
+MAX_OVERALL_SCORE = 100
+
+
+class FeedbackValidationError(ValueError):
+    """Raised when a feedback payload is missing a required field or has the wrong type."""
+
+
+def _number(value: Any, path: str) -> int:
+    # Models sometimes quote numbers ("4"); those are read as the number they spell
+    if isinstance(value, str):
+        try:
+            value = float(value.strip())
+        except ValueError:
+            raise FeedbackValidationError(f"{path}: expected a number, got {value!r}") from None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise FeedbackValidationError(f"{path}: expected a number, got {type(value).__name__}")
+    return int(round(value))
+
+
+def _score(value: Any, path: str, upper: int, issues: List[str]) -> Optional[int]:
+    """A score clamped to 0..upper, or None (with an issue) when it is not a number at all."""
+    try:
+        score = _number(value, path)
+    except FeedbackValidationError as e:
+        issues.append(str(e))
+        return None
+    clamped = max(0, min(upper, score))
+    if clamped != score:
+        issues.append(f"{path}: {score} is out of range; clamped to {clamped}")
+    return clamped
+
+
+def _scores(data: Dict[str, Any], issues: List[str]) -> Tuple[int, Dict[str, int]]:
+    """
+    (overallScore, criteriaScores) with unusable criteria dropped. A missing
+    or unusable overall score is recomputed from the criteria weights.
+    """
+    scores = data.get("criteriaScores")
+    if not isinstance(scores, dict):
+        issues.append("criteriaScores: expected an object")
+        scores = {}
+    criteria = {}
+    for key, value in scores.items():
+        score = _score(value, f"criteriaScores.{key}", MAX_CRITERION_SCORE, issues)
+        if score is not None:
+            criteria[key] = score
+    overall = _score(data.get("overallScore"), "overallScore", MAX_OVERALL_SCORE, issues)
+    if overall is None:
+        overall = round(sum(
+            criteria.get(key, 0) / MAX_CRITERION_SCORE * weight for key, weight in CRITERIA_WEIGHTS.items()
+        ))
+    return overall, criteria
+
+
+def _optional_number(value: Any, path: str) -> Optional[int]:
+    return None if value is None else _number(value, path)
+
+
+def _text(value: Any, path: str) -> str:
+    if not isinstance(value, str):
+        raise FeedbackValidationError(f"{path}: expected a string, got {type(value).__name__}")
+    return value
+
+
+def _optional_text(value: Any, path: str) -> Optional[str]:
+    return None if value is None else _text(value, path)
+
+
+def _category_key(name: str) -> str:
+    return "".join(ch for ch in name.lower() if ch.isalnum())
+
+
+_CATEGORY_CRITERIA = {_category_key(name): key for key, name in CATEGORY_NAMES.items()}
+
+
+# Slots are declared by hand (rather than dataclass(slots=True)) so the model
+# also runs on Python versions before 3.10; fields therefore have no defaults.
+
+@dataclass(frozen=True)
+class TextPosition:
+    """Code point offsets, plus the UTF-16 offsets the frontend highlights with when known."""
+    __slots__ = ("start", "end", "utf16Start", "utf16End")
+    start: int
+    end: int
+    utf16Start: Optional[int]
+    utf16End: Optional[int]
+
+    @classmethod
+    def from_dict(cls, data: Any, path: str) -> "TextPosition":
+        if not isinstance(data, dict):
+            raise FeedbackValidationError(f"{path}: expected an object")
+        return cls(
+            _number(data.get("start"), f"{path}.start"),
+            _number(data.get("end"), f"{path}.end"),
+            _optional_number(data.get("utf16Start"), f"{path}.utf16Start"),
+            _optional_number(data.get("utf16End"), f"{path}.utf16End"),
+        )
+
+    def to_dict(self) -> Dict[str, int]:
+        result = {"start": self.start, "end": self.end}
+        if self.utf16Start is not None and self.utf16End is not None:
+            result["utf16Start"] = self.utf16Start
+            result["utf16End"] = self.utf16End
+        return result
+
+
+@dataclass(frozen=True)
+class FeedbackItem:
+    __slots__ = ("exampleFromText", "position", "comment", "suggestionForImprovement")
+    exampleFromText: str
+    position: TextPosition
+    comment: Optional[str]
+    suggestionForImprovement: Optional[str]
+
+    @classmethod
+    def from_dict(cls, data: Any, path: str) -> "FeedbackItem":
+        if not isinstance(data, dict):
+            raise FeedbackValidationError(f"{path}: expected an object")
+        return cls(
+            _text(data.get("exampleFromText"), f"{path}.exampleFromText"),
+            TextPosition.from_dict(data.get("position"), f"{path}.position"),
+            _optional_text(data.get("comment"), f"{path}.comment"),
+            _optional_text(data.get("suggestionForImprovement"), f"{path}.suggestionForImprovement"),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {"exampleFromText": self.exampleFromText, "position": self.position.to_dict()}
+        if self.comment is not None:
+            result["comment"] = self.comment
+        if self.suggestionForImprovement is not None:
+            result["suggestionForImprovement"] = self.suggestionForImprovement
+        return result
+
+    def evidence(self) -> Dict[str, Any]:
+        return dict(self.position.to_dict(), text=self.exampleFromText)
+
+
+@dataclass(frozen=True)
+class GrammarCorrection:
+    __slots__ = ("original", "suggestion", "explanation", "position", "type", "severity")
+    original: str
+    suggestion: Optional[str]
+    explanation: str
+    position: TextPosition
+    type: Optional[str]
+    severity: Optional[str]
+
+    @classmethod
+    def from_dict(cls, data: Any, path: str) -> "GrammarCorrection":
+        if not isinstance(data, dict):
+            raise FeedbackValidationError(f"{path}: expected an object")
+        return cls(
+            _text(data.get("original"), f"{path}.original"),
+            _optional_text(data.get("suggestion"), f"{path}.suggestion"),
+            _text(data.get("explanation", ""), f"{path}.explanation"),
+            TextPosition.from_dict(data.get("position"), f"{path}.position"),
+            _optional_text(data.get("type"), f"{path}.type"),
+            _optional_text(data.get("severity"), f"{path}.severity"),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {
+            "original": self.original,
+            "suggestion": self.suggestion,
+            "explanation": self.explanation,
+            "position": self.position.to_dict(),
+        }
+        if self.type is not None:
+            result["type"] = self.type
+        if self.severity is not None:
+            result["severity"] = self.severity
+        return result
+
+    def lint_fix(self) -> Dict[str, Any]:
+        return {
+            "original": self.original,
+            "replacement": self.suggestion or "",
+            "explanation": self.explanation,
+            **self.position.to_dict(),
+        }
+
+
+@dataclass(frozen=True)
+class VocabularyEnhancement:
+    __slots__ = ("original", "suggestion", "explanation", "position", "alternatives", "source")
+    original: str
+    suggestion: str
+    explanation: str
+    position: TextPosition
+    alternatives: Tuple[str, ...]
+    source: Optional[str]
+
+    @classmethod
+    def from_dict(cls, data: Any, path: str) -> "VocabularyEnhancement":
+        if not isinstance(data, dict):
+            raise FeedbackValidationError(f"{path}: expected an object")
+        alternatives = data.get("alternatives") or ()
+        if not isinstance(alternatives, (list, tuple)):
+            raise FeedbackValidationError(f"{path}.alternatives: expected a list")
+        return cls(
+            _text(data.get("original"), f"{path}.original"),
+            _text(data.get("suggestion"), f"{path}.suggestion"),
+            _text(data.get("explanation", ""), f"{path}.explanation"),
+            TextPosition.from_dict(data.get("position"), f"{path}.position"),
+            tuple(_text(a, f"{path}.alternatives") for a in alternatives),
+            _optional_text(data.get("source"), f"{path}.source"),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {
+            "original": self.original,
+            "suggestion": self.suggestion,
+            "explanation": self.explanation,
+            "position": self.position.to_dict(),
+        }
+        if self.alternatives:
+            result["alternatives"] = list(self.alternatives)
+        if self.source is not None:
+            result["source"] = self.source
+        return result
+
+    def lint_fix(self) -> Dict[str, Any]:
+        return {
+            "original": self.original,
+            "replacement": self.suggestion,
+            "explanation": self.explanation,
+            **self.position.to_dict(),
+        }
+
+
+def _items(values: Any, path: str, parse: Callable[[Any, str], Any], issues: List[str]) -> Tuple[Any, ...]:
+    """Parses a list of items, dropping (and reporting) the invalid ones rather than failing."""
+    if values is None:
+        return ()
+    if not isinstance(values, list):
+        issues.append(f"{path}: expected a list")
+        return ()
+    parsed = []
+    for index, value in enumerate(values):
+        try:
+            parsed.append(parse(value, f"{path}[{index}]"))
+        except FeedbackValidationError as e:
+            issues.append(str(e))
+    return tuple(parsed)
+
+
+@dataclass(frozen=True)
+class CriteriaFeedback:
+    __slots__ = ("category", "score", "strengths", "areasForImprovement")
+    category: str
+    score: int
+    strengths: Tuple[FeedbackItem, ...]
+    areasForImprovement: Tuple[FeedbackItem, ...]
+
+    @classmethod
+    def parse(cls, data: Any, path: str, issues: List[str]) -> "CriteriaFeedback":
+        if not isinstance(data, dict):
+            raise FeedbackValidationError(f"{path}: expected an object")
+        score = _score(data.get("score", 0), f"{path}.score", MAX_CRITERION_SCORE, issues)
+        return cls(
+            _text(data.get("category"), f"{path}.category"),
+            score if score is not None else 0,
+            _items(data.get("strengths"), f"{path}.strengths", FeedbackItem.from_dict, issues),
+            _items(data.get("areasForImprovement"), f"{path}.areasForImprovement", FeedbackItem.from_dict, issues),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "category": self.category,
+            "score": self.score,
+            "strengths": [item.to_dict() for item in self.strengths],
+            "areasForImprovement": [item.to_dict() for item in self.areasForImprovement],
+        }
+
+
+@dataclass(frozen=True)
+class DetailedFeedback:
+    __slots__ = ("overallScore", "criteriaScores", "feedbackCategories", "grammarCorrections",
+                 "vocabularyEnhancements", "modelVersion", "id", "extras")
+    overallScore: int
+    criteriaScores: Dict[str, int]
+    feedbackCategories: Tuple[CriteriaFeedback, ...]
+    grammarCorrections: Tuple[GrammarCorrection, ...]
+    vocabularyEnhancements: Tuple[VocabularyEnhancement, ...]
+    modelVersion: Optional[str]
+    id: Optional[str]
+    # Response metadata (timings, usage, partialSections, ...) carried as-is
+    extras: Dict[str, Any]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The backend response body, in the same shape the handler has always returned."""
+        result = {
+            "overallScore": self.overallScore,
+            "criteriaScores": dict(self.criteriaScores),
+            "feedbackCategories": [category.to_dict() for category in self.feedbackCategories],
+            "grammarCorrections": [item.to_dict() for item in self.grammarCorrections],
+            "vocabularyEnhancements": [item.to_dict() for item in self.vocabularyEnhancements],
+        }
+        if self.modelVersion is not None:
+            result["modelVersion"] = self.modelVersion
+        if self.id is not None:
+            result["id"] = self.id
+        result.update(self.extras)
+        return result
+
+    def to_frontend(self) -> Dict[str, Any]:
+        """The frontend DetailedFeedback shape (src/types/feedback.ts), with weighted criteria blocks."""
+        categories = {}
+        for category in self.feedbackCategories:
+            key = _CATEGORY_CRITERIA.get(_category_key(category.category))
+            if key is not None and key not in categories:
+                categories[key] = category
+
+        criteria = {}
+        for key, frontend_key in FRONTEND_CRITERIA.items():
+            category = categories.get(key)
+            score = self.criteriaScores.get(key, category.score if category else 0)
+            criteria[frontend_key] = {
+                "score": score,
+                "weight": CRITERIA_WEIGHTS[key],
+                "strengths": [item.evidence() for item in category.strengths] if category else [],
+                "improvements": [
+                    {
+                        "issue": item.comment or item.suggestionForImprovement or "",
+                        "evidence": item.evidence(),
+                        "suggestion": item.suggestionForImprovement or "",
+                    }
+                    for item in category.areasForImprovement
+                ] if category else [],
+            }
+
+        result = {
+            "overallScore": self.overallScore,
+            "criteria": criteria,
+            "grammarCorrections": [item.lint_fix() for item in self.grammarCorrections],
+            "vocabularyEnhancements": [item.lint_fix() for item in self.vocabularyEnhancements],
+            "id": self.id or "",
+        }
+        if self.modelVersion is not None:
+            result["modelVersion"] = self.modelVersion
+        for key in ("narrativeStructure", "timings"):
+            if key in self.extras:
+                result[key] = self.extras[key]
+        return result
+
+
+def parse_feedback(data: Any) -> Tuple[DetailedFeedback, List[str]]:
+    """
+    Builds the result model from parsed JSON in one validating pass. Scores
+    are coerced and clamped, and invalid list items are dropped; both are
+    described in the returned issues. Only a payload that is not an object
+    raises FeedbackValidationError.
+    """
+    if not isinstance(data, dict):
+        raise FeedbackValidationError("feedback: expected an object")
+    issues: List[str] = []
+    overall_score, criteria_scores = _scores(data, issues)
+
+    feedback = DetailedFeedback(
+        overallScore=overall_score,
+        criteriaScores=criteria_scores,
+        feedbackCategories=_items(
+            data.get("feedbackCategories"), "feedbackCategories",
+            lambda value, path: CriteriaFeedback.parse(value, path, issues), issues,
+        ),
+        grammarCorrections=_items(data.get("grammarCorrections"), "grammarCorrections",
+                                  GrammarCorrection.from_dict, issues),
+        vocabularyEnhancements=_items(data.get("vocabularyEnhancements"), "vocabularyEnhancements",
+                                      VocabularyEnhancement.from_dict, issues),
+        modelVersion=_optional_text(data.get("modelVersion"), "modelVersion"),
+        id=_optional_text(data.get("id"), "id"),
+        extras={key: value for key, value in data.items() if key not in _MODELLED_KEYS},
+    )
+    return feedback, issues
+
+
+def _valid_items(values: Any, path: str, validate: Callable[[Any, str], Any], issues: List[str]) -> List[Any]:
+    """The items of a list that validate, as they are; the others are dropped and reported."""
+    if values is None:
+        return []
+    if not isinstance(values, list):
+        issues.append(f"{path}: expected a list")
+        return []
+    kept = []
+    for index, value in enumerate(values):
+        try:
+            validate(value, f"{path}[{index}]")
+            kept.append(value)
+        except FeedbackValidationError as e:
+            issues.append(str(e))
+    return kept
+
+
+def validate_feedback(data: Dict[str, Any]) -> List[str]:
+    """
+    The checks of parse_feedback applied to the response body in place, for
+    callers that send the body on rather than use the model: scores are
+    coerced and clamped and invalid list items removed. Returns the issues.
+    """
+    issues: List[str] = []
+    data["overallScore"], data["criteriaScores"] = _scores(data, issues)
+
+    def validate_category(category: Any, path: str) -> None:
+        if not isinstance(category, dict):
+            raise FeedbackValidationError(f"{path}: expected an object")
+        _text(category.get("category"), f"{path}.category")
+        score = _score(category.get("score", 0), f"{path}.score", MAX_CRITERION_SCORE, issues)
+        category["score"] = score if score is not None else 0
+        for field in ("strengths", "areasForImprovement"):
+            category[field] = _valid_items(category.get(field), f"{path}.{field}", FeedbackItem.from_dict, issues)
+
+    data["feedbackCategories"] = _valid_items(data.get("feedbackCategories"), "feedbackCategories",
+                                              validate_category, issues)
+    data["grammarCorrections"] = _valid_items(data.get("grammarCorrections"), "grammarCorrections",
+                                              GrammarCorrection.from_dict, issues)
+    data["vocabularyEnhancements"] = _valid_items(data.get("vocabularyEnhancements"), "vocabularyEnhancements",
+                                                  VocabularyEnhancement.from_dict, issues)
+    return issues
@@ -0,0 +1,78 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Tuple
+
+from essay_index import essay_index
+
+
+def split_paragraphs(text: str) -> List[Tuple[int, str]]:
+    """
+    Returns (offset, paragraph) pairs for every non-empty paragraph in text.
+    Paragraphs end at blank lines (LF or CRLF). Per-chunk results are
+    equivalent to a whole-document check for paragraph-local rules; the few
+    LanguageTool rules that look across paragraphs (repeated paragraph
+    openings, for example) are not applied.
+    """
+    return essay_index(text).paragraph_texts()
+
+
+def _chunk_key(chunk: str) -> str:
+    return hashlib.sha1(chunk.encode("utf-8")).hexdigest()
+
+
+def _shift(item: Dict[str, Any], offset: int) -> Dict[str, Any]:
+    shifted = dict(item)
+    shifted["position"] = {
+        "start": item["position"]["start"] + offset,
+        "end": item["position"]["end"] + offset,
+    }
+    return shifted
+
+
+class IncrementalGrammarChecker:
+    """
+    Checks a document paragraph by paragraph and memoizes the corrections for
+    each paragraph by content hash. Re-checking an edited essay only sends
+    the changed paragraphs to LanguageTool; cached corrections are remapped
+    to whole-document positions. Equivalent to a whole-document check for
+    paragraph-local rules only (see split_paragraphs).
+    """
+
+    def __init__(self, check_chunk: Callable[[str], List[Dict[str, Any]]], max_chunks: int = 4096):
+        self._check_chunk = check_chunk
+        self.max_chunks = max_chunks
+        self._chunks: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"chunksChecked": 0, "chunksReused": 0}
+
+    def _lookup(self, key: str):
+        with self._lock:
+            items = self._chunks.get(key)
+            if items is not None:
+                self._chunks.move_to_end(key)
+                self._stats["chunksReused"] += 1
+            return items
+
+    def _store(self, key: str, items: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._chunks[key] = items
+            self._chunks.move_to_end(key)
+            self._stats["chunksChecked"] += 1
+            while len(self._chunks) > self.max_chunks:
+                self._chunks.popitem(last=False)
+
+    def check(self, text: str) -> List[Dict[str, Any]]:
+        feedback_list = []
+        for offset, chunk in split_paragraphs(text):
+            key = _chunk_key(chunk)
+            items = self._lookup(key)
+            if items is None:
+                items = self._check_chunk(chunk)
+                self._store(key, items)
+            feedback_list.extend(_shift(item, offset) for item in items)
+        return feedback_list
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, cachedChunks=len(self._chunks))
@@ -0,0 +1,117 @@
+import json
+from typing import Any, Dict, Iterable, List, Tuple
+
+# Event tuples produced by IncrementalJSONParser.feed:
+#   ("member", key, value)          a top-level member is complete
+#   ("element", key, index, value)  an element of a split top-level array is complete
+Event = Tuple[Any, ...]
+
+
+class IncrementalJSONParser:
+    """
+    Incremental parser for a single top-level JSON object arriving in chunks.
+
+    Each complete top-level member is emitted as soon as its closing token has
+    been seen, and elements of the arrays named in `split_arrays` are emitted
+    one by one while the array is still open. Only completed values are ever
+    decoded, so a truncated document still yields everything before the cut.
+    """
+
+    def __init__(self, split_arrays: Iterable[str] = ()):
+        self.split_arrays = set(split_arrays)
+        self.members: Dict[str, Any] = {}
+        self.elements: Dict[str, List[Any]] = {}
+        self.errors: List[str] = []
+        self.complete = False
+
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect_value = False
+        self._key_start = -1
+        self._key = None
+        self._value_start = -1
+        self._split_key = None
+        self._element_start = -1
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    def feed(self, chunk: str) -> List[Event]:
+        if not chunk:
+            return []
+        self._text += chunk
+        events: List[Event] = []
+        text = self._text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and not self._expect_value:
+                        self._key = self._decode(text[self._key_start:i + 1])
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1 and not self._expect_value:
+                    self._key_start = i
+            elif ch in "{[":
+                self._depth += 1
+                if self._depth == 2 and ch == "[" and self._expect_value and self._key in self.split_arrays:
+                    self._split_key = self._key
+                    self.elements[self._split_key] = []
+                    self._element_start = i + 1
+            elif ch in "}]":
+                if self._depth == 2 and self._split_key is not None:
+                    self._finish_element(text[self._element_start:i], events)
+                    self._split_key = None
+                if self._depth == 1:
+                    self._finish_member(text[self._value_start:i], events)
+                    self.complete = True
+                self._depth -= 1
+            elif ch == ":" and self._depth == 1:
+                self._expect_value = True
+                self._value_start = i + 1
+            elif ch == ",":
+                if self._depth == 1:
+                    self._finish_member(text[self._value_start:i], events)
+                elif self._depth == 2 and self._split_key is not None:
+                    self._finish_element(text[self._element_start:i], events)
+                    self._element_start = i + 1
+        self._pos = len(text)
+        return events
+
+    def _decode(self, raw: str) -> Any:
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError as e:
+            self.errors.append(f"{e.msg} in {raw[:40]!r}")
+            return None
+
+    def _finish_member(self, raw: str, events: List[Event]) -> None:
+        if not self._expect_value:
+            return
+        self._expect_value = False
+        if self._key is not None and raw.strip():
+            value = self._decode(raw)
+            if value is not None or raw.strip() == "null":
+                self.members[self._key] = value
+                events.append(("member", self._key, value))
+        self._key = None
+
+    def _finish_element(self, raw: str, events: List[Event]) -> None:
+        if not raw.strip():
+            return
+        value = self._decode(raw)
+        if value is not None:
+            elements = self.elements[self._split_key]
+            events.append(("element", self._split_key, len(elements), value))
+            elements.append(value)
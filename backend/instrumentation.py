@@ -0,0 +1,257 @@
+import os
+import sys
+import time
+import threading
+import traceback
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# --- Per-request stage timings ---
+
+class StageTimings:
+    """
+    Accumulates stage durations for one request; safe to record from worker
+    threads. Each stage surfaces as "<stage>Ms" in feedback["timings"].
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, ms: float) -> None:
+        with self._lock:
+            self.durations[stage] = self.durations.get(stage, 0.0) + ms
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - started) * 1000)
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def as_dict(self) -> Dict[str, float]:
+        with self._lock:
+            timings = {f"{name}Ms": round(ms, 2) for name, ms in self.durations.items()}
+        timings.setdefault("modelLatencyMs", 0)
+        timings["totalMs"] = round(self.elapsed_ms(), 2)
+        return timings
+
+
+_current: contextvars.ContextVar[Optional[StageTimings]] = contextvars.ContextVar("feedback_timings", default=None)
+
+
+@contextmanager
+def track_request():
+    """Makes a fresh StageTimings current for the duration of the block."""
+    timings = StageTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+def request_context(timings: StageTimings) -> contextvars.Context:
+    """
+    A copy of the current context with `timings` current, for code that cannot
+    hold a with-block open across its work (e.g. generators): use ctx.run(...).
+    """
+    ctx = contextvars.copy_context()
+    ctx.run(_current.set, timings)
+    return ctx
+
+
+def current_timings() -> Optional[StageTimings]:
+    return _current.get()
+
+
+@contextmanager
+def timed_stage(name: str):
+    """Times the block into the current request's timings, if there is one."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    with timings.stage(name):
+        yield
+
+
+def submit_with_context(executor, fn: Callable, *args):
+    """executor.submit that carries the current request's timings into the worker thread."""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+# --- Metrics ---
+
+DEFAULT_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class MetricsRegistry:
+    """
+    Minimal in-process Prometheus-style counters, gauges and histograms. render()
+    produces the text exposition format; hooks receive every observation
+    for forwarding to another backend.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS_MS):
+        self.buckets = buckets
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, List[float]]] = {}
+        self._hooks: List[Callable[[str, str, float, Dict[str, str]], None]] = []
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook: Callable[[str, str, float, Dict[str, str]], None]) -> None:
+        """hook(kind, name, value, labels) where kind is "counter", "gauge" or "histogram"."""
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook) -> None:
+        self._hooks.remove(hook)
+
+    def _notify(self, kind: str, name: str, value: float, labels: Dict[str, str]) -> None:
+        for hook in list(self._hooks):
+            try:
+                hook(kind, name, value, labels)
+            except Exception as e:
+                print(f"Metrics hook failed: {e}")
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+        self._notify("counter", name, value, labels)
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+        self._notify("gauge", name, value, labels)
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            # Per-bucket counts followed by sum and count
+            state = series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+        self._notify("histogram", name, value, labels)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "counters": {n: {_fmt(k): v for k, v in s.items()} for n, s in self._counters.items()},
+                "gauges": {n: {_fmt(k): v for k, v in s.items()} for n, s in self._gauges.items()},
+                "histograms": {
+                    n: {_fmt(k): {"count": st[-1], "sum": st[-2]} for k, st in s.items()}
+                    for n, s in self._histograms.items()
+                },
+            }
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{_fmt(key)} {value}")
+            for name, series in sorted(self._gauges.items()):
+                lines.append(f"# TYPE {name} gauge")
+                for key, value in series.items():
+                    lines.append(f"{name}{_fmt(key)} {value}")
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for key, state in series.items():
+                    for i, bound in enumerate(self.buckets):
+                        lines.append(f"{name}_bucket{_fmt(key + (('le', str(bound)),))} {state[i]}")
+                    lines.append(f"{name}_bucket{_fmt(key + (('le', '+Inf'),))} {state[-1]}")
+                    lines.append(f"{name}_sum{_fmt(key)} {state[-2]}")
+                    lines.append(f"{name}_count{_fmt(key)} {state[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def _fmt(key: LabelKey) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in key) + "}"
+
+
+metrics = MetricsRegistry()
+
+
+def record_request_metrics(timings: StageTimings, outcome: str, model: Optional[str] = None,
+                           usage: Optional[Dict[str, int]] = None) -> None:
+    metrics.inc("feedback_requests_total", outcome=outcome)
+    metrics.observe("feedback_request_duration_ms", timings.elapsed_ms(), outcome=outcome)
+    for stage, ms in list(timings.durations.items()):
+        metrics.observe("feedback_stage_duration_ms", ms, stage=stage)
+    if usage:
+        labels = {"model": model or "unknown"}
+        metrics.inc("feedback_prompt_tokens_total", usage.get("promptTokens", 0), **labels)
+        metrics.inc("feedback_completion_tokens_total", usage.get("completionTokens", 0), **labels)
+
+
+# --- Sampling profiler for slow requests ---
+
+PROFILE_SLOW_MS = float(os.getenv("FEEDBACK_PROFILE_SLOW_MS", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("FEEDBACK_PROFILE_INTERVAL_MS", "10"))
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="feedback-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame, limit=12)
+            self.samples[tuple(f"{f.name} ({os.path.basename(f.filename)}:{f.lineno})" for f in stack)] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+@contextmanager
+def profile_if_slow(label: str, slow_ms: Optional[float] = None):
+    """
+    Samples the calling thread's stack every FEEDBACK_PROFILE_INTERVAL_MS while
+    the block runs and prints the hottest stacks if it took longer than
+    `slow_ms` (FEEDBACK_PROFILE_SLOW_MS). Disabled, and free, when the
+    threshold is 0.
+    """
+    threshold = PROFILE_SLOW_MS if slow_ms is None else slow_ms
+    if threshold <= 0:
+        yield
+        return
+    sampler = _Sampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000)
+    started = time.perf_counter()
+    sampler.start()
+    try:
+        yield
+    finally:
+        sampler.stop()
+        elapsed = (time.perf_counter() - started) * 1000
+        if elapsed >= threshold and sampler.samples:
+            total = sum(sampler.samples.values())
+            print(f"Slow request {label}: {elapsed:.0f}ms, {total} samples")
+            for stack, count in sampler.samples.most_common(5):
+                print(f"  {count / total:.0%}  " + " <- ".join(reversed(stack[-4:])))
@@ -0,0 +1,114 @@
+import re
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Tuple
+
+from incremental_json import IncrementalJSONParser
+
+# Arrays whose elements are recovered one by one when the array itself is cut off
+ITEM_ARRAYS = ("feedbackCategories", "vocabularyEnhancements")
+
+# Category names the prompt asks for, keyed by criteriaScores key
+CATEGORY_NAMES = {
+    "ideasAndContent": "Ideas and Content",
+    "textStructureAndOrganization": "Text Structure and Organization",
+    "languageFeaturesAndVocabulary": "Language Features and Vocabulary",
+    "spellingPunctuationAndGrammar": "Spelling, Punctuation and Grammar",
+}
+
+_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+_NON_ALNUM = re.compile(r"[^a-z0-9]")
+
+
+class UnrecoverableResponse(ValueError):
+    """Raised when not even the scores can be recovered from a model response."""
+
+
+@dataclass
+class RepairResult:
+    data: Dict[str, Any]
+    # Top-level sections absent from the response
+    missing_sections: List[str] = field(default_factory=list)
+    # Category names absent from a cut-off feedbackCategories array
+    missing_categories: List[str] = field(default_factory=list)
+    repaired: bool = False
+
+    @property
+    def complete(self) -> bool:
+        return not self.missing_sections and not self.missing_categories
+
+
+def _category_key(name: Any) -> str:
+    return _NON_ALNUM.sub("", str(name).lower())
+
+
+def missing_category_names(categories: Any) -> List[str]:
+    present = {_category_key(c.get("category")) for c in categories or [] if isinstance(c, dict)}
+    return [name for name in CATEGORY_NAMES.values() if _category_key(name) not in present]
+
+
+def _parse_strict(text: str) -> Tuple[Any, bool]:
+    """Returns (value or None, whether the text needed cleaning)."""
+    try:
+        return json.loads(text), False
+    except json.JSONDecodeError:
+        pass
+    # Markdown fences and trailing commas are the common near-misses
+    cleaned = _TRAILING_COMMA.sub(r"\1", _FENCE.sub("", text))
+    try:
+        return json.loads(cleaned), True
+    except json.JSONDecodeError:
+        return None, True
+
+
+def recover_feedback_json(text: str, required: Iterable[str], require_scores: bool = True) -> RepairResult:
+    """
+    Parses a model response, keeping every complete top-level section and
+    every complete element of the item arrays when the document is truncated
+    or malformed. Raises UnrecoverableResponse when `require_scores` is set
+    and neither score section survived.
+    """
+    required = list(required)
+    data, repaired = _parse_strict(text or "")
+    truncated_arrays = set()
+    if not isinstance(data, dict):
+        repaired = True
+        parser = IncrementalJSONParser(split_arrays=ITEM_ARRAYS)
+        parser.feed(text or "")
+        data = dict(parser.members)
+        for key, elements in parser.elements.items():
+            if not isinstance(data.get(key), list):
+                # The array never closed (or did not decode as a whole): keep
+                # the elements that did
+                data[key] = [e for e in elements if isinstance(e, dict)]
+                truncated_arrays.add(key)
+
+    if require_scores and not any(key in data for key in ("overallScore", "criteriaScores")):
+        raise UnrecoverableResponse("No scores could be recovered from the model response")
+
+    missing_sections = [key for key in required if key not in data]
+    missing_categories = []
+    if "feedbackCategories" in truncated_arrays:
+        missing_categories = missing_category_names(data["feedbackCategories"])
+    return RepairResult(data, missing_sections, missing_categories, repaired)
+
+
+def merge_continuation(result: RepairResult, continuation: Dict[str, Any]) -> RepairResult:
+    """Adds the sections returned by a continuation request to an earlier partial result."""
+    data = result.data
+    for key in result.missing_sections:
+        if key in continuation:
+            data[key] = continuation[key]
+    if result.missing_categories and isinstance(continuation.get("feedbackCategories"), list):
+        wanted = {_category_key(name) for name in result.missing_categories}
+        data.setdefault("feedbackCategories", []).extend(
+            c for c in continuation["feedbackCategories"]
+            if isinstance(c, dict) and _category_key(c.get("category")) in wanted
+        )
+    missing_sections = [key for key in result.missing_sections if key not in data]
+    missing_categories = []
+    if result.missing_categories:
+        missing_categories = [n for n in missing_category_names(data.get("feedbackCategories"))
+                              if n in result.missing_categories]
+    return RepairResult(data, missing_sections, missing_categories, True)
@@ -0,0 +1,299 @@
+import os
+import time
+import queue
+import atexit
+import importlib
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+
+class LanguageToolPoolBusy(RuntimeError):
+    """Raised when every engine is leased and the wait queue is full or times out."""
+
+
+class _Engine:
+    def __init__(self, tool: Any):
+        self.tool = tool
+        self.checks = 0
+        self.healthy = True
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+def _default_factory(language: str) -> Callable[[], Any]:
+    def create():
+        # Imported on first engine creation so importing this module stays cheap
+        import language_tool_python
+        return language_tool_python.LanguageTool(language)
+    return create
+
+
+def _factory_from_env() -> Optional[Callable[[], Any]]:
+    """
+    LANGUAGETOOL_FACTORY="module:callable" substitutes another engine factory,
+    e.g. a remote LanguageTool server client or a stub for benchmarks.
+    """
+    spec = os.getenv("LANGUAGETOOL_FACTORY")
+    if not spec:
+        return None
+    module_name, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+# Exceptions from these packages come from the engine or the connection to it
+_ENGINE_ERROR_MODULES = ("language_tool_python", "requests", "urllib3", "http")
+
+
+def _is_engine_error(error: BaseException) -> bool:
+    """
+    True for failures of the engine itself (its Java server died, the HTTP
+    transport broke or timed out), as opposed to errors in the caller's code
+    while it held the lease.
+    """
+    if isinstance(error, OSError):  # ConnectionError, TimeoutError, broken pipes
+        return True
+    return type(error).__module__.split(".")[0] in _ENGINE_ERROR_MODULES
+
+
+def _engine_rss_bytes(tool: Any) -> Optional[int]:
+    """
+    Best-effort resident set size of the Java server backing a LanguageTool
+    instance. Returns None when the engine is remote or /proc is unavailable.
+    """
+    server = getattr(tool, "_server", None)
+    pid = getattr(server, "pid", None)
+    if not pid:
+        return None
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class LanguageToolPool:
+    """
+    A bounded pool of warm LanguageTool engines shared by the whole process.
+
+    Engines are created lazily up to `size`, leased for one check at a time
+    and recycled after `max_checks_per_engine` checks, when the backing JVM
+    grows past `max_engine_rss_mb`, or when a check fails. At most
+    `max_waiters` callers may queue for an engine; beyond that, or after
+    `lease_timeout` seconds, LanguageToolPoolBusy is raised so callers can
+    degrade instead of piling up behind a saturated pool.
+    """
+
+    def __init__(
+        self,
+        factory: Optional[Callable[[], Any]] = None,
+        language: str = "en-US",
+        size: int = 2,
+        max_checks_per_engine: int = 500,
+        max_engine_rss_mb: Optional[int] = 1024,
+        max_waiters: int = 16,
+        lease_timeout: float = 30.0,
+        health_check_interval: float = 300.0,
+    ):
+        self._factory = factory or _default_factory(language)
+        self.size = max(1, size)
+        self.max_checks_per_engine = max_checks_per_engine
+        self.max_engine_rss_bytes = max_engine_rss_mb * 1024 * 1024 if max_engine_rss_mb else None
+        self.max_waiters = max_waiters
+        self.lease_timeout = lease_timeout
+        self.health_check_interval = health_check_interval
+
+        self._idle: "queue.LifoQueue[_Engine]" = queue.LifoQueue(maxsize=self.size)
+        self._lock = threading.Lock()
+        self._created = 0
+        self._waiters = 0
+        self._closed = False
+        self._stats = {"leases": 0, "created": 0, "recycled": 0, "rejected": 0, "waitMs": 0.0}
+
+    def start(self) -> None:
+        """Eagerly create every engine so the JVM start-up happens off the request path."""
+        engines = []
+        while True:
+            engine = self._try_create()
+            if engine is None:
+                break
+            engines.append(engine)
+        for engine in engines:
+            self._idle.put_nowait(engine)
+
+    def _try_create(self) -> Optional[_Engine]:
+        with self._lock:
+            if self._closed or self._created >= self.size:
+                return None
+            self._created += 1
+        try:
+            engine = _Engine(self._factory())
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+        with self._lock:
+            self._stats["created"] += 1
+        return engine
+
+    def _acquire(self, timeout: Optional[float]) -> _Engine:
+        if self._closed:
+            raise LanguageToolPoolBusy("LanguageTool pool has been shut down")
+
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        engine = self._try_create()
+        if engine is not None:
+            return engine
+
+        with self._lock:
+            if self._waiters >= self.max_waiters:
+                self._stats["rejected"] += 1
+                raise LanguageToolPoolBusy("All LanguageTool engines are busy")
+            self._waiters += 1
+        try:
+            return self._idle.get(timeout=self.lease_timeout if timeout is None else timeout)
+        except queue.Empty:
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise LanguageToolPoolBusy("Timed out waiting for a LanguageTool engine")
+        finally:
+            with self._lock:
+                self._waiters -= 1
+
+    def _health_check(self, engine: _Engine) -> None:
+        if time.monotonic() - engine.last_used < self.health_check_interval:
+            return
+        try:
+            engine.tool.check("Health check.")
+        except Exception as e:
+            print(f"LanguageTool engine failed health check: {e}")
+            engine.healthy = False
+
+    def _release(self, engine: _Engine) -> None:
+        engine.checks += 1
+        engine.last_used = time.monotonic()
+
+        recycle = not engine.healthy or self._closed
+        if engine.checks >= self.max_checks_per_engine:
+            recycle = True
+        elif self.max_engine_rss_bytes is not None:
+            rss = _engine_rss_bytes(engine.tool)
+            if rss is not None and rss > self.max_engine_rss_bytes:
+                recycle = True
+
+        if not recycle:
+            self._idle.put_nowait(engine)
+            return
+
+        self._close_engine(engine)
+        with self._lock:
+            self._created -= 1
+            self._stats["recycled"] += 1
+            waiting = self._waiters > 0
+        if waiting:
+            # A blocked caller only wakes for an idle engine, so the freed slot
+            # is refilled for it rather than left for it to time out on
+            try:
+                replacement = self._try_create()
+            except Exception as e:
+                print(f"Error replacing recycled LanguageTool engine: {e}")
+                return
+            if replacement is not None:
+                self._idle.put_nowait(replacement)
+
+    @staticmethod
+    def _close_engine(engine: _Engine) -> None:
+        try:
+            engine.tool.close()
+        except Exception as e:
+            print(f"Error closing LanguageTool engine: {e}")
+
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None):
+        """Lease a warm engine for the duration of the `with` block."""
+        started = time.perf_counter()
+        engine = self._acquire(timeout)
+        with self._lock:
+            self._stats["leases"] += 1
+            self._stats["waitMs"] += (time.perf_counter() - started) * 1000
+
+        # An engine that sat idle for a long time is probed before use; a dead
+        # one is replaced transparently rather than failing the caller.
+        self._health_check(engine)
+        if not engine.healthy:
+            self._release(engine)
+            engine = self._acquire(timeout)
+
+        try:
+            yield engine.tool
+        except Exception as e:
+            # Only a broken engine is recycled; a caller's own error returns it healthy
+            if _is_engine_error(e):
+                engine.healthy = False
+            raise
+        finally:
+            self._release(engine)
+
+    def check(self, text: str, timeout: Optional[float] = None):
+        with self.lease(timeout) as tool:
+            return tool.check(text)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(
+                self._stats,
+                size=self.size,
+                engines=self._created,
+                idle=self._idle.qsize(),
+                waiters=self._waiters,
+            )
+
+    def shutdown(self) -> None:
+        """Close every idle engine; engines still leased are closed when returned."""
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                engine = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._close_engine(engine)
+            with self._lock:
+                self._created -= 1
+
+
+_pool: Optional[LanguageToolPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_language_tool_pool() -> LanguageToolPool:
+    """Return the process-wide pool, creating it from the environment on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                rss_limit = int(os.getenv("LANGUAGETOOL_MAX_ENGINE_RSS_MB", "1024"))
+                _pool = LanguageToolPool(
+                    factory=_factory_from_env(),
+                    language=os.getenv("LANGUAGETOOL_LANGUAGE", "en-US"),
+                    size=int(os.getenv("LANGUAGETOOL_POOL_SIZE", "2")),
+                    max_checks_per_engine=int(os.getenv("LANGUAGETOOL_MAX_CHECKS_PER_ENGINE", "500")),
+                    max_engine_rss_mb=rss_limit or None,
+                    max_waiters=int(os.getenv("LANGUAGETOOL_MAX_WAITERS", "16")),
+                    lease_timeout=float(os.getenv("LANGUAGETOOL_LEASE_TIMEOUT", "30")),
+                )
+                atexit.register(_pool.shutdown)
+    return _pool
+
+
+def shutdown_language_tool_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
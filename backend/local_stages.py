@@ -0,0 +1,159 @@
+"""
+CPU-bound local stages (spelling, lexicon vocabulary, position resolution
+and validation; local_scorer.analyze_text is sent as it is) and an opt-in process pool to run them
+on, so one service process can use every core instead of serializing this
+work under the GIL.
+
+With LOCAL_STAGE_PROCESSES=N (default 0: in-process), the stages run in N
+worker processes. Each worker loads the lexicon, the spelling index (an mmap,
+so its pages are shared between workers) and the other module state once,
+when it starts. A call sends the essay and its inputs once and gets plain
+dicts and lists back; the post-model stages travel as a single task, so a
+response crosses the process boundary once each way. Workers are started
+with forkserver (spawn where that is unavailable), never by forking the
+threaded service process.
+
+Meant for the long-running service on multi-core hosts; serverless handlers
+have one request per process and nothing to gain.
+"""
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from essay_index import essay_index
+from feedback_model import validate_feedback
+from instrumentation import current_timings, timed_stage, track_request
+from span_resolver import add_utf16_offsets, resolve_feedback_positions
+from spelling import get_spell_checker
+from vocabulary_analyzer import get_vocabulary_analyzer, merge_vocabulary_enhancements
+
+
+# --- Stages (top-level so they can be sent to a worker by reference) ---
+
+def vocabulary_enhancements(content: str) -> List[Dict[str, Any]]:
+    return get_vocabulary_analyzer().analyze(content)["enhancements"]
+
+
+def check_spelling(text: str) -> List[Dict[str, Any]]:
+    spell_checker = get_spell_checker()
+    return spell_checker.check(text) if spell_checker is not None else []
+
+
+def postprocess_feedback(feedback_data: Dict[str, Any], content: str, grammar_feedback: List[Dict[str, Any]],
+                         local_vocabulary: str, drop_unresolved: bool = False
+                         ) -> Tuple[Dict[str, Any], List[str], Dict[str, float]]:
+    """
+    Everything finalize_feedback does to a model response that needs no I/O:
+    re-anchors the quoted positions, adds the LanguageTool corrections and
+    lexicon suggestions, annotates UTF-16 offsets and validates the result.
+    `drop_unresolved` is passed on to resolve_feedback_positions.
+    Returns (feedback, validation issues, stage durations in ms).
+    """
+    with track_request() as timings:
+        # Grammar corrections are added after re-anchoring: their offsets are exact already
+        with timed_stage("positionValidation"):
+            feedback_data = resolve_feedback_positions(feedback_data, content, drop_unresolved)
+        feedback_data["grammarCorrections"] = grammar_feedback
+
+        model_vocabulary = feedback_data.get("vocabularyEnhancements") if local_vocabulary != "only" else None
+        local_items: List[Dict[str, Any]] = []
+        if local_vocabulary != "off":
+            with timed_stage("vocabulary"):
+                local_items = vocabulary_enhancements(content)
+        feedback_data["vocabularyEnhancements"] = merge_vocabulary_enhancements(
+            model_vocabulary if isinstance(model_vocabulary, list) else [], local_items
+        )
+        add_utf16_offsets(feedback_data, essay_index(content))
+
+        # One validating pass over the assembled response; malformed items are dropped
+        with timed_stage("validation"):
+            issues = validate_feedback(feedback_data)
+    return feedback_data, issues, timings.durations
+
+
+# --- Process pool ---
+
+def _warm_worker() -> None:
+    # Per-worker state, loaded once instead of on the worker's first task
+    get_vocabulary_analyzer()
+    get_spell_checker()
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _processes() -> int:
+    return int(os.getenv("LOCAL_STAGE_PROCESSES", "0"))
+
+
+def get_process_pool() -> Optional[ProcessPoolExecutor]:
+    """The local stage pool, or None when LOCAL_STAGE_PROCESSES is 0 (the default)."""
+    global _pool
+    if _processes() <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+                _pool = ProcessPoolExecutor(max_workers=_processes(), mp_context=context, initializer=_warm_worker)
+    return _pool
+
+
+def prewarm_process_pool() -> None:
+    """Starts the workers (and loads their state) now rather than on the first requests."""
+    pool = get_process_pool()
+    if pool is not None:
+        # The pool starts a worker per task submitted while none is idle
+        list(pool.map(_ready, range(_processes())))
+
+
+def _ready(_: int) -> bool:
+    return True
+
+
+def run_local_stage(fn: Callable[..., Any], *args: Any) -> Any:
+    """
+    Runs `fn(*args)` on the process pool when it is enabled, otherwise inline.
+    A pool broken by a dead worker (OOM kill, crash in a C extension) is
+    discarded, to be rebuilt by the next call, and this call runs inline.
+    """
+    pool = get_process_pool()
+    if pool is None:
+        return fn(*args)
+    try:
+        return pool.submit(fn, *args).result()
+    except BrokenProcessPool as e:
+        print(f"Local stage worker died ({e}); restarting the process pool")
+        _discard_pool(pool)
+        return fn(*args)
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    global _pool
+    with _pool_lock:
+        # Concurrent callers see the same broken pool; only the first replaces it
+        if _pool is not pool:
+            return
+        _pool = None
+    pool.shutdown(wait=False)
+
+
+def record_stage_durations(durations: Dict[str, float]) -> None:
+    """Adds stage durations measured in a worker to the current request's timings."""
+    timings = current_timings()
+    if timings is not None:
+        for stage, ms in durations.items():
+            timings.record(stage, ms)
+
+
+def shutdown_process_pool(wait: bool = True) -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait)
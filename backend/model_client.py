@@ -0,0 +1,240 @@
+import os
+import time
+import random
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERROR_NAMES = {"RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError"}
+
+
+class ModelBudgetExceeded(RuntimeError):
+    """Raised when a request cannot be admitted or retried before its deadline."""
+
+
+class TokenBucket:
+    """Refills continuously at `per_minute`; callers wait for capacity instead of failing."""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, amount: float) -> float:
+        """Takes `amount` and returns 0, or returns the seconds to wait before it is available."""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return 0.0
+            return (amount - self._tokens) / self.rate
+
+    def refund(self, amount: float) -> None:
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+    def pressure(self) -> float:
+        """Fraction of the bucket currently spent, 0.0 (idle) to 1.0 (exhausted)."""
+        with self._lock:
+            self._refill(self._clock())
+            return 1.0 - self._tokens / self.capacity
+
+
+def estimate_request_tokens(messages: List[Dict[str, Any]], max_tokens: Optional[int]) -> int:
+    # ~4 characters per token for English prose; the completion budget is reserved up front
+    prompt_chars = sum(len(str(m.get("content", ""))) for m in messages)
+    return prompt_chars // 4 + (max_tokens or 0)
+
+
+def is_retryable(error: Exception) -> bool:
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    return type(error).__name__ in RETRYABLE_ERROR_NAMES or isinstance(error, (TimeoutError, ConnectionError))
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """A provider-side 429: another model, with its own limits, may still have capacity."""
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class _GuardedStream:
+    """A streamed response that holds its in-flight slot until consumed or closed."""
+
+    def __init__(self, stream: Any, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+        self._released = False
+
+    def __iter__(self) -> Iterator[Any]:
+        try:
+            yield from self._stream
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if not self._released:
+            self._released = True
+            self._release()
+
+    def __del__(self):
+        self.close()
+
+
+class ModelClient:
+    """
+    Wraps an OpenAI client with a process-wide concurrency cap, request and
+    token budgets, and retries with jittered exponential backoff.
+
+    Over-budget calls queue until capacity frees up; a call is only failed
+    when it cannot be admitted or retried before `deadline` seconds have
+    passed since it was made.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_in_flight: int = 8,
+        max_retries: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 20.0,
+        deadline: float = 90.0,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.client = client
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self._sleep = sleep
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats = {"requests": 0, "retries": 0, "failures": 0, "throttledMs": 0.0}
+
+    def _wait_for(self, bucket: Optional[TokenBucket], amount: float, deadline: float) -> None:
+        if bucket is None:
+            return
+        while True:
+            wait = bucket.try_acquire(amount)
+            if wait <= 0:
+                return
+            if time.monotonic() + wait > deadline:
+                raise ModelBudgetExceeded("Model rate budget exhausted")
+            with self._lock:
+                self._stats["throttledMs"] += wait * 1000
+            self._sleep(wait)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        # Full jitter keeps retries from a burst of failures from re-synchronizing
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _enter(self, deadline: float) -> None:
+        if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            raise ModelBudgetExceeded("Too many model requests in flight")
+        with self._lock:
+            self._in_flight += 1
+
+    def _exit(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def create_chat_completion(self, **kwargs) -> Any:
+        """Drop-in for client.chat.completions.create with budgeting and retries."""
+        deadline = time.monotonic() + self.deadline
+        estimated = estimate_request_tokens(kwargs.get("messages", []), kwargs.get("max_tokens"))
+        streaming = bool(kwargs.get("stream"))
+
+        self._enter(deadline)
+        handed_off = False
+        try:
+            attempt = 0
+            while True:
+                self._wait_for(self.request_bucket, 1, deadline)
+                self._wait_for(self.token_bucket, estimated, deadline)
+                with self._lock:
+                    self._stats["requests"] += 1
+                try:
+                    response = self.client.chat.completions.create(**kwargs)
+                except Exception as e:
+                    if self.token_bucket is not None:
+                        self.token_bucket.refund(estimated)
+                    delay = self._backoff(attempt, e)
+                    if (not is_retryable(e) or attempt >= self.max_retries
+                            or time.monotonic() + delay > deadline):
+                        with self._lock:
+                            self._stats["failures"] += 1
+                        raise
+                    attempt += 1
+                    with self._lock:
+                        self._stats["retries"] += 1
+                    print(f"Retrying model call after {type(e).__name__} (attempt {attempt}, {delay:.2f}s)")
+                    self._sleep(delay)
+                    continue
+
+                usage = getattr(response, "usage", None)
+                if self.token_bucket is not None and usage is not None:
+                    # Give back the part of the reservation the call did not use
+                    self.token_bucket.refund(max(0, estimated - (getattr(usage, "total_tokens", None) or estimated)))
+                if streaming:
+                    handed_off = True
+                    return _GuardedStream(response, self._exit)
+                return response
+        finally:
+            if not handed_off:
+                self._exit()
+
+    def load(self) -> float:
+        """Current pressure from 0.0 to 1.0: the highest of concurrency and budget use."""
+        with self._lock:
+            pressure = self._in_flight / self.max_in_flight
+        for bucket in (self.request_bucket, self.token_bucket):
+            if bucket is not None:
+                pressure = max(pressure, bucket.pressure())
+        return pressure
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, inFlight=self._in_flight, maxInFlight=self.max_in_flight)
+
+
+def create_model_client(client: Any) -> ModelClient:
+    """Builds the process-wide ModelClient from the environment (0 disables a budget)."""
+    return ModelClient(
+        client,
+        requests_per_minute=float(os.getenv("MODEL_REQUESTS_PER_MINUTE", "500")) or None,
+        tokens_per_minute=float(os.getenv("MODEL_TOKENS_PER_MINUTE", "0")) or None,
+        max_in_flight=int(os.getenv("MODEL_MAX_IN_FLIGHT", "8")),
+        max_retries=int(os.getenv("MODEL_MAX_RETRIES", "4")),
+        deadline=float(os.getenv("MODEL_RETRY_DEADLINE", "90")),
+    )
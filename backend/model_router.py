@@ -0,0 +1,105 @@
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class ModelTier:
+    """One routing target: the model, its completion ceiling and how much feedback to ask for."""
+    name: str
+    model: str
+    max_output_tokens: int
+    depth: str
+
+    @property
+    def cache_label(self) -> str:
+        # Feedback from different tiers must never be served for one another
+        return f"{self.model}/{self.depth}/{self.max_output_tokens}"
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    tier: ModelTier
+    requested: ModelTier
+    reason: str
+
+    @property
+    def degraded(self) -> bool:
+        return self.tier != self.requested
+
+    def as_dict(self) -> Dict[str, str]:
+        routing = {"tier": self.tier.name, "reason": self.reason}
+        if self.degraded:
+            routing["requestedTier"] = self.requested.name
+        return routing
+
+
+# Assistance levels sent by the frontends, mapped to a tier index (0 is the cheapest)
+LEVEL_TIERS = {
+    "realtime": 0, "minimal": 0, "light": 0,
+    "moderate": 1, "standard": 1,
+    "detailed": 2, "comprehensive": 2, "exam": 2, "full": 2,
+}
+
+
+class ModelRouter:
+    """
+    Picks the model tier for an evaluation. `tiers` are ordered from the
+    cheapest to the strongest. The assistance level chooses the tier, short
+    drafts are capped at `short_tier`, and under rate pressure the choice is
+    stepped down: one tier once client load reaches `degrade_at`, to the
+    cheapest tier at `shed_at`.
+    """
+
+    def __init__(self, tiers: List[ModelTier], default_level: str = "standard", short_words: int = 150,
+                 short_tier: int = 1, degrade_at: float = 0.8, shed_at: float = 0.95):
+        self.tiers = tiers
+        self.default_level = default_level
+        self.short_words = short_words
+        self.short_tier = short_tier
+        self.degrade_at = degrade_at
+        self.shed_at = shed_at
+
+    def requested(self, assistance_level: Optional[str], word_count: int) -> Tuple[int, str]:
+        level = (assistance_level or self.default_level).lower()
+        index = min(LEVEL_TIERS.get(level, LEVEL_TIERS[self.default_level]), len(self.tiers) - 1)
+        if word_count < self.short_words and index > self.short_tier:
+            return self.short_tier, "short"
+        return index, "level"
+
+    def route(self, assistance_level: Optional[str], word_count: int, load: float = 0.0) -> RouteDecision:
+        index, reason = self.requested(assistance_level, word_count)
+        requested = self.tiers[index]
+        if load >= self.shed_at and index > 0:
+            index, reason = 0, "shed"
+        elif load >= self.degrade_at and index > 0:
+            index, reason = index - 1, "degraded"
+        return RouteDecision(self.tiers[index], requested, reason)
+
+    def cheaper(self, tier: ModelTier) -> Optional[ModelTier]:
+        """The next tier down that uses a different model, if any."""
+        index = self.tiers.index(tier)
+        for candidate in reversed(self.tiers[:index]):
+            if candidate.model != tier.model:
+                return candidate
+        return None
+
+
+def create_model_router(strong_model: str) -> ModelRouter:
+    """Builds the router from the environment; MODEL_ROUTING=false sends everything to `strong_model`."""
+    full = ModelTier("full", os.getenv("MODEL_TIER_FULL", strong_model),
+                     int(os.getenv("MODEL_TIER_FULL_MAX_TOKENS", "2000")), "detailed")
+    if os.getenv("MODEL_ROUTING", "true").lower() == "false":
+        return ModelRouter([ModelTier("full", strong_model, full.max_output_tokens, "standard")], short_tier=0)
+    return ModelRouter(
+        [
+            ModelTier("fast", os.getenv("MODEL_TIER_FAST", "gpt-4.1-mini"),
+                      int(os.getenv("MODEL_TIER_FAST_MAX_TOKENS", "900")), "brief"),
+            ModelTier("standard", os.getenv("MODEL_TIER_STANDARD", "gpt-4.1-mini"),
+                      int(os.getenv("MODEL_TIER_STANDARD_MAX_TOKENS", "1600")), "standard"),
+            full,
+        ],
+        short_words=int(os.getenv("MODEL_ROUTING_SHORT_WORDS", "150")),
+        degrade_at=float(os.getenv("MODEL_DEGRADE_LOAD", "0.8")),
+        shed_at=float(os.getenv("MODEL_SHED_LOAD", "0.95")),
+    )
@@ -0,0 +1,290 @@
+import json
+from string import Template
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from incremental_grammar import split_paragraphs
+
+CHARS_PER_TOKEN = 4
+# Static text of the original nsw-selective prompt and its fixed completion
+# budget; savings are reported against these
+LEGACY_PROMPT_OVERHEAD_TOKENS = 665
+LEGACY_MAX_TOKENS = 2000
+
+# Completion tokens each requested section needs, measured on typical responses
+SCORES_OUTPUT_TOKENS = 80
+CATEGORY_OUTPUT_TOKENS = 300
+VOCABULARY_OUTPUT_TOKENS = 240
+CRITERIA_COUNT = 4
+OUTPUT_MARGIN = 1.2
+# Items asked for in each strengths/areasForImprovement list, and the
+# completion tokens one criterion's category then needs
+FEEDBACK_DEPTHS = {
+    "brief": ("1-2", 160),
+    "standard": ("2-3", CATEGORY_OUTPUT_TOKENS),
+    "detailed": ("3-4", 420),
+}
+
+SYSTEM_MESSAGE = "You are an expert NSW Selective School writing assessor. Return only valid JSON."
+
+_INSTRUCTIONS = """You assess NSW Selective School writing by 10-12 year olds.
+Score this $text_type writing ($word_count words)$window_note.
+Return overallScore (0-100) and criteriaScores (1-5 each) for ideasAndContent, textStructureAndOrganization, languageFeaturesAndVocabulary and spellingPunctuationAndGrammar.
+For each criterion add a feedbackCategories entry with $items strengths and $items areasForImprovement, each quoting exact text from the essay with its 0-indexed character position.
+"""
+_VOCABULARY_INSTRUCTIONS = """Add 3-5 vocabularyEnhancements: original word, suggested replacement, explanation and position.
+"""
+_TAIL = """Omit grammarCorrections; a separate system checks grammar and spelling.
+Return only JSON shaped like:
+$schema
+Text:
+\"\"\"$content\"\"\""""
+
+_SCHEMA_EXAMPLE = {
+    "overallScore": 85,
+    "criteriaScores": {
+        "ideasAndContent": 4,
+        "textStructureAndOrganization": 4,
+        "languageFeaturesAndVocabulary": 3,
+        "spellingPunctuationAndGrammar": 4,
+    },
+    "feedbackCategories": [{
+        "category": "Ideas and Content",
+        "score": 4,
+        "strengths": [{"exampleFromText": "...", "position": {"start": 0, "end": 22}, "comment": "..."}],
+        "areasForImprovement": [{"exampleFromText": "...", "position": {"start": 45, "end": 68},
+                                 "suggestionForImprovement": "..."}],
+    }],
+}
+_VOCABULARY_SCHEMA = [{"original": "...", "suggestion": "...", "explanation": "...",
+                       "position": {"start": 62, "end": 68}}]
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+@dataclass
+class PromptPlan:
+    """One model call: its messages, completion budget and the essay span it covers."""
+    messages: List[Dict[str, str]]
+    max_tokens: int
+    input_tokens: int
+    offset: int
+    length: int
+
+
+class PromptBuilder:
+    """
+    Builds compact feedback prompts. The static template is compiled once per
+    variant, the completion budget is sized to the sections requested, and
+    essays longer than `window_tokens` are split on paragraph boundaries into
+    windows evaluated separately and merged with merge_window_feedback.
+    """
+
+    def __init__(self, max_output_tokens: int = LEGACY_MAX_TOKENS, window_tokens: int = 1500):
+        self.max_output_tokens = max_output_tokens
+        self.window_tokens = window_tokens
+        self._templates: Dict[Tuple[bool, str], Template] = {}
+        for include_vocabulary in (True, False):
+            schema = dict(_SCHEMA_EXAMPLE)
+            if include_vocabulary:
+                schema["vocabularyEnhancements"] = _VOCABULARY_SCHEMA
+            # Literal "$" in the schema must not be read as a placeholder
+            compact = json.dumps(schema, separators=(",", ":")).replace("$", "$$")
+            text = _INSTRUCTIONS + (_VOCABULARY_INSTRUCTIONS if include_vocabulary else "") + _TAIL
+            for depth, (items, _) in FEEDBACK_DEPTHS.items():
+                compiled = text.replace("$schema", compact).replace("$items", items)
+                self._templates[(include_vocabulary, depth)] = Template(compiled)
+
+    def output_budget(self, include_vocabulary: bool, depth: str = "standard",
+                      max_output_tokens: Optional[int] = None) -> int:
+        expected = SCORES_OUTPUT_TOKENS + CRITERIA_COUNT * FEEDBACK_DEPTHS[depth][1]
+        if include_vocabulary:
+            expected += VOCABULARY_OUTPUT_TOKENS
+        ceiling = min(self.max_output_tokens, max_output_tokens or self.max_output_tokens)
+        return min(ceiling, int(expected * OUTPUT_MARGIN))
+
+    def build(self, content: str, text_type: str, word_count: int, include_vocabulary: bool = True,
+              window_note: str = "", offset: int = 0, depth: str = "standard",
+              max_output_tokens: Optional[int] = None) -> PromptPlan:
+        prompt = self._templates[(include_vocabulary, depth)].substitute(
+            text_type=text_type, word_count=word_count, window_note=window_note, content=content
+        )
+        messages = [
+            {"role": "system", "content": SYSTEM_MESSAGE},
+            {"role": "user", "content": prompt},
+        ]
+        return PromptPlan(
+            messages=messages,
+            max_tokens=self.output_budget(include_vocabulary, depth, max_output_tokens),
+            input_tokens=estimate_tokens(SYSTEM_MESSAGE) + estimate_tokens(prompt),
+            offset=offset,
+            length=len(content),
+        )
+
+    def continuation(self, plan: PromptPlan, partial: Dict[str, Any], missing_sections: List[str],
+                     missing_categories: List[str]) -> PromptPlan:
+        """
+        Follow-up call for a cut-off response: replays the recovered sections as
+        the assistant turn and asks for the missing ones only, with a completion
+        budget sized to them.
+        """
+        wanted = list(missing_sections)
+        expected = 0
+        for section in missing_sections:
+            if section == "feedbackCategories":
+                expected += CRITERIA_COUNT * CATEGORY_OUTPUT_TOKENS
+            elif section == "vocabularyEnhancements":
+                expected += VOCABULARY_OUTPUT_TOKENS
+            else:
+                expected += SCORES_OUTPUT_TOKENS
+        if missing_categories:
+            wanted.append("feedbackCategories entries for only " + "; ".join(missing_categories))
+            expected += len(missing_categories) * CATEGORY_OUTPUT_TOKENS
+        request = (f"Your response was cut off. Return only a JSON object with {', '.join(wanted)}, "
+                   "in the same format.")
+        recovered = json.dumps(partial, separators=(",", ":"))
+        messages = plan.messages + [
+            {"role": "assistant", "content": recovered},
+            {"role": "user", "content": request},
+        ]
+        return PromptPlan(
+            messages=messages,
+            max_tokens=min(self.max_output_tokens, int(expected * OUTPUT_MARGIN)),
+            input_tokens=plan.input_tokens + estimate_tokens(recovered) + estimate_tokens(request),
+            offset=plan.offset,
+            length=plan.length,
+        )
+
+    def plan(self, content: str, text_type: str, word_count: int, include_vocabulary: bool = True,
+             allow_windows: bool = True, depth: str = "standard",
+             max_output_tokens: Optional[int] = None) -> List[PromptPlan]:
+        """One plan per model call needed for the essay, at the given feedback depth."""
+        windows = self._windows(content) if allow_windows else []
+        if len(windows) <= 1:
+            return [self.build(content, text_type, word_count, include_vocabulary,
+                               depth=depth, max_output_tokens=max_output_tokens)]
+        plans = []
+        for number, (start, end) in enumerate(windows, 1):
+            text = content[start:end]
+            note = f", part {number} of {len(windows)} of a longer essay; judge this part on its own merits"
+            plans.append(self.build(text, text_type, len(text.split()), include_vocabulary, note, start,
+                                    depth, max_output_tokens))
+        return plans
+
+    def _windows(self, content: str) -> List[Tuple[int, int]]:
+        if estimate_tokens(content) <= self.window_tokens:
+            return []
+        windows: List[Tuple[int, int]] = []
+        start: Optional[int] = None
+        end = 0
+        for offset, paragraph in split_paragraphs(content):
+            paragraph_end = offset + len(paragraph)
+            # An oversized paragraph becomes a window of its own
+            if start is not None and estimate_tokens(content[start:paragraph_end]) > self.window_tokens:
+                windows.append((start, end))
+                start = None
+            if start is None:
+                start = offset
+            end = paragraph_end
+        if start is not None:
+            windows.append((start, end))
+        return windows
+
+
+def token_savings(plans: List[PromptPlan], essay_tokens: int) -> Dict[str, int]:
+    """Estimated input and reserved output tokens compared with the original prompt."""
+    input_tokens = sum(p.input_tokens for p in plans)
+    output_tokens = sum(p.max_tokens for p in plans)
+    return {
+        "windows": len(plans),
+        "inputTokens": input_tokens,
+        "inputTokensSaved": LEGACY_PROMPT_OVERHEAD_TOKENS + essay_tokens - input_tokens,
+        "maxOutputTokens": output_tokens,
+        "outputTokensSaved": LEGACY_MAX_TOKENS - output_tokens,
+    }
+
+
+# --- Window merging ---
+
+FEEDBACK_ITEM_LISTS = ("strengths", "areasForImprovement")
+# The most any depth asks for; a merged list is no longer than the longest window's
+MAX_ITEMS_PER_LIST = 4
+MAX_VOCABULARY_ITEMS = 5
+
+
+def _shift_positions(items: Any, offset: int) -> List[Dict[str, Any]]:
+    shifted = []
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        item = dict(item)
+        position = item.get("position")
+        if isinstance(position, dict):
+            item["position"] = {
+                "start": (position.get("start") or 0) + offset,
+                "end": (position.get("end") or 0) + offset,
+            }
+        shifted.append(item)
+    return shifted
+
+
+def _interleave(lists: List[List[Dict[str, Any]]], limit: int) -> List[Dict[str, Any]]:
+    # Round-robin so every window contributes before any contributes twice
+    merged = []
+    for depth in range(max((len(l) for l in lists), default=0)):
+        for items in lists:
+            if depth < len(items):
+                merged.append(items[depth])
+    return merged[:limit]
+
+
+def _weighted_score(values: List[Tuple[Any, int]]) -> int:
+    numeric = [(v, w) for v, w in values if isinstance(v, (int, float))]
+    total = sum(w for _, w in numeric)
+    if not total:
+        return 0
+    return int(round(sum(v * w for v, w in numeric) / total))
+
+
+def merge_window_feedback(results: List[Tuple[PromptPlan, Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Combines per-window feedback into one response. Scores are averaged
+    weighted by window length; quoted items are moved to whole-essay offsets
+    and interleaved so every window is represented.
+    """
+    weighted = [(plan.length, plan.offset, data) for plan, data in results]
+
+    criteria_keys: List[str] = []
+    for _, _, data in weighted:
+        for key in data.get("criteriaScores") or {}:
+            if key not in criteria_keys:
+                criteria_keys.append(key)
+
+    categories: Dict[str, List[Tuple[int, int, Dict[str, Any]]]] = {}
+    for weight, offset, data in weighted:
+        for category in data.get("feedbackCategories") or []:
+            if isinstance(category, dict):
+                categories.setdefault(category.get("category", ""), []).append((weight, offset, category))
+
+    merged_categories = []
+    for name, parts in categories.items():
+        merged = {"category": name, "score": _weighted_score([(c.get("score"), w) for w, _, c in parts])}
+        for field in FEEDBACK_ITEM_LISTS:
+            lists = [_shift_positions(c.get(field), o) for _, o, c in parts]
+            merged[field] = _interleave(lists, min(MAX_ITEMS_PER_LIST, max((len(l) for l in lists), default=0)))
+        merged_categories.append(merged)
+
+    return {
+        "overallScore": _weighted_score([(d.get("overallScore"), w) for w, _, d in weighted]),
+        "criteriaScores": {
+            key: _weighted_score([((d.get("criteriaScores") or {}).get(key), w) for w, _, d in weighted])
+            for key in criteria_keys
+        },
+        "feedbackCategories": merged_categories,
+        "grammarCorrections": [],
+        "vocabularyEnhancements": _interleave(
+            [_shift_positions(d.get("vocabularyEnhancements"), o) for _, o, d in weighted], MAX_VOCABULARY_ITEMS
+        ),
+    }
@@ -0,0 +1,238 @@
+import os
+import heapq
+import time
+import itertools
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from instrumentation import metrics
+from single_flight import LeaderCancelled
+
+# Highest priority first: editor checks a student is waiting on, explicit
+# submissions, then teacher batch marking
+PRIORITY_CLASSES = ("realtime", "submit", "batch")
+
+
+class Superseded(LeaderCancelled):
+    """
+    A newer request for the same student replaced this one while it was
+    still queued. Coalesced followers of a superseded call retry rather than
+    inherit the error.
+    """
+
+
+class QueueTimeout(Exception):
+    """The request waited longer than its class allows for an evaluation slot."""
+
+
+@dataclass(frozen=True)
+class Admission:
+    """Who is asking and how urgently: the priority class, the fair-queuing tenant and the supersession key."""
+    priority: str = "submit"
+    tenant: str = "anonymous"
+    # Queued work with the same priority and key is dropped when a new request arrives
+    supersede_key: Optional[str] = None
+
+
+class _Ticket:
+    __slots__ = ("admission", "start_tag", "state", "event", "enqueued")
+
+    def __init__(self, admission: Admission, start_tag: float):
+        self.admission = admission
+        self.start_tag = start_tag
+        self.state = "queued"
+        self.event = threading.Event()
+        self.enqueued = time.perf_counter()
+
+
+class RequestScheduler:
+    """
+    Admission control for evaluations. At most `max_concurrent` run at once
+    and each class may be capped further (`class_limits`), so a class upload
+    can never hold every slot. A free slot goes to the highest priority class
+    with queued work; within a class, tenants (students, teachers' batches)
+    share slots by start-time fair queuing, in proportion to their weight, so
+    one tenant's thirty essays interleave with everyone else's instead of
+    going first.
+
+    A request carrying a supersede key replaces any queued request of the
+    same class and key: the older one raises Superseded before it runs and
+    the newer one takes its place in the queue.
+    """
+
+    def __init__(self, max_concurrent: int = 16, class_limits: Optional[Dict[str, int]] = None,
+                 timeouts: Optional[Dict[str, Optional[float]]] = None,
+                 tenant_weights: Optional[Dict[str, float]] = None):
+        self.max_concurrent = max_concurrent
+        self.class_limits = class_limits or {}
+        self.timeouts = timeouts or {}
+        self.tenant_weights = tenant_weights or {}
+        self._queues: Dict[str, List[Tuple[float, int, _Ticket]]] = {name: [] for name in PRIORITY_CLASSES}
+        self._queued: Dict[str, int] = dict.fromkeys(PRIORITY_CLASSES, 0)
+        self._running: Dict[str, int] = dict.fromkeys(PRIORITY_CLASSES, 0)
+        # Per class: the virtual time (start tag of the last dispatch) and each tenant's finish tag
+        self._virtual: Dict[str, float] = dict.fromkeys(PRIORITY_CLASSES, 0.0)
+        self._finish: Dict[str, Dict[str, float]] = {name: {} for name in PRIORITY_CLASSES}
+        self._waiting: Dict[Tuple[str, str], _Ticket] = {}
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, admission: Admission) -> Iterator[None]:
+        """Blocks until the request may run and holds its slot for the duration of the block."""
+        if admission.priority not in self._queues:
+            admission = Admission("submit", admission.tenant, admission.supersede_key)
+        ticket = self._enqueue(admission)
+        self._wait(ticket)
+        try:
+            yield
+        finally:
+            self._release(admission.priority)
+
+    def _enqueue(self, admission: Admission) -> _Ticket:
+        priority = admission.priority
+        with self._lock:
+            replaced = None
+            if admission.supersede_key is not None:
+                replaced = self._waiting.get((priority, admission.supersede_key))
+            if replaced is not None and replaced.state == "queued":
+                # The stale request gives up its place in line to the new one
+                replaced.state = "superseded"
+                replaced.event.set()
+                self._queued[priority] -= 1
+                ticket = _Ticket(admission, replaced.start_tag)
+            else:
+                start = max(self._virtual[priority], self._finish[priority].get(admission.tenant, 0.0))
+                self._finish[priority][admission.tenant] = start + 1.0 / self.tenant_weights.get(admission.tenant, 1.0)
+                ticket = _Ticket(admission, start)
+            if admission.supersede_key is not None:
+                self._waiting[(priority, admission.supersede_key)] = ticket
+            heapq.heappush(self._queues[priority], (ticket.start_tag, next(self._sequence), ticket))
+            self._queued[priority] += 1
+            self._dispatch()
+            self._publish(priority)
+        return ticket
+
+    def _wait(self, ticket: _Ticket) -> None:
+        priority = ticket.admission.priority
+        ticket.event.wait(self.timeouts.get(priority))
+        with self._lock:
+            state = ticket.state
+            if state == "queued":
+                # Timed out; the heap entry is skipped when it surfaces
+                ticket.state = "expired"
+                self._queued[priority] -= 1
+            self._forget(ticket)
+            self._publish(priority)
+        if state == "superseded":
+            metrics.inc("scheduler_requests_total", outcome="superseded", **{"class": priority})
+            raise Superseded(ticket.admission.supersede_key)
+        if state == "queued":
+            metrics.inc("scheduler_requests_total", outcome="timeout", **{"class": priority})
+            raise QueueTimeout(f"No {priority} evaluation slot within {self.timeouts.get(priority)}s")
+        waited_ms = (time.perf_counter() - ticket.enqueued) * 1000
+        metrics.inc("scheduler_requests_total", outcome="admitted", **{"class": priority})
+        metrics.observe("scheduler_wait_ms", waited_ms, **{"class": priority})
+
+    def _forget(self, ticket: _Ticket) -> None:
+        # A superseded ticket's key already points at its replacement
+        key = (ticket.admission.priority, ticket.admission.supersede_key)
+        if self._waiting.get(key) is ticket:
+            del self._waiting[key]
+
+    def _release(self, priority: str) -> None:
+        with self._lock:
+            self._running[priority] -= 1
+            self._dispatch()
+            for name in PRIORITY_CLASSES:
+                self._publish(name)
+
+    def _dispatch(self) -> None:
+        """Hands free slots to queued tickets; called with the lock held."""
+        while sum(self._running.values()) < self.max_concurrent:
+            ticket = None
+            for priority in PRIORITY_CLASSES:
+                if self._running[priority] >= self.class_limits.get(priority, self.max_concurrent):
+                    continue
+                ticket = self._pop(priority)
+                if ticket is not None:
+                    break
+            if ticket is None:
+                return
+            priority = ticket.admission.priority
+            ticket.state = "running"
+            self._queued[priority] -= 1
+            self._running[priority] += 1
+            self._virtual[priority] = ticket.start_tag
+            ticket.event.set()
+            self._publish(priority)
+
+    def _pop(self, priority: str) -> Optional[_Ticket]:
+        queue = self._queues[priority]
+        while queue:
+            ticket = heapq.heappop(queue)[2]
+            if ticket.state == "queued":
+                if not queue:
+                    self._prune(priority)
+                return ticket
+        return None
+
+    def _prune(self, priority: str) -> None:
+        # Tenants whose finish tag the virtual clock has passed start level with
+        # a newcomer anyway, so their entries can go once the queue drains
+        finish = self._finish[priority]
+        if len(finish) > 1024:
+            virtual = self._virtual[priority]
+            self._finish[priority] = {tenant: tag for tenant, tag in finish.items() if tag > virtual}
+
+    def _publish(self, priority: str) -> None:
+        metrics.set("scheduler_queue_depth", self._queued[priority], **{"class": priority})
+        metrics.set("scheduler_running", self._running[priority], **{"class": priority})
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {name: {"queued": self._queued[name], "running": self._running[name]} for name in PRIORITY_CLASSES}
+
+
+def _timeout(name: str, default: str) -> Optional[float]:
+    seconds = float(os.getenv(name, default))
+    return seconds if seconds > 0 else None
+
+
+def _weights(spec: str) -> Dict[str, float]:
+    # "school-a=2,school-b=0.5"
+    weights = {}
+    for entry in spec.split(","):
+        tenant, _, weight = entry.partition("=")
+        if tenant.strip() and weight.strip():
+            weights[tenant.strip()] = float(weight)
+    return weights
+
+
+_scheduler: Optional[RequestScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_request_scheduler() -> Optional[RequestScheduler]:
+    """Return the process-wide scheduler, or None when REQUEST_SCHEDULER=false."""
+    global _scheduler
+    if os.getenv("REQUEST_SCHEDULER", "true").lower() == "false":
+        return None
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                max_concurrent = int(os.getenv("SCHEDULER_MAX_CONCURRENT", "16"))
+                batch_share = float(os.getenv("SCHEDULER_BATCH_SHARE", "0.5"))
+                _scheduler = RequestScheduler(
+                    max_concurrent=max_concurrent,
+                    class_limits={"batch": max(1, int(max_concurrent * batch_share))},
+                    timeouts={
+                        "realtime": _timeout("SCHEDULER_REALTIME_TIMEOUT", "5"),
+                        "submit": _timeout("SCHEDULER_SUBMIT_TIMEOUT", "60"),
+                        "batch": _timeout("SCHEDULER_BATCH_TIMEOUT", "0"),
+                    },
+                    tenant_weights=_weights(os.getenv("SCHEDULER_TENANT_WEIGHTS", "")),
+                )
+    return _scheduler
@@ -0,0 +1,133 @@
+import os
+import re
+import json
+import time
+import hashlib
+import random
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+_WORD = re.compile(r"[a-z0-9']+")
+# Mersenne prime for the universal hash family
+_PRIME = (1 << 61) - 1
+
+
+def shingles(content: str, size: int = 3) -> List[int]:
+    """64-bit hashes of the essay's overlapping word `size`-grams, after lowercasing."""
+    words = _WORD.findall(content.lower())
+    if len(words) < size:
+        words = words + [""] * (size - len(words))
+    grams = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return [int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest(), "little") for g in grams]
+
+
+class MinHasher:
+    """MinHash signatures; the share of equal slots estimates Jaccard similarity of the shingle sets."""
+
+    def __init__(self, num_hashes: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.params = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_hashes)]
+
+    def signature(self, content: str) -> Tuple[int, ...]:
+        hashes = shingles(content)
+        return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in self.params)
+
+    @staticmethod
+    def similarity(left: Tuple[int, ...], right: Tuple[int, ...]) -> float:
+        return sum(1 for x, y in zip(left, right) if x == y) / len(left)
+
+
+@dataclass
+class RevisionMatch:
+    similarity: float
+    feedback: Dict[str, Any]
+    evaluated_at: float
+
+
+class RevisionIndex:
+    """
+    Recent model-evaluated submissions per student. A new draft whose MinHash
+    similarity to one of them is at least `threshold` (same text type and
+    assistance level, comparable length) is treated as a revision of it.
+    Only fresh model evaluations are added, so reuse never drifts further
+    than one revision from the text the model actually saw.
+    """
+
+    def __init__(self, threshold: float = 0.85, max_per_student: int = 10, max_students: int = 10000,
+                 ttl_seconds: float = 6 * 60 * 60, num_hashes: int = 64):
+        self.threshold = threshold
+        self.max_per_student = max_per_student
+        self.max_students = max_students
+        self.ttl_seconds = ttl_seconds
+        self.hasher = MinHasher(num_hashes)
+        self._students: "OrderedDict[str, List[Tuple]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "matches": 0, "added": 0}
+
+    def add(self, student_id: str, content: str, text_type: Optional[str], assistance_level: Optional[str],
+            feedback: Dict[str, Any]) -> None:
+        entry = (
+            self.hasher.signature(content), len(content.split()), text_type or "", assistance_level or "",
+            json.dumps(feedback), time.time(),
+        )
+        with self._lock:
+            entries = self._students.pop(student_id, [])
+            entries.append(entry)
+            self._students[student_id] = entries[-self.max_per_student:]
+            while len(self._students) > self.max_students:
+                self._students.popitem(last=False)
+            self._stats["added"] += 1
+
+    def find(self, student_id: str, content: str, text_type: Optional[str],
+             assistance_level: Optional[str]) -> Optional[RevisionMatch]:
+        with self._lock:
+            self._stats["lookups"] += 1
+            entries = list(self._students.get(student_id, ()))
+        if not entries:
+            return None
+
+        signature = self.hasher.signature(content)
+        word_count = len(content.split())
+        cutoff = time.time() - self.ttl_seconds
+        best: Optional[Tuple] = None
+        best_similarity = 0.0
+        for entry in entries:
+            entry_signature, entry_words, entry_type, entry_level, _, evaluated_at = entry
+            if evaluated_at < cutoff or entry_type != (text_type or "") or entry_level != (assistance_level or ""):
+                continue
+            # Large additions or deletions change the rubric even when the kept text is identical
+            if not 0.8 <= word_count / max(1, entry_words) <= 1.25:
+                continue
+            similarity = MinHasher.similarity(signature, entry_signature)
+            if similarity >= self.threshold and similarity > best_similarity:
+                best, best_similarity = entry, similarity
+        if best is None:
+            return None
+        with self._lock:
+            self._stats["matches"] += 1
+        return RevisionMatch(round(best_similarity, 3), json.loads(best[4]), best[5])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, students=len(self._students))
+
+
+_index: Optional[RevisionIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_revision_index() -> RevisionIndex:
+    """Return the process-wide index, configured from the environment on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = RevisionIndex(
+                    threshold=float(os.getenv("REVISION_SIMILARITY", "0.85")),
+                    max_per_student=int(os.getenv("REVISION_MAX_PER_STUDENT", "10")),
+                    max_students=int(os.getenv("REVISION_MAX_STUDENTS", "10000")),
+                    ttl_seconds=float(os.getenv("REVISION_TTL", "21600")),
+                )
+    return _index
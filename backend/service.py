@@ -0,0 +1,201 @@
+"""
+Long-running ASGI service for NSW feedback, an alternative to the
+per-invocation handler in ai-feedback.py. One process keeps the model client
+(and its HTTP connection pool), the LanguageTool engines, the stage executor
+and the caches warm across requests. Run it with any ASGI server:
+
+    uvicorn service:app --host 0.0.0.0 --port 8080
+
+Routes:
+    POST /  or  POST /feedback   same request/response contract as ai-feedback.py (incl. store queries)
+    GET  /healthz                liveness: the process is serving
+    GET  /readyz                 readiness: warmed up and not draining, with scheduler queue depths
+    GET  /metrics                Prometheus text format
+
+Evaluations queue in request_scheduler by priority class, so SERVICE_WORKERS
+should stay above SCHEDULER_MAX_CONCURRENT: the extra threads are where
+queued requests wait, and a realtime check can only overtake work that has
+reached the scheduler.
+
+On shutdown (lifespan.shutdown, sent by the server on SIGTERM) the service
+stops accepting evaluations, waits up to SERVICE_DRAIN_TIMEOUT seconds for
+in-flight ones and then releases the engines and executors.
+"""
+import os
+import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import AIOperationsService
+from feedback_http import handle_post
+from instrumentation import metrics
+from request_scheduler import get_request_scheduler
+
+FEEDBACK_PATHS = ("/", "/feedback")
+_STREAM_END = object()
+
+
+class FeedbackService:
+    """ASGI application wrapping feedback_http.handle_post."""
+
+    def __init__(self, workers: int = 32, drain_timeout: float = 30.0, prewarm_grammar: bool = True):
+        self.drain_timeout = drain_timeout
+        self.prewarm_grammar = prewarm_grammar
+        # Evaluations block on the model and LanguageTool, so they run here
+        # rather than on the event loop
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="feedback-service")
+        self.ready = False
+        self.draining = False
+        self.in_flight = 0
+        self._idle: Optional[asyncio.Event] = None
+
+    async def __call__(self, scope: Dict[str, Any], receive, send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    # --- Lifespan ---
+
+    async def _lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.startup()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def startup(self) -> None:
+        self._idle = asyncio.Event()
+        self._idle.set()
+        loop = asyncio.get_running_loop()
+        durations = await loop.run_in_executor(self.executor, AIOperationsService.prewarm, self.prewarm_grammar)
+        print(f"Feedback service warmed up: {durations}")
+        self.ready = True
+
+    async def shutdown(self) -> None:
+        self.draining = True
+        self.ready = False
+        if self._idle is not None and self.in_flight:
+            print(f"Draining {self.in_flight} in-flight evaluations")
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout=self.drain_timeout)
+            except asyncio.TimeoutError:
+                print(f"Drain timed out with {self.in_flight} evaluations still running")
+        self.executor.shutdown(wait=False)
+        AIOperationsService.shutdown(wait=False)
+
+    # --- HTTP ---
+
+    async def _http(self, scope: Dict[str, Any], receive, send) -> None:
+        method, path = scope["method"], scope["path"]
+        if path == "/healthz":
+            await self._send(send, 200, {"status": "alive"})
+        elif path == "/readyz":
+            ready = self.ready and not self.draining
+            payload = {"ready": ready, "inFlight": self.in_flight}
+            scheduler = get_request_scheduler()
+            if scheduler is not None:
+                payload["scheduler"] = scheduler.stats()
+            await self._send(send, 200 if ready else 503, payload)
+        elif path == "/metrics":
+            await self._send_raw(send, 200, [(b"content-type", b"text/plain; version=0.0.4")],
+                                 metrics.render().encode("utf-8"))
+        elif path in FEEDBACK_PATHS:
+            if method != "POST":
+                await self._send_raw(send, 405, [], b"Method Not Allowed")
+            elif self.draining:
+                await self._send(send, 503, {"error": "Service is shutting down"}, [(b"connection", b"close")])
+            else:
+                await self._evaluate(receive, send)
+        else:
+            await self._send(send, 404, {"error": "Not found"})
+
+    async def _evaluate(self, receive, send) -> None:
+        raw_body = await self._read_body(receive)
+        self.in_flight += 1
+        if self._idle is not None:
+            self._idle.clear()
+        try:
+            loop = asyncio.get_running_loop()
+            status, headers, body = await loop.run_in_executor(self.executor, handle_post, raw_body)
+            header_list = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in (headers or {}).items()]
+            if isinstance(body, str):
+                await self._send_raw(send, status, header_list, body.encode("utf-8"))
+            else:
+                await self._stream(receive, send, status, header_list, body)
+        finally:
+            self.in_flight -= 1
+            if self.in_flight == 0 and self._idle is not None:
+                self._idle.set()
+
+    async def _stream(self, receive, send, status: int, headers: List[Tuple[bytes, bytes]],
+                      lines: Iterator[str]) -> None:
+        # Each NDJSON line is flushed as soon as the evaluation produces it. A
+        # client that disconnects stops the stream at the next line, and closing
+        # the generator (off the event loop) releases the evaluation's scheduler slot
+        loop = asyncio.get_running_loop()
+        disconnected = asyncio.ensure_future(self._wait_for_disconnect(receive))
+        try:
+            await send({"type": "http.response.start", "status": status, "headers": headers})
+            try:
+                while not disconnected.done():
+                    line = await loop.run_in_executor(self.executor, next, lines, _STREAM_END)
+                    if line is _STREAM_END:
+                        break
+                    await send({"type": "http.response.body", "body": line.encode("utf-8"), "more_body": True})
+            except Exception as e:
+                if disconnected.done():
+                    return
+                print(f"Error streaming feedback: {e}")
+                error = json.dumps({"event": "error", "error": str(e)}) + "\n"
+                await send({"type": "http.response.body", "body": error.encode("utf-8"), "more_body": True})
+            if not disconnected.done():
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            disconnected.cancel()
+            close = getattr(lines, "close", None)
+            if close is not None:
+                await loop.run_in_executor(self.executor, close)
+
+    @staticmethod
+    async def _wait_for_disconnect(receive) -> None:
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    @staticmethod
+    async def _read_body(receive) -> str:
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        return b"".join(chunks).decode("utf-8")
+
+    @staticmethod
+    async def _send_raw(send, status: int, headers: List[Tuple[bytes, bytes]], body: bytes) -> None:
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _send(self, send, status: int, payload: Dict[str, Any],
+                    headers: Optional[List[Tuple[bytes, bytes]]] = None) -> None:
+        await self._send_raw(send, status, [(b"content-type", b"application/json")] + (headers or []),
+                             json.dumps(payload).encode("utf-8"))
+
+
+app = FeedbackService(
+    workers=int(os.getenv("SERVICE_WORKERS", "32")),
+    drain_timeout=float(os.getenv("SERVICE_DRAIN_TIMEOUT", "30")),
+    prewarm_grammar=os.getenv("SERVICE_PREWARM_GRAMMAR", "true").lower() != "false",
+)
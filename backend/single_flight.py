@@ -0,0 +1,104 @@
+import os
+import copy
+import time
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from instrumentation import metrics
+
+
+class LeaderCancelled(Exception):
+    """The call being waited on was interrupted before it produced a result."""
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller (the
+    leader) runs the function, later callers wait for its result instead of
+    running it again. Followers receive a deep copy so no two callers share a
+    mutable result.
+
+    - An exception raised by the function is raised in every waiting caller.
+    - If the leader is interrupted (KeyboardInterrupt, SystemExit, a
+      cancelled worker), followers retry and one of them becomes the leader.
+    - A follower that waits longer than `wait_timeout` stops waiting and runs
+      the function itself; the leader keeps running for everyone else.
+
+    Only calls that overlap in time are coalesced; nothing is kept once the
+    leader returns (that is the feedback cache's job).
+    """
+
+    def __init__(self, wait_timeout: Optional[float] = None):
+        self.wait_timeout = wait_timeout
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[..., Any], *args: Any) -> Tuple[Any, bool]:
+        """Return (result, shared); `shared` is True when another caller's run produced it."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                future.set_running_or_notify_cancel()
+                self._calls[key] = future
+        if leader:
+            return self._lead(key, future, fn, args), False
+        return self._follow(key, future, fn, args)
+
+    def _lead(self, key: str, future: Future, fn: Callable[..., Any], args: Tuple[Any, ...]) -> Any:
+        metrics.inc("feedback_coalescing_total", role="leader")
+        try:
+            result = fn(*args)
+        except Exception as e:
+            self._finish(key)
+            future.set_exception(e)
+            raise
+        except BaseException:
+            self._finish(key)
+            future.set_exception(LeaderCancelled(key))
+            raise
+        # Dropped from the table before waking followers, so a call arriving
+        # from now on starts fresh (and normally hits the feedback cache)
+        self._finish(key)
+        future.set_result(result)
+        return result
+
+    def _follow(self, key: str, future: Future, fn: Callable[..., Any], args: Tuple[Any, ...]) -> Tuple[Any, bool]:
+        started = time.perf_counter()
+        try:
+            result = future.result(timeout=self.wait_timeout)
+        except FutureTimeoutError:
+            metrics.inc("feedback_coalescing_total", role="wait_timeout")
+            return fn(*args), False
+        except LeaderCancelled:
+            metrics.inc("feedback_coalescing_total", role="retried")
+            return self.do(key, fn, *args)
+        finally:
+            metrics.observe("feedback_coalesced_wait_ms", (time.perf_counter() - started) * 1000)
+        metrics.inc("feedback_coalescing_total", role="follower")
+        return copy.deepcopy(result), True
+
+    def _finish(self, key: str) -> None:
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+_single_flight: Optional[SingleFlight] = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    """Return the process-wide coalescer, configured from the environment on first use."""
+    global _single_flight
+    if _single_flight is None:
+        with _single_flight_lock:
+            if _single_flight is None:
+                wait_timeout = float(os.getenv("COALESCE_WAIT_TIMEOUT", "0"))
+                _single_flight = SingleFlight(wait_timeout=wait_timeout or None)
+    return _single_flight
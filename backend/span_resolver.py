@@ -0,0 +1,253 @@
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from essay_index import EssayIndex
+
+# Feedback lists whose items quote the essay, and the field holding the quote
+QUOTED_FIELDS = (
+    ("strengths", "exampleFromText"),
+    ("areasForImprovement", "exampleFromText"),
+    ("grammarCorrections", "original"),
+    ("vocabularyEnhancements", "original"),
+)
+
+_QUOTE_CHARS = {
+    "‘": "'", "’": "'", "‚": "'", "‛": "'",
+    "“": '"', "”": '"', "„": '"', "‟": '"',
+    "–": "-", "—": "-",
+}
+_TRIM_CHARS = " \t\r\n\"'.…"
+
+
+class AhoCorasick:
+    """Multi-pattern matcher: finds every occurrence of every pattern in one scan."""
+
+    def __init__(self, patterns: Sequence[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        self._lengths = [len(p) for p in patterns]
+
+        for pattern_id, pattern in enumerate(patterns):
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append(pattern_id)
+
+        pending = deque(self._goto[0].values())
+        while pending:
+            node = pending.popleft()
+            for ch, child in self._goto[node].items():
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                if self._out[self._fail[child]]:
+                    self._out[child] = self._out[child] + self._out[self._fail[child]]
+                pending.append(child)
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, int]]:
+        """Yields (start, pattern_id) for every match, in order of match end."""
+        goto, fail, out, lengths = self._goto, self._fail, self._out, self._lengths
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for pattern_id in out[node]:
+                yield i + 1 - lengths[pattern_id], pattern_id
+
+
+def _normalize(text: str) -> Tuple[str, List[int]]:
+    """
+    Lower-cases, straightens curly quotes and collapses whitespace runs.
+    Returns the normalized text and, for each of its characters, the index of
+    the original character it came from.
+    """
+    chars: List[str] = []
+    index_map: List[int] = []
+    in_space = False
+    for i, ch in enumerate(text):
+        if ch.isspace():
+            if not in_space:
+                chars.append(" ")
+                index_map.append(i)
+            in_space = True
+            continue
+        in_space = False
+        chars.append(_QUOTE_CHARS.get(ch, ch).lower())
+        index_map.append(i)
+    return "".join(chars), index_map
+
+
+def _normalize_quote(quote: str) -> str:
+    return _normalize(quote.strip(_TRIM_CHARS))[0]
+
+
+class SpanResolver:
+    """
+    Resolves quoted snippets to character spans in a single essay.
+
+    All quotes are matched in one pass over the essay with an Aho-Corasick
+    automaton. When a quote occurs more than once, the occurrence nearest the
+    model's hinted start wins; without a hint, repeated identical quotes are
+    assigned successive occurrences. Quotes with no exact match are retried
+    against a whitespace-, quote- and case-normalized view of the essay.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self._normalized: Optional[Tuple[str, List[int]]] = None
+
+    def resolve(self, requests: Sequence[Tuple[str, Optional[int]]]) -> List[Optional[Tuple[int, int]]]:
+        results: List[Optional[Tuple[int, int]]] = [None] * len(requests)
+
+        exact = self._occurrences([quote for quote, _ in requests], self.text)
+        unresolved = []
+        claimed: Dict[str, int] = {}
+        for i, (quote, hint) in enumerate(requests):
+            starts = exact.get(quote)
+            if starts:
+                start = self._choose(starts, hint, claimed, quote)
+                results[i] = (start, start + len(quote))
+            elif quote:
+                unresolved.append(i)
+
+        if unresolved:
+            normalized_text, index_map = self._normalized_view()
+            patterns = {i: _normalize_quote(requests[i][0]) for i in unresolved}
+            fuzzy = self._occurrences(list(patterns.values()), normalized_text)
+            for i in unresolved:
+                pattern = patterns[i]
+                starts = fuzzy.get(pattern)
+                if not starts:
+                    continue
+                hint = requests[i][1]
+                # Hints are in original-text coordinates; compare against mapped starts.
+                original_starts = [index_map[s] for s in starts]
+                start = self._choose(original_starts, hint, claimed, "\0" + pattern)
+                norm_start = starts[original_starts.index(start)]
+                end = index_map[norm_start + len(pattern) - 1] + 1
+                results[i] = (start, end)
+
+        return results
+
+    def _normalized_view(self) -> Tuple[str, List[int]]:
+        if self._normalized is None:
+            self._normalized = _normalize(self.text)
+        return self._normalized
+
+    @staticmethod
+    def _occurrences(quotes: Sequence[str], text: str) -> Dict[str, List[int]]:
+        patterns = sorted({q for q in quotes if q})
+        occurrences: Dict[str, List[int]] = {}
+        if not patterns:
+            return occurrences
+        for start, pattern_id in AhoCorasick(patterns).finditer(text):
+            occurrences.setdefault(patterns[pattern_id], []).append(start)
+        for starts in occurrences.values():
+            starts.sort()
+        return occurrences
+
+    @staticmethod
+    def _choose(starts: List[int], hint: Optional[int], claimed: Dict[str, int], key: str) -> int:
+        if isinstance(hint, int) and not isinstance(hint, bool) and len(starts) > 1:
+            return min(starts, key=lambda s: abs(s - hint))
+        n = claimed.get(key, 0)
+        claimed[key] = n + 1
+        return starts[n] if n < len(starts) else starts[0]
+
+
+def _hint(item: Dict[str, Any]) -> Optional[int]:
+    position = item.get("position")
+    if isinstance(position, dict):
+        start = position.get("start")
+        if isinstance(start, int) and not isinstance(start, bool):
+            return start
+    return None
+
+
+def _fallback_position(item: Dict[str, Any], text_length: int) -> Dict[str, int]:
+    # Keep the model's offsets only when they are at least in bounds
+    position = item.get("position")
+    if isinstance(position, dict):
+        start, end = position.get("start"), position.get("end")
+        if isinstance(start, int) and isinstance(end, int) and 0 <= start <= end <= text_length:
+            return {"start": start, "end": end}
+    return {"start": 0, "end": 0}
+
+
+def _quoted_lists(feedback_data: Dict[str, Any]) -> List[Tuple[Dict[str, Any], str, str]]:
+    """(container, list name, quote field) for every list of quoted items, in response order."""
+    lists = [(feedback_data, name, field) for name, field in QUOTED_FIELDS[2:]]
+    for category in feedback_data.get("feedbackCategories") or []:
+        if isinstance(category, dict):
+            lists.extend((category, name, field) for name, field in QUOTED_FIELDS[:2])
+    return [(container, name, field) for container, name, field in lists if isinstance(container.get(name), list)]
+
+
+def _quoted_items(feedback_data: Dict[str, Any]) -> List[Tuple[Dict[str, Any], str]]:
+    """(item, quote) for every quoted feedback item, in response order."""
+    items: List[Tuple[Dict[str, Any], str]] = []
+    for container, name, field in _quoted_lists(feedback_data):
+        for item in container[name]:
+            if isinstance(item, dict):
+                quote = item.get(field)
+                items.append((item, quote if isinstance(quote, str) else ""))
+    return items
+
+
+def resolve_feedback_positions(feedback_data: Dict[str, Any], original_text: str,
+                               drop_unresolved: bool = False) -> Dict[str, Any]:
+    """
+    Re-anchors every quoted feedback item (strengths, areas for improvement,
+    grammar corrections and vocabulary enhancements) to its span in the
+    essay, resolving all of them with a single resolver pass.
+
+    A quote that cannot be found keeps its offsets when they are in bounds,
+    since they were given for this text. With `drop_unresolved` (feedback
+    carried over from another draft, whose offsets mean nothing here) such
+    items are removed instead.
+    """
+    items = _quoted_items(feedback_data)
+    if not items:
+        return feedback_data
+
+    spans = SpanResolver(original_text).resolve([(quote, _hint(item)) for item, quote in items])
+    text_length = len(original_text)
+    unresolved = set()
+    for (item, _), span in zip(items, spans):
+        if span is not None:
+            item["position"] = {"start": span[0], "end": span[1]}
+        elif drop_unresolved:
+            unresolved.add(id(item))
+        else:
+            item["position"] = _fallback_position(item, text_length)
+    if unresolved:
+        for container, name, _ in _quoted_lists(feedback_data):
+            container[name] = [item for item in container[name] if id(item) not in unresolved]
+    return feedback_data
+
+
+def add_utf16_offsets(feedback_data: Dict[str, Any], index: EssayIndex) -> Dict[str, Any]:
+    """
+    Adds utf16Start/utf16End (JavaScript string offsets) next to the code
+    point start/end of every quoted item's position.
+    """
+    for item, _ in _quoted_items(feedback_data):
+        position = item.get("position")
+        if not isinstance(position, dict):
+            continue
+        start, end = position.get("start"), position.get("end")
+        if isinstance(start, int) and isinstance(end, int):
+            position["utf16Start"] = index.utf16(start)
+            position["utf16End"] = index.utf16(end)
+    return feedback_data
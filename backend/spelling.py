@@ -0,0 +1,337 @@
+"""
+In-process spelling checker: a symmetric-delete (SymSpell-style) index over a
+frequency dictionary plus the kid-writing custom word list, stored in one
+binary file that is memory-mapped rather than loaded, so start-up is
+immediate and forked workers share the pages.
+
+The index is built from the word lists on first use (or ahead of time with
+`python spelling.py`) and reused until either list changes.
+"""
+import os
+import sys
+import mmap
+import struct
+import hashlib
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from essay_index import essay_index
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+# Frequency dictionary, one "word count" per line (the SymSpell format); not shipped with the repo
+DEFAULT_DICTIONARY_PATH = os.path.join(DATA_DIR, "spelling_dictionary.txt")
+DEFAULT_CUSTOM_WORDS_PATH = os.path.join(DATA_DIR, "kid_words.txt")
+# Count given to custom words listed without one: a reasonably common word
+DEFAULT_CUSTOM_COUNT = 100000
+
+SPELLING_MESSAGE = "Possible spelling mistake found."
+
+_MAGIC = b"NSWSPEL1"
+# magic, word count, delete count, max edit distance, prefix length
+_HEADER = struct.Struct("<8sIIII")
+
+
+def _hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def deletes(word: str, max_distance: int, prefix_length: int) -> Set[str]:
+    """The word's first `prefix_length` characters with up to `max_distance` of them deleted, itself included."""
+    word = word[:prefix_length]
+    found = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        following = set()
+        for item in frontier:
+            if len(item) <= 1:
+                continue
+            for i in range(len(item)):
+                deleted = item[:i] + item[i + 1:]
+                if deleted not in found:
+                    found.add(deleted)
+                    following.add(deleted)
+        frontier = following
+    return found
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance (adjacent transpositions count once); limit + 1 once exceeded."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def load_word_counts(dictionary_path: str, custom_path: Optional[str] = None) -> Dict[str, int]:
+    """
+    Reads the frequency dictionary ("word count" per line) and the custom
+    word list (one word per line, optionally with a count; "#" comments).
+    """
+    counts: Dict[str, int] = {}
+    for path, default in ((dictionary_path, 1), (custom_path, DEFAULT_CUSTOM_COUNT)):
+        if not path or not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                fields = line.split()
+                if not fields or fields[0].startswith("#"):
+                    continue
+                word = fields[0].lower().replace("’", "'")
+                count = int(fields[1]) if len(fields) > 1 and fields[1].isdigit() else default
+                counts[word] = max(counts.get(word, 0), count)
+    return counts
+
+
+def build_index(counts: Dict[str, int], path: str, max_distance: int = 2, prefix_length: int = 7) -> None:
+    """
+    Writes the index file: header, sorted delete hashes with the id of the
+    word each came from, sorted word hashes with their ids (exact lookups),
+    then the words with their counts. Arrays are
+    in native byte order; the file is a per-machine cache, not an artifact.
+    """
+    words = sorted(counts)
+    encoded = [word.encode("utf-8") for word in words]
+    pairs = sorted(
+        (_hash(item), word_id)
+        for word_id, word in enumerate(words)
+        for item in deletes(word, max_distance, prefix_length)
+    )
+    exact = sorted((_hash(word), word_id) for word_id, word in enumerate(words))
+    offsets = array("I", [0])
+    for item in encoded:
+        offsets.append(offsets[-1] + len(item))
+
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, len(words), len(pairs), max_distance, prefix_length))
+        # The 8-byte arrays come first so every section stays aligned
+        array("Q", (h for h, _ in pairs)).tofile(f)
+        array("Q", (h for h, _ in exact)).tofile(f)
+        array("I", (word_id for _, word_id in pairs)).tofile(f)
+        array("I", (word_id for _, word_id in exact)).tofile(f)
+        offsets.tofile(f)
+        array("I", (min(counts[word], 0xFFFFFFFF) for word in words)).tofile(f)
+        f.write(b"".join(encoded))
+    # Atomic, so concurrent builders and readers never see a half-written file
+    os.replace(temporary, path)
+
+
+class SpellingIndex:
+    """Read-only view of an index file; lookups read the mapped pages directly."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.word_count, self.delete_count, self.max_distance, self.prefix_length = \
+            _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} is not a spelling index")
+        self._view = memoryview(self._mmap)
+        position = _HEADER.size
+
+        def section(code: str, count: int) -> memoryview:
+            nonlocal position
+            size = count * array(code).itemsize
+            part = self._view[position:position + size].cast(code)
+            position += size
+            return part
+
+        self._hashes = section("Q", self.delete_count)
+        self._word_hashes = section("Q", self.word_count)
+        self._ids = section("I", self.delete_count)
+        self._word_ids = section("I", self.word_count)
+        self._offsets = section("I", self.word_count + 1)
+        self._counts = section("I", self.word_count)
+        self._words = self._view[position:]
+
+    def word(self, word_id: int) -> str:
+        return self._words[self._offsets[word_id]:self._offsets[word_id + 1]].tobytes().decode("utf-8")
+
+    def count(self, word: str) -> Optional[int]:
+        """The word's dictionary count, or None when it is not a known word."""
+        key = _hash(word)
+        position = bisect_left(self._word_hashes, key)
+        while position < self.word_count and self._word_hashes[position] == key:
+            word_id = self._word_ids[position]
+            if self.word(word_id) == word:
+                return self._counts[word_id]
+            position += 1
+        return None
+
+    def candidates(self, word: str) -> Iterator[Tuple[str, int]]:
+        """(word, count) for every dictionary word sharing a delete with `word`; unverified."""
+        seen = set()
+        for item in deletes(word, self.max_distance, self.prefix_length):
+            key = _hash(item)
+            position = bisect_left(self._hashes, key)
+            while position < self.delete_count and self._hashes[position] == key:
+                word_id = self._ids[position]
+                if word_id not in seen:
+                    seen.add(word_id)
+                    yield self.word(word_id), self._counts[word_id]
+                position += 1
+
+    def close(self) -> None:
+        for view in (self._hashes, self._ids, self._word_hashes, self._word_ids, self._offsets, self._counts,
+                     self._words, self._view):
+            view.release()
+        self._mmap.close()
+
+
+class SpellChecker:
+    """
+    Finds misspellings and returns them in the grammar-correction item shape
+    (type "spelling-error"). Tuned for precision on children's writing:
+    capitalized words inside a sentence are taken to be names, acronyms,
+    mixed-case words and words with an apostrophe (other than a possessive
+    's) are skipped, and an unknown word is only reported when a correction
+    within the edit distance exists. A capitalized first word of a sentence
+    is checked in lowercase and corrected with its capital kept.
+    """
+
+    def __init__(self, index: SpellingIndex, min_length: int = 3, cache_size: int = 65536):
+        self.index = index
+        self.min_length = min_length
+        # Essays reuse most of their words, so per-word answers are memoized
+        self._count = lru_cache(maxsize=cache_size)(index.count)
+        self._suggest = lru_cache(maxsize=cache_size // 4)(self._best_correction)
+
+    def is_known(self, word: str) -> bool:
+        return self._count(word) is not None
+
+    def suggest(self, word: str) -> Optional[str]:
+        """Best correction for a lowercase unknown word: nearest first, then most frequent."""
+        return self._suggest(word)
+
+    def _best_correction(self, word: str) -> Optional[str]:
+        # Short words have too many neighbours two edits away
+        limit = 1 if len(word) <= 4 else self.index.max_distance
+        best: Optional[Tuple[int, int, str]] = None
+        for candidate, count in self.index.candidates(word):
+            distance = edit_distance(word, candidate, limit)
+            if distance <= limit and (best is None or (distance, -count) < best[:2]):
+                best = (distance, -count, candidate)
+        # Two words run together ("alot") count as one edit
+        for split in range(1, len(word)):
+            left, right = word[:split], word[split:]
+            if min(len(left), len(right)) < 2 and left not in ("a", "i"):
+                continue
+            left_count, right_count = self._count(left), self._count(right)
+            if left_count and right_count:
+                candidate = (1, -min(left_count, right_count), f"{left} {right}")
+                # Preferred on a tie: "alot" means "a lot" far more often than "lot"
+                if best is None or candidate[:2] <= best[:2]:
+                    best = candidate
+        return best[2] if best is not None else None
+
+    def check(self, text: str) -> List[Dict[str, Any]]:
+        corrections = []
+        index = essay_index(text)
+        token_starts = [start for start, _ in index.tokens]
+        sentence_initial = set()
+        for sentence_start, sentence_end in index.sentences:
+            first = bisect_left(token_starts, sentence_start)
+            if first < len(token_starts) and token_starts[first] < sentence_end:
+                sentence_initial.add(first)
+
+        for position, (start, end) in enumerate(index.tokens):
+            token = text[start:end]
+            if len(token) < self.min_length:
+                continue
+            capitalized = position in sentence_initial and token[0].isupper() and token[1:].islower()
+            if not token.islower() and not capitalized:
+                continue
+            word = token.lower().replace("’", "'")
+            if "'" in word:
+                if not word.lower().endswith("'s"):
+                    continue
+                word = word[:-2]
+            if len(word) < self.min_length or self.is_known(word):
+                continue
+            suggestion = self.suggest(word)
+            if suggestion is None:
+                continue
+            if capitalized:
+                suggestion = suggestion[0].upper() + suggestion[1:]
+            corrections.append({
+                "original": text[start:start + len(word)],
+                "suggestion": suggestion,
+                "explanation": SPELLING_MESSAGE,
+                "position": {"start": start, "end": start + len(word)},
+                "type": "spelling-error",
+                "severity": "error",
+            })
+        return corrections
+
+
+def _index_path(dictionary_path: str, custom_path: Optional[str]) -> str:
+    # Named after the sources' identity so an edited word list gets a fresh index
+    digest = hashlib.sha1(_MAGIC)
+    for path in (dictionary_path, custom_path):
+        if path and os.path.exists(path):
+            stat = os.stat(path)
+            digest.update(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    return os.path.join(tempfile.gettempdir(), f"nsw-spelling-{digest.hexdigest()[:16]}.idx")
+
+
+def open_spell_checker(dictionary_path: str, custom_path: Optional[str] = None,
+                       index_path: Optional[str] = None) -> SpellChecker:
+    """Maps the index for the given word lists, building it first when it does not exist yet."""
+    index_path = index_path or _index_path(dictionary_path, custom_path)
+    if not os.path.exists(index_path):
+        counts = load_word_counts(dictionary_path, custom_path)
+        print(f"Building spelling index for {len(counts)} words at {index_path}")
+        build_index(counts, index_path)
+    return SpellChecker(SpellingIndex(index_path))
+
+
+_checker: Optional[SpellChecker] = None
+_checker_loaded = False
+_checker_lock = threading.Lock()
+
+
+def get_spell_checker() -> Optional[SpellChecker]:
+    """
+    Return the process-wide checker, or None when no frequency dictionary is
+    configured; LanguageTool then keeps checking spelling.
+    """
+    global _checker, _checker_loaded
+    if not _checker_loaded:
+        with _checker_lock:
+            if not _checker_loaded:
+                dictionary_path = os.getenv("SPELLING_DICTIONARY_PATH", DEFAULT_DICTIONARY_PATH)
+                index_path = os.getenv("SPELLING_INDEX_PATH")
+                if os.path.exists(dictionary_path) or (index_path and os.path.exists(index_path)):
+                    _checker = open_spell_checker(
+                        dictionary_path,
+                        os.getenv("SPELLING_CUSTOM_WORDS_PATH", DEFAULT_CUSTOM_WORDS_PATH),
+                        index_path,
+                    )
+                else:
+                    print(f"No spelling dictionary at {dictionary_path}; LanguageTool checks spelling")
+                _checker_loaded = True
+    return _checker
+
+
+if __name__ == "__main__":
+    # Prebuild at deploy time: python spelling.py [dictionary] [custom words] [index]
+    dictionary = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DICTIONARY_PATH
+    custom = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_CUSTOM_WORDS_PATH
+    target = sys.argv[3] if len(sys.argv) > 3 else _index_path(dictionary, custom)
+    build_index(load_word_counts(dictionary, custom), target)
+    print(target)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Backend modules are imported flat, as the handlers import them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
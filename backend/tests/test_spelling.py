@@ -0,0 +1,33 @@
+import pytest
+
+from spelling import open_spell_checker
+
+WORDS = "because weird the dog barked at cat and she was very happy it a lot sarah went home"
+
+
+@pytest.fixture
+def checker(tmp_path):
+    dictionary = tmp_path / "dictionary.txt"
+    dictionary.write_text("\n".join(f"{word} 100" for word in WORDS.split()), encoding="utf-8")
+    return open_spell_checker(str(dictionary), index_path=str(tmp_path / "spelling.idx"))
+
+
+def test_reports_lowercase_misspelling(checker):
+    corrections = checker.check("The dog barked becuase the cat was wierd.")
+    assert [(c["original"], c["suggestion"]) for c in corrections] == [("becuase", "because"), ("wierd", "weird")]
+
+
+def test_reports_sentence_initial_misspelling_with_its_capital(checker):
+    text = "Becuase it was late, she went home. Wierd dog."
+    corrections = checker.check(text)
+    assert [(c["original"], c["suggestion"]) for c in corrections] == [("Becuase", "Because"), ("Wierd", "Weird")]
+    first = corrections[0]["position"]
+    assert text[first["start"]:first["end"]] == "Becuase"
+
+
+def test_skips_capitalized_words_inside_a_sentence(checker):
+    assert checker.check("The dog barked at Barkr and Wierd.") == []
+
+
+def test_skips_acronyms_and_mixed_case(checker):
+    assert checker.check("BECUASE it was. BeCuase it was.") == []
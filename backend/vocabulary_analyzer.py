@@ -0,0 +1,159 @@
+import os
+import threading
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+from essay_index import essay_index
+
+DEFAULT_LEXICON_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "vocabulary_lexicon.tsv")
+
+# Tiers: 1 = everyday words students overuse, 2 = common, 3 = sophisticated
+BASIC, COMMON, ADVANCED = 1, 2, 3
+# Words missing from the lexicon are tiered by length, which tracks frequency
+# closely enough for primary-school writing
+ADVANCED_MIN_LENGTH = 9
+
+
+class Lexicon:
+    """Word tiers and ranked upgrade suggestions, loaded once per process."""
+
+    def __init__(self, tiers: Dict[str, int], upgrades: Dict[str, Tuple[str, ...]]):
+        self.tiers = tiers
+        self.upgrades = upgrades
+
+    @classmethod
+    def load(cls, path: str) -> "Lexicon":
+        """
+        Reads the tab-separated lexicon: word, tier, comma-separated upgrades
+        (best first). Lines starting with "#" are comments.
+        """
+        tiers: Dict[str, int] = {}
+        upgrades: Dict[str, Tuple[str, ...]] = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip() or line.startswith("#"):
+                    continue
+                fields = line.rstrip("\n").split("\t")
+                word = fields[0].lower()
+                tiers[word] = int(fields[1])
+                if len(fields) > 2 and fields[2]:
+                    upgrades[word] = tuple(s.strip() for s in fields[2].split(",") if s.strip())
+        return cls(tiers, upgrades)
+
+    def tier(self, word: str) -> int:
+        tier = self.tiers.get(word)
+        if tier is not None:
+            return tier
+        return ADVANCED if len(word) >= ADVANCED_MIN_LENGTH else COMMON
+
+
+def _match_case(original: str, replacement: str) -> str:
+    if original.isupper() and len(original) > 1:
+        return replacement.upper()
+    if original[:1].isupper():
+        return replacement[:1].upper() + replacement[1:]
+    return replacement
+
+
+class VocabularyAnalyzer:
+    """
+    Local vocabulary pass: tokenizes the essay once, tiers every token and
+    proposes upgrades for the overused everyday words, with exact offsets.
+    Needs no model call, so it costs tens of microseconds per essay.
+    """
+
+    def __init__(self, lexicon: Lexicon, max_suggestions: int = 5):
+        self.lexicon = lexicon
+        self.max_suggestions = max_suggestions
+
+    def analyze(self, content: str) -> Dict[str, Any]:
+        """Returns {"profile": {...}, "enhancements": [...]} for the essay."""
+        index = essay_index(content)
+        spans, words = index.tokens, index.words
+        tier_of = self.lexicon.tier
+        tiers = array("B", map(tier_of, words))
+
+        count = len(tiers)
+        basic = tiers.count(BASIC)
+        advanced = tiers.count(ADVANCED)
+        profile = {
+            "tokenCount": count,
+            "basicRatio": round(basic / count, 3) if count else 0.0,
+            "advancedRatio": round(advanced / count, 3) if count else 0.0,
+            "sophistication": round(sum(tiers) / count, 3) if count else 0.0,
+        }
+        return {"profile": profile, "enhancements": self._suggest(content, spans, words, set(words))}
+
+    def _suggest(self, content: str, spans: List[Tuple[int, int]], words: List[str],
+                 vocabulary: set) -> List[Dict[str, Any]]:
+        # First occurrence and use count of every upgradeable word
+        first_index: Dict[str, int] = {}
+        uses: Dict[str, int] = {}
+        upgrades = self.lexicon.upgrades
+        for index, word in enumerate(words):
+            if word in upgrades:
+                uses[word] = uses.get(word, 0) + 1
+                first_index.setdefault(word, index)
+
+        # Most repeated words first; ties keep essay order
+        ranked = sorted(uses, key=lambda w: (-uses[w], first_index[w]))
+        enhancements = []
+        for word in ranked:
+            # Skip alternatives the student already used so the advice adds variety
+            alternatives = [s for s in upgrades[word] if s not in vocabulary]
+            if not alternatives:
+                continue
+            start, end = spans[first_index[word]]
+            original = content[start:end]
+            repeated = f", used {uses[word]} times" if uses[word] > 1 else ""
+            enhancements.append({
+                "original": original,
+                "suggestion": _match_case(original, alternatives[0]),
+                "alternatives": [_match_case(original, s) for s in alternatives[1:]],
+                "explanation": f'"{original}" is an everyday word{repeated}; '
+                               f'"{alternatives[0]}" is more precise and vivid.',
+                "position": {"start": start, "end": end},
+                "source": "lexicon",
+            })
+            if len(enhancements) >= self.max_suggestions:
+                break
+        enhancements.sort(key=lambda e: e["position"]["start"])
+        return enhancements
+
+
+def merge_vocabulary_enhancements(model_items: List[Dict[str, Any]],
+                                  local_items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Combines model and lexicon suggestions. Lexicon offsets are exact, so a
+    model suggestion overlapping one is dropped; the rest are kept in essay order.
+    """
+    taken = [(item["position"]["start"], item["position"]["end"]) for item in local_items]
+    merged = list(local_items)
+    for item in model_items:
+        position = item.get("position") if isinstance(item, dict) else None
+        if not isinstance(position, dict):
+            continue
+        start, end = position.get("start", 0), position.get("end", 0)
+        if any(start < t_end and t_start < end for t_start, t_end in taken):
+            continue
+        merged.append(item)
+    merged.sort(key=lambda e: e["position"].get("start", 0))
+    return merged
+
+
+_analyzer: Optional[VocabularyAnalyzer] = None
+_analyzer_lock = threading.Lock()
+
+
+def get_vocabulary_analyzer() -> VocabularyAnalyzer:
+    """Return the process-wide analyzer, loading the lexicon on first use."""
+    global _analyzer
+    if _analyzer is None:
+        with _analyzer_lock:
+            if _analyzer is None:
+                lexicon = Lexicon.load(os.getenv("VOCABULARY_LEXICON_PATH", DEFAULT_LEXICON_PATH))
+                _analyzer = VocabularyAnalyzer(
+                    lexicon,
+                    max_suggestions=int(os.getenv("VOCABULARY_MAX_SUGGESTIONS", "5")),
+                )
+    return _analyzer
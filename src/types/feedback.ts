@@ -2,7 +2,8 @@
  * Detailed NSW rubric-aligned feedback types.
  * Copy to: src/types/feedback.ts
  */
-export interface Evidence { text: string; start: number; end: number; }
+/** start/end are code point offsets; utf16Start/utf16End index the JavaScript string directly. */
+export interface Evidence { text: string; start: number; end: number; utf16Start?: number; utf16End?: number; }
 
 export interface LintFix {
   original: string;
@@ -10,6 +11,8 @@ export interface LintFix {
   explanation: string;
   start: number;
   end: number;
+  utf16Start?: number;
+  utf16End?: number;
 }
 
 export interface CriterionImprovement {